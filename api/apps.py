@@ -5,3 +5,9 @@ from cdh.rest.mixins import ClientResourceSetupMixin
 
 class ApiConfig(ClientResourceSetupMixin, AppConfig):
     name = 'api'
+
+    def ready(self):
+        super().ready()
+
+        from api import http
+        http.install()
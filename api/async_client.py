@@ -0,0 +1,78 @@
+"""
+An async version of the resource client, for async views.
+
+The cdh.rest client itself is blocking, so the calls are run on a thread
+pool of their own (API_ASYNC_WORKERS) and awaited from there. That pool is
+separate from the prefetch pool (see api.prefetch), so slow backend calls
+made by async views don't hold up the prefetches of regular views, and the
+other way around. As these threads only wait on the backend, the pool can
+be a lot bigger than the prefetch pool. As with prefetching, calls are made
+as the current user and in the active language.
+
+Rendering is CPU bound, so it's not run on that pool, but through
+sync_to_async like any other sync code in an async view.
+
+    client = AsyncResourceClient(Appointments, request)
+    appointments = await client.get()
+"""
+import asyncio
+from typing import Callable
+
+from asgiref.sync import sync_to_async
+
+from api import cache, prefetch
+
+# The pool backend calls (and form handling, which makes backend calls) of
+# async views are run on
+pool = prefetch.RequestPool('api-async', 'API_ASYNC_WORKERS', 32)
+
+
+async def run(request, func: Callable, *args, **kwargs):
+    """Runs a blocking func(*args, **kwargs) for the given request on the
+    async client's pool, and returns its result"""
+    return await asyncio.wrap_future(
+        pool.submit(request, func, *args, **kwargs)
+    )
+
+
+async def render(request, response):
+    """Renders a template response, if it isn't yet. Templates (and form
+    widgets) may use the thread locals set up for the request, so those are
+    set up for the thread sync_to_async renders in as well."""
+    if callable(getattr(response, 'render', None)):
+        await sync_to_async(prefetch.call_for_request)(request,
+                                                       response.render)
+
+    return response
+
+
+async def run_and_render(request, func: Callable, *args, **kwargs):
+    """Like run(), for a (sync) view method that returns a response. The
+    response is rendered afterwards, see render()."""
+    response = await run(request, func, *args, **kwargs)
+    return await render(request, response)
+
+
+async def get_resource(request, resource, **kwargs):
+    """Async version of api.cache.get_resource"""
+    return await run(request, cache.get_resource, resource, **kwargs)
+
+
+class AsyncResourceClient:
+    """Awaitable versions of the resource client methods, for the given
+    resource (collection) and request"""
+
+    def __init__(self, resource, request):
+        self.resource = resource
+        self.request = request
+
+    async def get(self, **kwargs):
+        return await run(self.request, self.resource.client.get, **kwargs)
+
+    async def delete(self, **kwargs):
+        return await run(self.request, self.resource.client.delete, **kwargs)
+
+    async def put(self, obj, **kwargs):
+        """Puts the given resource instance, returning the response
+        resource"""
+        return await run(self.request, obj.put, **kwargs)
@@ -1,4 +1,5 @@
 from django.contrib.auth.models import Group
+from django.db import transaction
 
 from .models import RemoteApiUser
 from .resources import ApiUserResource
@@ -34,49 +35,80 @@ class ApiAuthenticationBackend:
         if resource is None:
             return None
 
-        try:
-            user = RemoteApiUser.objects.get(remote_id=resource.id)
-        except RemoteApiUser.DoesNotExist:
-            user = RemoteApiUser()
-            user.pk = resource.id
-            # Also stored separately as Django apparently doesn't handle
-            # setting pk manually consistently
-            user.remote_id = resource.id
-            user.email = username
-
         request.session['token'] = resource.token
         request.session['email'] = username
 
-        user.is_superuser = resource.is_admin
-        user.is_staff = resource.is_admin
-        user.is_active = resource.is_active
-        user.is_ldap_account = resource.is_ldap_account
-
-        # We need to save first, otherwise we get errors when adding groups
-        user.save()
-
-        existing_groups = list(user.groups.all())
+        fields = {
+            'is_superuser':    resource.is_admin,
+            'is_staff':        resource.is_admin,
+            'is_active':       resource.is_active,
+            'is_ldap_account': resource.is_ldap_account,
+        }
+
+        with transaction.atomic():
+            try:
+                user = RemoteApiUser.objects.get(remote_id=resource.id)
+                changed = any(
+                    getattr(user, field) != value
+                    for field, value in fields.items()
+                )
+            except RemoteApiUser.DoesNotExist:
+                user = RemoteApiUser()
+                user.pk = resource.id
+                # Also stored separately as Django apparently doesn't handle
+                # setting pk manually consistently
+                user.remote_id = resource.id
+                user.email = username
+                changed = True
+
+            for field, value in fields.items():
+                setattr(user, field, value)
+
+            # Only write if something changed, as most logins don't change
+            # anything
+            if changed:
+                user.save()
+
+            _sync_groups(user, resource.groups)
 
-        for group in resource.groups:
-            o, created = Group.objects.get_or_create(
-                name=group.name,
-                pk=group.pk
-            )
-
-            if o in existing_groups:
-                # If we have a group that's already registered, remove it
-                # from the existing list
-                existing_groups.remove(o)
-            else:
-                user.groups.add(o)
-
-        for group in existing_groups:
-            # Loop over the existing list, and remove all that are still in
-            # the list
-            # Any group that's still in the list are not in the API anymore,
-            # so we should revoke their membership here too.
-            user.groups.remove(group)
+        return user
 
-        user.save()
 
-        return user
+def _sync_groups(user: RemoteApiUser, remote_groups) -> None:
+    """Makes the user's groups match the given groups from the API. The
+    difference is applied with (at most) one bulk insert of new groups, one
+    of new memberships and one delete; nothing is written if the groups
+    didn't change."""
+    remote = {group.pk: group.name for group in remote_groups}
+    current = set(user.groups.values_list('pk', flat=True))
+
+    to_add = remote.keys() - current
+    to_remove = current - remote.keys()
+
+    if not to_add and not to_remove:
+        return
+
+    Membership = RemoteApiUser.groups.through
+
+    if to_add:
+        existing = set(
+            Group.objects.filter(pk__in=to_add).values_list('pk', flat=True)
+        )
+        Group.objects.bulk_create(
+            [Group(pk=pk, name=remote[pk]) for pk in to_add - existing],
+            ignore_conflicts=True,
+        )
+        Membership.objects.bulk_create(
+            [Membership(remoteapiuser_id=user.pk, group_id=pk)
+             for pk in to_add],
+            ignore_conflicts=True,
+        )
+
+    if to_remove:
+        # Any group that's not in the API anymore, should be revoked here too
+        Membership.objects.filter(
+            remoteapiuser_id=user.pk,
+            group_id__in=to_remove
+        ).delete()
+
+    user.clear_group_names()
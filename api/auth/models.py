@@ -53,13 +53,30 @@ class RemoteApiUser(PermissionsMixin, AbstractBaseUser):
 
     is_ldap_account = models.BooleanField(default=False)
 
+    @property
+    def group_names(self) -> frozenset:
+        """The names of the user's groups. They're loaded once per user
+        object, which (through AuthenticationMiddleware) means once per
+        request. Call clear_group_names after changing the groups."""
+        group_names = getattr(self, '_group_names', None)
+        if group_names is None:
+            group_names = frozenset(
+                self.groups.values_list('name', flat=True)
+            ) if self.pk is not None else frozenset()
+            self._group_names = group_names
+
+        return group_names
+
+    def clear_group_names(self) -> None:
+        self._group_names = None
+
     @property
     def is_leader(self) -> bool:
-        return self.groups.filter(name=settings.GROUPS_LEADER).exists()
+        return settings.GROUPS_LEADER in self.group_names
 
     @property
     def is_participant(self) -> bool:
-        return self.groups.filter(name=settings.GROUPS_PARTICIPANT).exists()
+        return settings.GROUPS_PARTICIPANT in self.group_names
 
     def __str__(self):
         return str(self.get_username())
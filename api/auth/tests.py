@@ -1,3 +1,65 @@
-from django.test import TestCase
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.auth.backend import ApiAuthenticationBackend
+from api.auth.models import RemoteApiUser
+
+
+@override_settings(GROUPS_LEADER='leader', GROUPS_PARTICIPANT='participant')
+class RemoteApiUserTests(TestCase):
+
+    def test_group_names_are_loaded_once(self):
+        user = RemoteApiUser.objects.create(pk=1, remote_id=1)
+        user.groups.add(Group.objects.create(name='leader'))
+
+        with self.assertNumQueries(1):
+            self.assertTrue(user.is_leader)
+            self.assertFalse(user.is_participant)
+            self.assertTrue(user.is_leader)
+
+        user.groups.add(Group.objects.create(name='participant'))
+        user.clear_group_names()
+        self.assertTrue(user.is_participant)
+
+
+class GroupSyncTests(TestCase):
+
+    def _resource(self, *groups):
+        return SimpleNamespace(
+            id=1,
+            token='token',
+            is_admin=False,
+            is_active=True,
+            is_ldap_account=False,
+            groups=[SimpleNamespace(pk=pk, name=name) for pk, name in groups],
+        )
+
+    def _login(self, resource):
+        request = SimpleNamespace(session={})
+        return ApiAuthenticationBackend._get_or_create_user(
+            resource,
+            'user@example.org',
+            request
+        )
+
+    def test_sync(self):
+        user = self._login(self._resource((1, 'leader'), (2, 'participant')))
+        self.assertEqual(user.group_names, {'leader', 'participant'})
+
+        # Nothing changed, so nothing is written
+        with CaptureQueriesContext(connection) as queries:
+            self._login(self._resource((1, 'leader'), (2, 'participant')))
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ])
+
+        user = self._login(self._resource((2, 'participant'), (3, 'admin')))
+        self.assertEqual(
+            set(user.groups.values_list('name', flat=True)),
+            {'participant', 'admin'}
+        )
@@ -0,0 +1,509 @@
+"""
+A small process-wide cache for resources fetched from the backend.
+
+Only resources that are registered with the ``cacheable`` decorator are
+cached, all others are simply fetched on every call. Entries are keyed on
+the resource, the kwargs passed to the client (path variables and query
+params) and the active language, as the backend localizes some responses.
+
+The cached resources themselves are kept in-process; they are served as-is
+from memory, so they must be treated as read-only by views. Invalidations are
+shared between workers through Django's cache framework (API_CACHE_ALIAS):
+every invalidation bumps a generation counter there, and entries cached
+under an older generation are refetched. With a shared cache backend (e.g.
+memcached), a change made through one worker is seen by all others on their
+next request. With a per-process backend (the default local memory cache),
+other workers may serve a changed experiment for up to API_CACHE_TTL.
+
+Resources registered with the ``revalidated`` decorator are fetched using
+conditional GETs instead. Their parsed responses are stored together with
+their validators (ETag / Last-Modified), and are re-used if the backend
+answers with 304 Not Modified.
+
+For data that hardly ever changes, StaleWhileRevalidate can be used instead.
+
+Concurrent fetches of the same cacheable resource (or StaleWhileRevalidate
+value) are coalesced by SingleFlight: only one call goes to the backend, the
+other threads wait for it and share its result.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import get_language
+
+from api import http, prefetch, tracing
+from cdh.core.middleware import get_current_user
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """A thread-safe dictionary whose entries expire after a given TTL.
+
+    It holds at most max_size entries. Expired entries are removed whenever
+    an entry is written; if it's still full after that, the least recently
+    used entries are evicted.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                return default
+
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._data.pop(key, None)
+            self._remove_expired(now)
+
+            while len(self._data) >= self.max_size:
+                self._data.popitem(last=False)
+
+            self._data[key] = (now + ttl, value)
+
+    def _remove_expired(self, now: float) -> None:
+        for key in [key for key, (expires, _) in self._data.items()
+                    if expires < now]:
+            del self._data[key]
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_matching(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Removes all entries for which predicate(key) returns True"""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RevalidationStats:
+    """Thread-safe counters describing the effect of conditional GETs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+
+    def increment(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def as_dict(self) -> dict:
+        return {
+            'requests':     self.requests,
+            'not_modified': self.not_modified,
+            'bytes_saved':  self.bytes_saved,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.not_modified = 0
+            self.bytes_saved = 0
+
+
+class SingleFlight:
+    """Makes sure only one call per key is in flight at the same time.
+
+    Threads that call do() with a key that's already being fetched wait for
+    that call, and get its result (or exception) as well.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = Future()
+                self._in_flight[key] = future
+                self.calls += 1
+                is_leader = True
+            else:
+                self.coalesced += 1
+                is_leader = False
+
+        if not is_leader:
+            call_log = tracing.get_call_log()
+            if call_log is not None:
+                call_log.add_coalesced()
+
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def as_dict(self) -> dict:
+        return {
+            'calls':     self.calls,
+            'coalesced': self.coalesced,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.coalesced = 0
+
+
+single_flight = SingleFlight()
+
+# Holds (generations, resource) tuples for cacheable resources
+resource_cache = TTLCache(getattr(settings, 'API_CACHE_MAX_ENTRIES', 1024))
+
+# Holds (resource, validators, size) tuples for revalidated resources
+validated_cache = TTLCache(
+    getattr(settings, 'API_CONDITIONAL_CACHE_MAX_ENTRIES', 256)
+)
+
+revalidation_stats = RevalidationStats()
+
+# The names cached resources are registered with, per resource
+_cacheable_resources = {}
+
+_revalidated_resources = {}
+
+# Names of cacheable resources
+EXPERIMENT = 'experiment'
+EXPERIMENT_LISTS = ('open_experiments', 'open_experiment_summaries')
+
+# Generation counters in the shared cache, see the module docstring
+_ALL_EXPERIMENTS_GENERATION = 'api:generation:experiments'
+_EXPERIMENT_LISTS_GENERATION = 'api:generation:experiment_lists'
+
+
+def cacheable(name: str):
+    """Class decorator that marks a resource (collection) as cacheable,
+    under the given name. Cache keys (and invalidation) use this name.
+
+    Subclasses are not automatically cacheable, as they usually point to a
+    different endpoint with different access rules.
+    """
+    def decorator(resource):
+        _cacheable_resources[resource] = name
+        return resource
+
+    return decorator
+
+
+def is_cacheable(resource) -> bool:
+    return resource in _cacheable_resources
+
+
+def revalidated(name: str):
+    """Class decorator that marks a resource (collection) to be fetched with
+    conditional GETs, see the module docstring.
+
+    As the backend checks permissions before it answers a conditional
+    request, this is also safe for resources that require a logged in user.
+    Parsed responses are stored per user nonetheless.
+    """
+    def decorator(resource):
+        _revalidated_resources[resource] = name
+        return resource
+
+    return decorator
+
+
+def is_revalidated(resource) -> bool:
+    return resource in _revalidated_resources
+
+
+def get_name(resource) -> str:
+    """Returns the name a cached resource is registered with"""
+    return _cacheable_resources.get(resource) or \
+        _revalidated_resources[resource]
+
+
+def get_ttl() -> float:
+    return getattr(settings, 'API_CACHE_TTL', 60)
+
+
+def get_validated_ttl() -> float:
+    return getattr(settings, 'API_CONDITIONAL_CACHE_TTL', 3600)
+
+
+def get_shared_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def _experiment_generation(pk) -> str:
+    return 'api:generation:experiment:{}'.format(pk)
+
+
+def _generation_keys(name: str, kwargs: tuple) -> list:
+    """Returns the generation counters an entry depends on"""
+    if name in EXPERIMENT_LISTS:
+        return [_EXPERIMENT_LISTS_GENERATION]
+
+    if name == EXPERIMENT:
+        pk = dict(kwargs).get('pk')
+        return [_ALL_EXPERIMENTS_GENERATION, _experiment_generation(pk)]
+
+    return []
+
+
+def get_generations(key: tuple) -> tuple:
+    """Returns the current generations of the counters the entry with the
+    given key depends on"""
+    name, kwargs, _ = key
+    generation_keys = _generation_keys(name, kwargs)
+    if not generation_keys:
+        return ()
+
+    generations = get_shared_cache().get_many(generation_keys)
+    return tuple(generations.get(generation_key, 0)
+                 for generation_key in generation_keys)
+
+
+def _bump_generation(key: str) -> None:
+    shared_cache = get_shared_cache()
+    try:
+        shared_cache.incr(key)
+    except ValueError:
+        # Not set yet, or removed by the cache backend. Either way, entries
+        # stored with the previous value must not match anymore.
+        if not shared_cache.add(key, 1, None):
+            shared_cache.incr(key)
+
+
+def make_key(resource, **kwargs) -> tuple:
+    return (
+        get_name(resource),
+        tuple(sorted((key, str(value)) for key, value in kwargs.items())),
+        get_language(),
+    )
+
+
+def get_resource(resource, **kwargs):
+    """Returns resource.client.get(**kwargs), served from the cache if the
+    resource is cacheable and a fresh entry is present. Revalidated
+    resources are fetched with a conditional GET.
+
+    Concurrent fetches of a cacheable resource are coalesced, even if
+    caching is disabled.
+    """
+    if is_revalidated(resource):
+        return _get_revalidated(resource, make_key(resource, **kwargs),
+                                **kwargs)
+
+    if not is_cacheable(resource):
+        return resource.client.get(**kwargs)
+
+    key = make_key(resource, **kwargs)
+    ttl = get_ttl()
+    if ttl <= 0:
+        return single_flight.do(key, lambda: resource.client.get(**kwargs))
+
+    # Taken before fetching, so an invalidation during the fetch makes the
+    # new entry outdated as well
+    generations = get_generations(key)
+
+    entry = resource_cache.get(key)
+    if entry is not None and entry[0] == generations:
+        return entry[1]
+
+    def fetch():
+        obj = resource.client.get(**kwargs)
+        # Set before the flight ends, so later threads find it in the cache
+        resource_cache.set(key, (generations, obj), ttl)
+
+        return obj
+
+    return single_flight.do(key, fetch)
+
+
+def _get_revalidated(resource, key: tuple, **kwargs):
+    user = get_current_user()
+    key = key + (getattr(user, 'pk', None),)
+
+    obj, validators, size = validated_cache.get(key, (None, None, 0))
+
+    revalidation_stats.increment('requests')
+    with http.conditional(validators) as request:
+        try:
+            new_obj = resource.client.get(**kwargs)
+        except http.NotModified:
+            revalidation_stats.increment('not_modified')
+            revalidation_stats.increment('bytes_saved', size)
+            validated_cache.set(key, (obj, validators, size),
+                                get_validated_ttl())
+            return obj
+
+    if request.response_validators:
+        validated_cache.set(
+            key,
+            (new_obj, request.response_validators, request.response_size),
+            get_validated_ttl()
+        )
+    else:
+        validated_cache.delete(key)
+
+    return new_obj
+
+
+def invalidate_experiment(pk: Optional[Any]) -> None:
+    """Removes all cached data that contains the given experiment.
+
+    This includes the experiment itself (in all languages) and all
+    experiment lists, as those include the experiment as well. If pk is
+    None, all experiment related data is removed.
+
+    The entries are removed from this worker's cache right away; other
+    workers see the bumped generations in the shared cache.
+    """
+    pk = None if pk is None else str(pk)
+
+    def _matches(key):
+        name, kwargs, _ = key
+        if name in EXPERIMENT_LISTS:
+            return True
+
+        if name == EXPERIMENT:
+            return pk is None or ('pk', pk) in kwargs
+
+        return False
+
+    resource_cache.delete_matching(_matches)
+
+    _bump_generation(_EXPERIMENT_LISTS_GENERATION)
+    _bump_generation(_ALL_EXPERIMENTS_GENERATION if pk is None
+                     else _experiment_generation(pk))
+
+
+class InvalidatesExperimentMixin:
+    """Mixin for resources that change an experiment in the backend when
+    they are put. Any cached copy of that experiment is discarded afterwards.
+
+    The experiment pk is taken from the 'experiment' path variable, or from
+    the 'experiment' field if the resource has one. Pass invalidate=False
+    when putting many at once, and invalidate the experiment afterwards.
+    """
+
+    def put(self, *args, invalidate: bool = True, **kwargs):
+        try:
+            return super().put(*args, **kwargs)
+        finally:
+            if invalidate:
+                invalidate_experiment(
+                    kwargs.get('experiment',
+                               getattr(self, 'experiment', None))
+                )
+
+
+class StaleWhileRevalidate:
+    """Caches the result of a fetch function for the whole process.
+
+    Once a value is present, it is always returned immediately. If it's
+    older than the TTL, it's refreshed in the background. If that refresh
+    fails, the last known value will keep being served (and the refresh will
+    be retried after another TTL).
+
+    Only the very first call (per process) waits on the fetch function.
+    """
+
+    def __init__(self, fetch: Callable[[], Any], ttl_setting: str,
+                 default_ttl: float = 3600):
+        self.fetch = fetch
+        self.ttl_setting = ttl_setting
+        self.default_ttl = default_ttl
+        self._value = None
+        self._fetched_at = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self) -> float:
+        return getattr(settings, self.ttl_setting, self.default_ttl)
+
+    def get(self) -> Any:
+        if self._fetched_at is None:
+            return self._refresh()
+
+        if time.monotonic() - self._fetched_at > self.ttl:
+            self._refresh_in_background()
+
+        return self._value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._value = None
+            self._fetched_at = None
+
+    def _refresh(self) -> Any:
+        return single_flight.do(
+            ('StaleWhileRevalidate', id(self)),
+            self._fetch_and_store
+        )
+
+    def _fetch_and_store(self) -> Any:
+        value = self.fetch()
+
+        with self._lock:
+            self._value = value
+            self._fetched_at = time.monotonic()
+
+        return value
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        prefetch.get_executor().submit(self._background_refresh)
+
+    def _background_refresh(self) -> None:
+        try:
+            self._refresh()
+        except Exception as e:
+            logger.warning("Could not refresh cached value, keeping the "
+                           "last known value: {}".format(e))
+            # Wait another TTL before retrying
+            with self._lock:
+                self._fetched_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._refreshing = False
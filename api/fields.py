@@ -0,0 +1,156 @@
+"""
+Lazy versions of the cdh.rest ResourceField and CollectionField.
+
+These fields keep the decoded JSON of their value, and only build the
+actual resource (collection) the first time it's used. This saves a lot of
+work for views that only touch a few of the nested values of a resource.
+
+Laziness can be turned off with the API_LAZY_FIELDS setting.
+
+A lazy collection field can also be given a compact class. In compact mode
+(the API_COMPACT_RESOURCES setting) the collection is built as a tuple of
+instances of that class instead of full resources. Compact classes use
+__slots__ and are read-only, which saves a lot of memory for the big
+collections in LeaderExperiment.
+"""
+import threading
+
+from django.conf import settings
+
+from cdh.rest import client as rest
+
+_MISSING = object()
+
+# Guards the building of lazy values. They live on resources that are shared
+# between threads (see api.cache and api.prefetch), so a value may only be
+# built once. Building is CPU bound, so a single lock costs next to nothing.
+_build_lock = threading.RLock()
+
+
+class LazyValue:
+    """Stand-in for a resource (collection) that is built on first use.
+
+    Any attribute access is forwarded to the built value. len() is answered
+    from the raw JSON if the value hasn't been built yet.
+    """
+    __slots__ = ('_raw', '_build', '_value')
+
+    def __init__(self, raw, build):
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_build', build)
+        object.__setattr__(self, '_value', _MISSING)
+
+    def _get_value(self):
+        value = object.__getattribute__(self, '_value')
+
+        if value is _MISSING:
+            with _build_lock:
+                # Another thread may have built it while we were waiting
+                value = object.__getattribute__(self, '_value')
+                if value is _MISSING:
+                    value = self._build(self._raw)
+                    object.__setattr__(self, '_value', value)
+                    object.__setattr__(self, '_raw', None)
+
+        return value
+
+    @property
+    def is_built(self) -> bool:
+        return object.__getattribute__(self, '_value') is not _MISSING
+
+    def __getattr__(self, item):
+        return getattr(self._get_value(), item)
+
+    def __setattr__(self, key, value):
+        setattr(self._get_value(), key, value)
+
+    def __len__(self):
+        if not self.is_built and isinstance(self._raw, list):
+            return len(self._raw)
+
+        return len(self._get_value())
+
+    def __iter__(self):
+        return iter(self._get_value())
+
+    def __getitem__(self, item):
+        return self._get_value()[item]
+
+    def __contains__(self, item):
+        return item in self._get_value()
+
+    def __bool__(self):
+        if not self.is_built and isinstance(self._raw, list):
+            return bool(self._raw)
+
+        return bool(self._get_value())
+
+    def __eq__(self, other):
+        return self._get_value() == other
+
+    def __hash__(self):
+        return hash(self._get_value())
+
+    def __str__(self):
+        return str(self._get_value())
+
+    def __repr__(self):
+        if self.is_built:
+            return repr(self._get_value())
+
+        return '<LazyValue (not built)>'
+
+
+def filter_collection(value, predicate, raw_predicate):
+    """Returns the items of a (lazy) collection for which predicate holds.
+
+    If value is a LazyValue that hasn't been built yet, raw_predicate is
+    called on the decoded JSON of the items instead, and only the remaining
+    items will be built.
+    """
+    if isinstance(value, LazyValue) and not value.is_built:
+        raw = object.__getattribute__(value, '_raw')
+        if isinstance(raw, list):
+            return LazyValue(
+                [item for item in raw if raw_predicate(item)],
+                object.__getattribute__(value, '_build'),
+            )
+
+    return [item for item in value if predicate(item)]
+
+
+def compact_collection(compact_class):
+    """Returns a function that builds a tuple of compact_class instances from
+    a list of decoded JSON objects"""
+    def build(raw: list) -> tuple:
+        return tuple(compact_class(item) for item in raw)
+
+    return build
+
+
+class LazyFieldMixin:
+
+    def __init__(self, *args, compact=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compact = compact
+
+    def to_python(self, value):
+        if value is None:
+            return super().to_python(value)
+
+        build = super().to_python
+        if self.compact and getattr(settings, 'API_COMPACT_RESOURCES', True):
+            build = compact_collection(self.compact)
+
+        if not getattr(settings, 'API_LAZY_FIELDS', True):
+            return build(value)
+
+        return LazyValue(value, build)
+
+
+class LazyResourceField(LazyFieldMixin, rest.ResourceField):
+    pass
+
+
+class LazyCollectionField(LazyFieldMixin, rest.CollectionField):
+    pass
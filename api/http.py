@@ -0,0 +1,378 @@
+"""
+Pooled HTTP sessions for all backend calls.
+
+By default, cdh.rest uses the module level functions of requests
+(requests.get etc.), which create a new session, and thus a new connection,
+for every call. This module provides one keep-alive session per worker
+process, and makes cdh.rest use it through install() (called by
+api.apps.ApiConfig).
+
+The following settings are used:
+
+- API_POOL_CONNECTIONS: the number of hosts to keep a pool for
+- API_POOL_MAXSIZE: the max number of connections kept per host; should be
+  at least the number of threads per worker
+- API_CONNECT_TIMEOUT / API_READ_TIMEOUT: timeouts in seconds for every call
+- API_GET_RETRIES: how often idempotent (GET) calls are retried on connection
+  errors and 502/503/504 responses. Other methods are never retried, and
+  neither are calls that timed out while reading the response (the backend
+  may still be working on it) or downloads (see ApiRetry).
+
+It also provides conditional GET support, see conditional(), and streamed
+GETs, see streaming().
+"""
+import contextvars
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from api import tracing
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionStats:
+    """Thread-safe counters describing how the pooled connections are used.
+
+    Every request that did not open a new connection re-used a pooled one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    @property
+    def connections_reused(self) -> int:
+        return max(self.requests - self.connections_opened, 0)
+
+    def as_dict(self) -> dict:
+        return {
+            'requests':           self.requests,
+            'connections_opened': self.connections_opened,
+            'connections_reused': self.connections_reused,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests = 0
+            self.connections_opened = 0
+
+
+stats = ConnectionStats()
+
+
+class _CountingPoolMixin:
+
+    def _new_conn(self):
+        stats.increment('connections_opened')
+        return super()._new_conn()
+
+
+class CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that keeps track of the number of requests sent and
+    connections opened"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http':  CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, *args, **kwargs):
+        stats.increment('requests')
+        return super().send(request, *args, **kwargs)
+
+
+class ApiRetry(Retry):
+    """The retry policy for backend calls.
+
+    The backend logs a download event for GETs with the download parameter,
+    so those are only retried if the connection couldn't be made at all; a
+    retry after a read error or an error response would log it again.
+    """
+
+    def increment(self, method=None, url=None, *args, **kwargs):
+        if url and 'download' in parse_qs(urlsplit(url).query):
+            return super(ApiRetry, self.new(read=0, status=0)).increment(
+                method, url, *args, **kwargs
+            )
+
+        return super().increment(method, url, *args, **kwargs)
+
+
+class NotModified(Exception):
+    """Raised when a conditional GET is answered with 304 Not Modified.
+
+    This is raised from within the session, so it passes through the
+    cdh.rest client (which would otherwise try to parse the empty body).
+    """
+
+
+class ConditionalRequest:
+    """The state of a conditional() block.
+
+    'validators' are the validators sent with the request.
+    'response_validators' and 'response_size' describe the last successful
+    GET response.
+    """
+    VALIDATOR_HEADERS = {
+        'ETag':          'If-None-Match',
+        'Last-Modified': 'If-Modified-Since',
+    }
+
+    def __init__(self, validators: Optional[dict]):
+        self.validators = validators or {}
+        self.response_validators = {}
+        self.response_size = 0
+
+    @property
+    def headers(self) -> dict:
+        return {
+            self.VALIDATOR_HEADERS[header]: value
+            for header, value in self.validators.items()
+        }
+
+    def process_response(self, response: requests.Response) -> None:
+        if response.status_code == 304:
+            raise NotModified
+
+        if response.ok:
+            self.response_validators = {
+                header: response.headers[header]
+                for header in self.VALIDATOR_HEADERS
+                if header in response.headers
+            }
+            self.response_size = len(response.content)
+
+
+_conditional_request = contextvars.ContextVar('api_conditional_request',
+                                              default=None)
+
+
+@contextmanager
+def conditional(validators: Optional[dict] = None):
+    """Makes all GET requests in this block conditional.
+
+    validators is a dict with the ETag and/or Last-Modified header values of
+    a previous response. A 304 response will raise NotModified. The
+    validators of a full response can be found on the yielded
+    ConditionalRequest.
+    """
+    state = ConditionalRequest(validators)
+    token = _conditional_request.set(state)
+    try:
+        yield state
+    finally:
+        _conditional_request.reset(token)
+
+
+class StreamingResponse(Exception):
+    """Raised (inside a streaming() block) with the response of a successful
+    GET, before its body is read.
+
+    Like NotModified, this passes straight through the cdh.rest client, so
+    the caller can read the body incrementally instead.
+    """
+
+    def __init__(self, response: requests.Response):
+        super().__init__(response.url)
+        self.response = response
+
+
+_streaming = contextvars.ContextVar('api_streaming', default=False)
+
+
+@contextmanager
+def streaming():
+    """Makes all GET requests in this block streamed.
+
+    A successful response raises StreamingResponse, which holds the response
+    with its body still unread. Failed responses are handled as usual.
+    """
+    token = _streaming.set(True)
+    try:
+        yield
+    finally:
+        _streaming.reset(token)
+
+
+class ApiSession(requests.Session):
+    """A session that applies the configured timeouts to every request, and
+    records every request in the current api.tracing.CallLog.
+
+    Cookies are never stored, as this session is shared between all users of
+    a worker process.
+    """
+
+    def __init__(self, timeout: tuple):
+        super().__init__()
+        self.timeout = timeout
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+
+        with tracing.Timer(method, url) as timer:
+            try:
+                response = self._request(method, url, **kwargs)
+            except NotModified:
+                timer.status = 304
+                raise
+            except StreamingResponse as e:
+                timer.status = e.response.status_code
+                timer.size = int(e.response.headers.get('Content-Length', 0))
+                raise
+
+            timer.status = response.status_code
+            timer.size = len(response.content)
+
+        return response
+
+    def _request(self, method, url, **kwargs):
+        if _streaming.get() and method.upper() == 'GET':
+            kwargs['stream'] = True
+            response = super().request(method, url, **kwargs)
+            if response.ok:
+                raise StreamingResponse(response)
+
+            return response
+
+        conditional_request = _conditional_request.get()
+        if conditional_request is None or method.upper() != 'GET':
+            return super().request(method, url, **kwargs)
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        headers.update(conditional_request.headers)
+
+        response = super().request(method, url, headers=headers, **kwargs)
+        conditional_request.process_response(response)
+
+        return response
+
+
+def create_session() -> ApiSession:
+    session = ApiSession(timeout=(
+        getattr(settings, 'API_CONNECT_TIMEOUT', 3.05),
+        getattr(settings, 'API_READ_TIMEOUT', 30),
+    ))
+
+    retries = getattr(settings, 'API_GET_RETRIES', 2)
+    adapter = PooledHTTPAdapter(
+        pool_connections=getattr(settings, 'API_POOL_CONNECTIONS', 4),
+        pool_maxsize=getattr(settings, 'API_POOL_MAXSIZE', 10),
+        max_retries=ApiRetry(
+            total=retries,
+            connect=retries,
+            # A read timeout already took API_READ_TIMEOUT seconds
+            read=0,
+            status=retries,
+            backoff_factor=0.1,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        ),
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> ApiSession:
+    """Returns the session of this worker process. A new session is created
+    after a fork, as connections cannot be shared between processes."""
+    global _session, _session_pid
+
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                _session = create_session()
+                _session_pid = os.getpid()
+
+    return _session
+
+
+def reset_session() -> None:
+    """Closes the current session; the next call will create a new one"""
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+class SessionRequests:
+    """Drop-in replacement for the requests module, which routes all calls
+    through the pooled session. Everything else (exceptions, etc.) is taken
+    from the requests module itself.
+    """
+
+    def request(self, method, url, **kwargs):
+        return get_session().request(method, url, **kwargs)
+
+    def get(self, url, params=None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request('PUT', url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(requests, item)
+
+
+def install() -> None:
+    """Makes the cdh.rest client use the pooled session"""
+    try:
+        from cdh.rest.client import client as rest_client
+    except ImportError:
+        logger.warning('Could not install pooled sessions: the cdh.rest '
+                       'client module could not be found')
+        return
+
+    # The client has to call requests through its module attribute, or
+    # replacing it does nothing
+    if not hasattr(rest_client, 'requests'):
+        raise ImproperlyConfigured('The cdh.rest client does not use the '
+                                   'requests module attribute, so pooled '
+                                   'sessions can not be installed')
+
+    rest_client.requests = SessionRequests()
@@ -0,0 +1,122 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from api.resources import LeaderExperiments, OpenExperiments
+from api.testing.data import make_experiment
+from participant.utils import experiment_is_open
+
+
+def _parse(data):
+    # Collections parse JSON by default, so this is the same code path the
+    # client uses for a fetched experiment
+    return list(OpenExperiments([data]))[0]
+
+
+def _parse_leader(data):
+    return list(LeaderExperiments([data]))[0]
+
+
+def _participants(data):
+    """What the participants and CSV views do: touch every participant of
+    every timeslot"""
+    experiment = _parse_leader(data)
+    rows = []
+    for timeslot in experiment.timeslots:
+        for n, appointment in timeslot.takes_places_tuple:
+            rows.append((
+                timeslot.datetime,
+                n,
+                appointment.participant.name,
+                appointment.participant.birth_date,
+                appointment.participant.get_social_status_display(),
+            ))
+
+    return experiment, rows
+
+
+# Per mode: the setting that is compared, whether the leader format is used,
+# and the scenarios to run
+MODES = {
+    'lazy':    ('API_LAZY_FIELDS', False, {
+        # Only deserialize the experiment
+        'parse':   _parse,
+        # What RegisterSuccessView does
+        'name':    lambda data: str(_parse(data)),
+        # What the register views do before anything else
+        'is_open': lambda data: experiment_is_open(_parse(data)),
+    }),
+    'compact': ('API_COMPACT_RESOURCES', True, {
+        'parse':        lambda data: list(_parse_leader(data).timeslots),
+        'participants': _participants,
+    }),
+}
+
+
+class Command(BaseCommand):
+    help = "Measures the time and memory needed to deserialize an " \
+           "experiment (and use parts of it), comparing lazy or compact " \
+           "resources with regular ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=MODES.keys(), default='lazy')
+        parser.add_argument('--timeslots', type=int, default=500)
+        parser.add_argument('--places', type=int, default=2)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        setting, leader, scenarios = MODES[options['mode']]
+
+        data = make_experiment(
+            n_timeslots=options['timeslots'],
+            max_places=options['places'],
+            occupancy=1 if leader else 0.5,
+            leader=leader,
+        )
+
+        self.stdout.write(
+            "{:<13} {:<8} {:>12} {:>14} {:>12}".format(
+                'scenario', options['mode'], 'time (ms)', 'live blocks',
+                'peak (KiB)'
+            )
+        )
+
+        for name, scenario in scenarios.items():
+            for enabled in (False, True):
+                with override_settings(**{setting: enabled}):
+                    duration, blocks, peak = self._measure(
+                        scenario,
+                        data,
+                        options['repeat']
+                    )
+
+                self.stdout.write(
+                    "{:<13} {:<8} {:>12.2f} {:>14} {:>12.1f}".format(
+                        name, str(enabled), duration * 1000, blocks,
+                        peak / 1024
+                    )
+                )
+
+    @staticmethod
+    def _measure(scenario, data, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            scenario(data)
+        duration = (time.perf_counter() - start) / repeat
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        result = scenario(data)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        blocks = sum(
+            stat.count_diff for stat in after.compare_to(before, 'filename')
+        )
+
+        del result
+
+        return duration, blocks, peak
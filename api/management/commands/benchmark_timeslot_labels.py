@@ -0,0 +1,77 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from babel.dates import format_datetime
+from django.core.management.base import BaseCommand
+from django.utils.translation import override
+
+from api.resources.timeslot_resources import timeslot_label
+
+
+def _uncached_label(timeslot_id, dt, free_places, language):
+    """The label as it was rendered before timeslot_label, for comparison"""
+    places_str = "uur"
+    if free_places > 1:
+        places_str = "uur ({} plekken resterend)".format(free_places)
+
+    return format_datetime(
+        dt,
+        'EEEE, dd-MM-YYYY, HH:mm {}',
+        locale=language
+    ).format(
+        places_str
+    ).capitalize()
+
+
+class Command(BaseCommand):
+    help = "Measures rendering the labels of the register form's timeslots: " \
+           "uncached (babel's format_datetime), the first render of " \
+           "timeslot_label and a cached render."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeslots', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--language', default='nl')
+
+    def handle(self, *args, **options):
+        start = datetime.now(tz=timezone.utc).replace(minute=0, second=0,
+                                                      microsecond=0)
+        timeslots = [
+            (pk, start + timedelta(minutes=30 * pk), pk % 3)
+            for pk in range(options['timeslots'])
+        ]
+        language = options['language']
+
+        def uncached():
+            for pk, dt, free_places in timeslots:
+                _uncached_label(pk, dt, free_places, language)
+
+        def cached():
+            for pk, dt, free_places in timeslots:
+                timeslot_label(pk, dt, free_places, language)
+
+        self.stdout.write("{:<10} {:>12} {:>14}".format(
+            'mode', 'total (ms)', 'per label (us)'
+        ))
+
+        with override(language):
+            self._measure('uncached', uncached, options, len(timeslots))
+
+            timeslot_label.cache_clear()
+            self._measure('first', cached, options, len(timeslots), 1)
+
+            self._measure('cached', cached, options, len(timeslots))
+
+    def _measure(self, name, func, options, n, repeat=None):
+        durations = []
+        for _ in range(repeat or options['repeat']):
+            start = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - start)
+
+        duration = min(durations)
+        self.stdout.write("{:<10} {:>12.2f} {:>14.2f}".format(
+            name,
+            duration * 1000,
+            duration / n * 1_000_000,
+        ))
@@ -0,0 +1,192 @@
+import time
+import tracemalloc
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import setup_databases, setup_test_environment, \
+    teardown_databases, teardown_test_environment
+from django.urls import reverse
+
+from api import cache
+from api.resources import Experiment
+from api.testing.backend import LEADER_EMAIL, StubBackend, use_stub_backend
+from api.testing.forms import register_form_data
+
+PARTICIPANT_EMAIL = 'participant@example.org'
+
+
+def _register_data(experiment_pk):
+    def data():
+        experiment = Experiment.client.get(pk=experiment_pk)
+        return register_form_data(experiment, 'new@example.org')
+
+    return data
+
+
+# A request for the first page of the participants table, as sent by
+# DataTables
+_PARTICIPANTS_PAGE = {
+    'draw':             1,
+    'start':            0,
+    'length':           50,
+    'order[0][column]': 0,
+    'order[0][dir]':    'asc',
+    'search[value]':    'example',
+}
+
+
+# Per scenario: who's logged in (None, 'participant' or 'leader'), the
+# method, the url name, and the request data (a callable, called once)
+SCENARIOS = {
+    'home':                (None, 'get', 'main:home', None),
+    'home_api':            (None, 'get', 'main:home_api', None),
+    'register':            (None, 'get', 'participant:register', None),
+    'register_post':       (None, 'post', 'participant:register',
+                            _register_data(1)),
+    'register_logged_in':  ('participant', 'get',
+                            'participant:register_logged_in', None),
+    'leader_timeslots':    ('leader', 'get', 'leader:timeslots', None),
+    'leader_participants': ('leader', 'get', 'leader:participants', None),
+    'leader_participants_data': ('leader', 'get', 'leader:participants_data',
+                                 lambda: _PARTICIPANTS_PAGE),
+    'leader_csv':          ('leader', 'get', 'leader:download_csv', None),
+}
+
+# URL names that take the experiment as argument
+_EXPERIMENT_URLS = {
+    'participant:register',
+    'participant:register_logged_in',
+    'leader:timeslots',
+    'leader:participants',
+    'leader:participants_data',
+    'leader:download_csv',
+}
+
+
+def _percentile(sorted_values: list, percentile: float) -> float:
+    index = round(percentile / 100 * (len(sorted_values) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "Measures the latency, backend calls and memory use of the views " \
+           "against a stub backend (see api.testing.backend). Uses a test " \
+           "database, like the test runner."
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*',
+                            help='One or more of {}; defaults to all'.format(
+                                ', '.join(SCENARIOS.keys())
+                            ))
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--experiments', type=int, default=10)
+        parser.add_argument('--timeslots', type=int, default=50)
+        parser.add_argument('--places', type=int, default=2)
+        parser.add_argument('--occupancy', type=float, default=0.5)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Seconds added to every backend call')
+        parser.add_argument('--cold', action='store_true',
+                            help='Clear the resource caches before every '
+                                 'request')
+
+    def handle(self, *args, **options):
+        for name in options['scenarios']:
+            if name not in SCENARIOS:
+                raise CommandError('Unknown scenario: {}'.format(name))
+
+        backend = StubBackend(
+            n_experiments=options['experiments'],
+            n_timeslots=options['timeslots'],
+            max_places=options['places'],
+            occupancy=options['occupancy'],
+            latency=options['latency'],
+        )
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # Spam checks call an external service, which we don't measure
+            with use_stub_backend(backend), mock.patch(
+                    'participant.utils.check_if_email_is_spammer',
+                    return_value=False):
+                self._run(backend, options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, backend, options):
+        clients = {
+            None:          Client(),
+            'participant': self._login(PARTICIPANT_EMAIL),
+            'leader':      self._login(LEADER_EMAIL),
+        }
+
+        self.stdout.write(
+            "{:<25} {:>9} {:>9} {:>9} {:>7} {:>11} {:>8}".format(
+                'scenario', 'p50 (ms)', 'p99 (ms)', 'max (ms)', 'calls',
+                'peak (KiB)', 'status'
+            )
+        )
+
+        for name in options['scenarios'] or SCENARIOS.keys():
+            user, method, url_name, data = SCENARIOS[name]
+            client = clients[user]
+            args = [1] if url_name in _EXPERIMENT_URLS else []
+            request = getattr(client, method)
+            url = reverse(url_name, args=args)
+            kwargs = {'data': data()} if data else {}
+
+            def run():
+                if options['cold']:
+                    cache.resource_cache.clear()
+                    cache.validated_cache.clear()
+
+                response = request(url, **kwargs)
+                # Include the time it takes to generate a streamed response
+                if response.streaming:
+                    b''.join(response.streaming_content)
+
+                return response
+
+            # Warm up (fills the caches, unless we run cold)
+            run()
+
+            durations = []
+            statuses = set()
+            calls_before = backend.calls
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                response = run()
+                durations.append(time.perf_counter() - start)
+                statuses.add(response.status_code)
+            calls = (backend.calls - calls_before) / options['requests']
+
+            tracemalloc.start()
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            durations.sort()
+            self.stdout.write(
+                "{:<25} {:>9.1f} {:>9.1f} {:>9.1f} {:>7.1f} {:>11.1f} "
+                "{:>8}".format(
+                    name,
+                    _percentile(durations, 50) * 1000,
+                    _percentile(durations, 99) * 1000,
+                    durations[-1] * 1000,
+                    calls,
+                    peak / 1024,
+                    ','.join(str(status) for status in sorted(statuses)),
+                )
+            )
+
+    @staticmethod
+    def _login(email):
+        client = Client()
+        client.post(reverse('main:login'), {
+            'username': email,
+            'password': 'stub',
+        })
+
+        return client
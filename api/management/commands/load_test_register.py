@@ -0,0 +1,175 @@
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from api.resources import Experiment
+from api.testing.forms import register_form_data
+
+STEPS = ('register', 'submit', 'success')
+
+_CSRF_TOKEN = re.compile(
+    r'name=["\']csrfmiddlewaretoken["\'] value=["\']([^"\']+)["\']'
+)
+
+
+class StepStats:
+    """Latencies and errors of one step of the funnel"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = []
+        self.errors = 0
+
+    def add(self, duration: float, ok: bool) -> None:
+        with self._lock:
+            self.durations.append(duration)
+            if not ok:
+                self.errors += 1
+
+    def percentile(self, percentile: float) -> float:
+        durations = sorted(self.durations)
+        if not durations:
+            return 0.0
+
+        return durations[round(percentile / 100 * (len(durations) - 1))]
+
+
+class Command(BaseCommand):
+    help = "Replays the registration funnel after a mailing (register page, " \
+           "form submission, success page) against a running frontend, at " \
+           "a fixed arrival rate. Run the frontend against a stub backend " \
+           "(see serve_stub_backend) to size the number of workers. This " \
+           "command fetches the experiment from API_HOST to fill in the form."
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Base URL of the frontend, e.g. '
+                                        'http://127.0.0.1:8000/')
+        parser.add_argument('--experiment', type=int, default=1)
+        parser.add_argument('--rate', type=float, default=5,
+                            help='New users per second')
+        parser.add_argument('--duration', type=float, default=60,
+                            help='Seconds during which users arrive')
+        parser.add_argument('--max-users', type=int, default=200,
+                            help='Max number of users active at once')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+
+        experiment_pk = options['experiment']
+        experiment = Experiment.client.get(pk=experiment_pk)
+
+        self.base_url = options['url']
+        self.timeout = options['timeout']
+        # The form is the same for every user, except for the email address
+        self.form_data = register_form_data(experiment, '')
+        self.stats = {step: StepStats() for step in STEPS}
+        self.register_url = urljoin(
+            self.base_url,
+            reverse('participant:register', args=[experiment_pk])
+        )
+        self.success_url = urljoin(
+            self.base_url,
+            reverse('participant:register_success', args=[experiment_pk])
+        )
+
+        n_users = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['max_users']) as pool:
+            # Open model: users arrive at the given rate (as a Poisson
+            # process), regardless of how long earlier users take
+            next_arrival = start
+            while next_arrival - start < options['duration']:
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+                pool.submit(self._user, n_users)
+                n_users += 1
+                next_arrival += random.expovariate(options['rate'])
+
+        elapsed = time.perf_counter() - start
+        self._report(n_users, elapsed)
+
+    def _user(self, n: int) -> None:
+        session = requests.Session()
+
+        ok, response = self._step('register', session.get, self.register_url)
+        if not ok:
+            return
+
+        match = _CSRF_TOKEN.search(response.text)
+        data = dict(self.form_data)
+        data['email'] = 'loadtest+{}@example.org'.format(n)
+        data['csrfmiddlewaretoken'] = match.group(1) if match else ''
+
+        ok, response = self._step(
+            'submit',
+            session.post,
+            self.register_url,
+            data=data,
+            headers={'Referer': self.register_url},
+            allow_redirects=False,
+            expected_redirect=self.success_url,
+        )
+        if not ok:
+            return
+
+        self._step('success', session.get, self.success_url)
+
+    def _step(self, step: str, method, url: str, expected_redirect=None,
+              **kwargs):
+        start = time.perf_counter()
+        try:
+            response = method(url, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.stats[step].add(time.perf_counter() - start, False)
+            return False, None
+        duration = time.perf_counter() - start
+
+        if expected_redirect:
+            location = urljoin(url, response.headers.get('Location', ''))
+            ok = response.status_code == 302 and location == expected_redirect
+        else:
+            # A closed experiment redirects as well, which counts as an error
+            ok = response.status_code == 200 and not response.history
+
+        self.stats[step].add(duration, ok)
+        return ok, response
+
+    def _report(self, n_users: int, elapsed: float) -> None:
+        self.stdout.write("{} users in {:.1f}s ({:.1f} users/s)".format(
+            n_users,
+            elapsed,
+            n_users / elapsed,
+        ))
+        self.stdout.write(
+            "{:<10} {:>8} {:>8} {:>8} {:>9} {:>9} {:>9}".format(
+                'step', 'requests', 'req/s', 'errors', 'p50 (ms)', 'p95 (ms)',
+                'p99 (ms)'
+            )
+        )
+
+        for step in STEPS:
+            stats = self.stats[step]
+            n = len(stats.durations)
+            self.stdout.write(
+                "{:<10} {:>8} {:>8.1f} {:>7.1f}% {:>9.1f} {:>9.1f} "
+                "{:>9.1f}".format(
+                    step,
+                    n,
+                    n / elapsed,
+                    stats.errors / n * 100 if n else 0,
+                    stats.percentile(50) * 1000,
+                    stats.percentile(95) * 1000,
+                    stats.percentile(99) * 1000,
+                )
+            )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from api.testing.backend import StubBackend, serve
+
+
+class Command(BaseCommand):
+    help = "Serves the stub backend (see api.testing.backend) over HTTP. " \
+           "Point API_HOST of the frontend under test to it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--experiments', type=int, default=10)
+        parser.add_argument('--timeslots', type=int, default=50)
+        parser.add_argument('--places', type=int, default=2)
+        parser.add_argument('--occupancy', type=float, default=0.5)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help='Seconds added to every backend call')
+
+    def handle(self, *args, **options):
+        backend = StubBackend(
+            n_experiments=options['experiments'],
+            n_timeslots=options['timeslots'],
+            max_places=options['places'],
+            occupancy=options['occupancy'],
+            latency=options['latency'],
+        )
+        server = serve(backend, options['host'], options['port'])
+
+        self.stdout.write("Serving the stub backend on http://{}:{}/".format(
+            options['host'],
+            options['port']
+        ))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write("{} calls served".format(backend.calls))
@@ -1 +1,3 @@
+from .backend_calls_middleware import BackendCallsMiddleware
 from .password_change_middleware import PasswordChangeMiddleware
+from .thread_local_user_middleware import ThreadLocalUserMiddleware
@@ -0,0 +1,72 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from api import tracing
+
+logger = logging.getLogger('api.calls')
+
+
+class BackendCallsMiddleware:
+    """This middleware records all backend calls made during a request.
+
+    They are added to the response as a Server-Timing header (if
+    API_SERVER_TIMING is enabled), and logged as one JSON line per request
+    to the 'api.calls' logger. Only the route of the request is logged, as
+    its path may contain tokens (e.g. of the cancel links).
+
+    It supports both sync and async requests, so async views don't have to
+    be run through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+
+        with tracing.record_calls() as call_log:
+            response = self.get_response(request)
+
+        return self.process_calls(request, response, call_log, start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+
+        with tracing.record_calls() as call_log:
+            response = await self.get_response(request)
+
+        return self.process_calls(request, response, call_log, start)
+
+    def process_calls(self, request, response, call_log: tracing.CallLog,
+                      start: float):
+        if not call_log and not call_log.coalesced:
+            return response
+
+        if getattr(settings, 'API_SERVER_TIMING', True):
+            response['Server-Timing'] = call_log.server_timing()
+
+        if logger.isEnabledFor(logging.INFO):
+            resolver_match = request.resolver_match
+            data = {
+                'method':      request.method,
+                'route':       getattr(resolver_match, 'route', None),
+                'view':        getattr(resolver_match, 'view_name', None),
+                'status':      response.status_code,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 1),
+            }
+            data.update(call_log.as_dict())
+
+            logger.info(json.dumps(data), extra={'backend_calls': data})
+
+        return response
@@ -1,5 +1,7 @@
 import re
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, \
+    sync_to_async
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 
@@ -7,12 +9,32 @@ from django.urls import reverse
 class PasswordChangeMiddleware:
     """This middleware will force a user to change their password if
     specified to do so.
+
+    It supports both sync and async requests. For async requests, the user
+    (and session) are loaded in a thread, as that uses the database.
     """
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        return self.get_redirect(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        redirect = await sync_to_async(self.get_redirect)(request)
+
+        return redirect or await self.get_response(request)
+
+    def get_redirect(self, request):
+        """Returns a redirect to the change password page, if the user has to
+        change their password first"""
         if request.user.is_authenticated and \
                 not re.match(r'^/change_password/?', request.path) and not \
                 re.match(r'^/logout/?', request.path):
@@ -21,4 +43,4 @@ class PasswordChangeMiddleware:
                 url = reverse('main:change_password')
                 return HttpResponseRedirect(url)
 
-        return self.get_response(request)
+        return None
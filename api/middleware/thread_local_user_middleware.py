@@ -0,0 +1,60 @@
+from asgiref.sync import async_to_sync, iscoroutinefunction, \
+    markcoroutinefunction, sync_to_async
+from django.urls import Resolver404, get_resolver
+
+from cdh.core import middleware as cdh_middleware
+
+
+class ThreadLocalUserMiddleware:
+    """cdh.core's ThreadLocalUserMiddleware, for both sync and async
+    requests.
+
+    The cdh middleware sets up thread locals, which the resource client uses
+    to find the current user. For sync requests (and sync views in an async
+    request), it's used as is. Async views don't need it, as they set the
+    thread locals up for the code they run in a thread themselves (see
+    api.async_client). So for those, the request isn't moved to a thread
+    first, like Django would for a sync only middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+            # As Django would adapt the cdh middleware: it runs in a thread,
+            # and so does the rest of the request (including the view)
+            self.middleware = sync_to_async(
+                cdh_middleware.ThreadLocalUserMiddleware(
+                    async_to_sync(self.get_response)
+                )
+            )
+        else:
+            self.middleware = cdh_middleware.ThreadLocalUserMiddleware(
+                self.get_response
+            )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        return self.middleware(request)
+
+    async def __acall__(self, request):
+        if is_async_view(request):
+            return await self.get_response(request)
+
+        return await self.middleware(request)
+
+
+def is_async_view(request) -> bool:
+    """Returns whether the request will be handled by an async view"""
+    resolver = get_resolver(getattr(request, 'urlconf', None))
+    try:
+        match = resolver.resolve(request.path_info)
+    except Resolver404:
+        return False
+
+    return iscoroutinefunction(match.func)
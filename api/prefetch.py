@@ -0,0 +1,109 @@
+"""
+Concurrent fetching of independent backend resources.
+
+Views often need several resources that do not depend on each other. Instead
+of fetching them one after another, they can be submitted to a bounded,
+process-wide thread pool and collected later. See
+main.mixins.PrefetchMixin for the view side of things.
+
+The pool size can be configured with API_PREFETCH_WORKERS. Work that
+shouldn't compete with the prefetches of page views (like the backend calls
+of async views) uses a RequestPool of its own.
+"""
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from cdh.core.middleware import ThreadLocalUserMiddleware
+
+
+class RequestPool:
+    """A bounded thread pool for functions that run on behalf of a request
+    (see submit()). The pool is created on first use, with the number of
+    workers given by the named setting."""
+
+    def __init__(self, name: str, workers_setting: str,
+                 default_workers: int):
+        self.name = name
+        self.workers_setting = workers_setting
+        self.default_workers = default_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=getattr(settings, self.workers_setting,
+                                            self.default_workers),
+                        thread_name_prefix=self.name,
+                    )
+
+        return self._executor
+
+    def submit(self, request, func: Callable, *args, **kwargs) -> Future:
+        """Schedules func(*args, **kwargs) on the pool for the given
+        request"""
+        context = contextvars.copy_context()
+        return self.get_executor().submit(
+            _run_for_request,
+            context,
+            request,
+            lambda: func(*args, **kwargs)
+        )
+
+
+# The pool for prefetches, shared by all views
+pool = RequestPool('api-prefetch', 'API_PREFETCH_WORKERS', 8)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    return pool.get_executor()
+
+
+def call_for_request(request, func: Callable):
+    """Calls func in the current thread, with the thread locals of
+    cdh.core.middleware set up for the given request (if any)"""
+    if request is None:
+        return func()
+
+    return ThreadLocalUserMiddleware(lambda _: func())(request)
+
+
+def _run_for_request(context, request, func: Callable):
+    """Runs func in the context of the submitting thread, with the current
+    request set up as it is for the view itself.
+
+    The resource client finds the user (and their token) through the thread
+    locals set by ThreadLocalUserMiddleware, so we run the function through
+    that middleware. The language is carried over by the copied context.
+
+    Like a request, the function may use the database (the middleware loads
+    the user). Django only closes the connections of request threads, so the
+    ones opened here are closed (or checked, with persistent connections)
+    like a request would.
+    """
+    close_old_connections()
+    try:
+        return context.run(call_for_request, request, func)
+    finally:
+        close_old_connections()
+
+
+def submit(request, func: Callable, *args, **kwargs) -> Future:
+    """Schedules func(*args, **kwargs) on the prefetch pool for the given
+    request"""
+    return pool.submit(request, func, *args, **kwargs)
+
+
+def prefetch(request, funcs: Dict[str, Callable]) -> Dict[str, Future]:
+    """Submits all given callables, returning a dict of futures with the
+    same keys"""
+    return {
+        name: submit(request, func) for name, func in funcs.items()
+    }
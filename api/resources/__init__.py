@@ -3,8 +3,10 @@ from .account_resources import ChangePassword, ForgotPassword, ResetPassword, \
 from .admin_resource import Admin
 from .criteria_resources import Criterion, DefaultCriteria, ExperimentCriteria, \
     ExperimentCriterion
-from .experiment_resources import Experiment, LeaderExperiments, \
-    OpenExperiments, SwitchExperimentOpen
+from .experiment_resources import Experiment, ExperimentSummary, \
+    LeaderExperiments, OpenExperiments, OpenExperimentSummaries, \
+    SwitchExperimentOpen
+from .generic_resources import sparse_fieldset, timeslot_window
 from .leader_resources import Leader, Leaders
 from .participant_resources import Appointment, Appointments, \
     MailinglistSubscribe
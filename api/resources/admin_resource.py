@@ -1,5 +1,7 @@
 from cdh.rest import client as rest
 
+from api.cache import StaleWhileRevalidate
+
 
 class Admin(rest.Resource):
     """
@@ -18,3 +20,16 @@ class Admin(rest.Resource):
     @property
     def name(self):
         return "{} {}".format(self.first_name, self.last_name)
+
+    @classmethod
+    def get_cached(cls) -> 'Admin':
+        """Returns the administrator from the process wide cache, see
+        StaleWhileRevalidate. The TTL is set with API_ADMIN_CACHE_TTL.
+        """
+        return _admin_cache.get()
+
+
+_admin_cache = StaleWhileRevalidate(
+    lambda: Admin.client.get(),
+    'API_ADMIN_CACHE_TTL',
+)
@@ -1,5 +1,12 @@
+from django.utils.functional import cached_property
+
 from cdh.rest import client as rest
 
+from api.cache import InvalidatesExperimentMixin, cacheable, revalidated
+from api.fields import LazyCollectionField, LazyResourceField
+from api.resources.timeslot_resources import CompactLeaderInlineTimeSlot, \
+    CompactLeaderTimeSlotAppointment, TimeSlotAvailability
+
 
 class Location(rest.Resource):
     """
@@ -13,6 +20,7 @@ class Location(rest.Resource):
     route_url = rest.TextField(blank=True, null=True)
 
 
+@cacheable('experiment')
 class Experiment(rest.Resource):
     class Meta:
         path = '/api/experiments/{pk}/'
@@ -38,24 +46,26 @@ class Experiment(rest.Resource):
 
     location = rest.ResourceField(Location, null=True, blank=True)
 
-    leader = rest.ResourceField('Leader')  # We cannot import this, as this
+    # The nested resources are only built when used, see api.fields
+
+    leader = LazyResourceField('Leader')  # We cannot import this, as this
     # will cause a circular import
 
-    additional_leaders = rest.CollectionField('Leaders')
+    additional_leaders = LazyCollectionField('Leaders')
 
-    excluded_experiments = rest.CollectionField('OpenExperiments')
+    excluded_experiments = LazyCollectionField('OpenExperiments')
 
-    defaultcriteria = rest.ResourceField(
+    defaultcriteria = LazyResourceField(
         'DefaultCriteria',
         null=True,
         blank=True
     )
 
-    specific_criteria = rest.CollectionField('ExperimentCriteria')
+    specific_criteria = LazyCollectionField('ExperimentCriteria')
 
     use_timeslots = rest.BoolField()
 
-    timeslots = rest.CollectionField('InlineTimeSlots')
+    timeslots = LazyCollectionField('InlineTimeSlots')
 
     default_max_places = rest.IntegerField()
 
@@ -72,6 +82,12 @@ class Experiment(rest.Resource):
 
         return False
 
+    @cached_property
+    def availability(self) -> TimeSlotAvailability:
+        """The timeslots, indexed to find the bookable ones. As the
+        experiment is cached (see api.cache), so is its index."""
+        return TimeSlotAvailability(self.timeslots)
+
     def n_timeslots(self):
         return sum([t.max_places for t in self.timeslots])
 
@@ -79,14 +95,21 @@ class Experiment(rest.Resource):
         return ", ".join([leader.name for leader in self.additional_leaders])
 
 
+@revalidated('leader_experiment')
 class LeaderExperiment(Experiment):
     class Meta:
         path = '/api/leader_experiments/{pk}/'
         path_variables = ['pk']
 
-    timeslots = rest.CollectionField('LeaderInlineTimeSlots')
+    timeslots = LazyCollectionField(
+        'LeaderInlineTimeSlots',
+        compact=CompactLeaderInlineTimeSlot,
+    )
 
-    appointments = rest.CollectionField('LeaderTimeSlotAppointments')
+    appointments = LazyCollectionField(
+        'LeaderTimeSlotAppointments',
+        compact=CompactLeaderTimeSlotAppointment,
+    )
 
     @property
     def n_participants(self):
@@ -119,12 +142,68 @@ class LeaderExperiments(rest.ResourceCollection):
         path = '/api/leader_experiments/'
 
 
+@cacheable('open_experiments')
 class OpenExperiments(rest.ResourceCollection):
     class Meta:
         resource = Experiment
         path = '/api/experiments/'
 
 
+#
+# Sparse fieldsets
+#
+
+class ExperimentSummary(rest.Resource):
+    """
+    A sparse version of Experiment, containing only what's needed to list an
+    experiment on the home page. Use it through OpenExperimentSummaries.
+
+    Only the fields declared here are deserialized, any other data the
+    backend sends is ignored.
+    """
+    id = rest.IntegerField()
+
+    name = rest.TextField()
+
+    duration = rest.TextField()
+
+    compensation = rest.TextField()
+
+    task_description = rest.TextField(blank=True)
+
+    additional_instructions = rest.TextField(blank=True)
+
+    use_timeslots = rest.BoolField()
+
+    location = rest.ResourceField(Location, null=True, blank=True)
+
+    sparse_fields = (
+        'id',
+        'name',
+        'duration',
+        'compensation',
+        'task_description',
+        'additional_instructions',
+        'use_timeslots',
+        'location',
+    )
+
+
+@cacheable('open_experiment_summaries')
+class OpenExperimentSummaries(rest.ResourceCollection):
+    """
+    The open experiments, as ExperimentSummary resources. To let the backend
+    leave out the other fields as well, fetch it with sparse_fieldset():
+
+    OpenExperimentSummaries.client.get(
+        **sparse_fieldset(ExperimentSummary.sparse_fields)
+    )
+    """
+    class Meta:
+        resource = ExperimentSummary
+        path = '/api/experiments/'
+
+
 class RegistrationCriterion(rest.Resource):
 
     name = rest.TextField()
@@ -146,7 +225,7 @@ class ExperimentRegistrationResponse(rest.Resource):
     messages = rest.CollectionField(rest.StringCollection)
 
 
-class ExperimentRegistration(rest.Resource):
+class ExperimentRegistration(InvalidatesExperimentMixin, rest.Resource):
     class Meta:
         path = '/api/experiment/{experiment}/register/'
         supported_operations = [rest.Operations.put]
@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Iterable, Optional
+
 from cdh.rest import client as rest
 
 
@@ -9,3 +12,36 @@ class SuccessResponse(rest.Resource):
     """
 
     success = rest.BoolField()
+
+
+def sparse_fieldset(fields: Iterable[str]) -> dict:
+    """
+    Returns the kwargs for a client call that asks the backend to only
+    include the given fields in its response.
+
+    Combine this with a resource that only declares those fields (see
+    ExperimentSummary) to also skip deserializing the rest.
+    """
+    return {
+        'fields': ','.join(fields),
+    }
+
+
+def timeslot_window(start: Optional[datetime] = None,
+                    end: Optional[datetime] = None) -> dict:
+    """
+    Returns the kwargs for a client call that asks the backend to only
+    include the timeslots starting in [start, end) in an experiment. Either
+    bound can be left out.
+
+    Backends that don't support this send all timeslots, so the timeslots
+    should be filtered on our side as well (see
+    TimeSlotHomeView.get_timeslots).
+    """
+    kwargs = {}
+    if start:
+        kwargs['timeslots_from'] = start.isoformat()
+    if end:
+        kwargs['timeslots_until'] = end.isoformat()
+
+    return kwargs
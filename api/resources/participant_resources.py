@@ -1,5 +1,7 @@
 from datetime import datetime
 
+from django.utils.dateparse import parse_date
+
 from cdh.rest import client as rest
 from .generic_resources import SuccessResponse
 
@@ -165,7 +167,18 @@ class RequiredRegistrationFields(rest.Resource):
 #
 
 
-class Participant(rest.Resource):
+class ParticipantMixin:
+    """Methods shared by Participant and CompactParticipant"""
+    __slots__ = ()
+
+    def get_social_status_display(self):
+        if self.social_status == 'S':
+            return 'Student'
+
+        return 'Geen student'
+
+
+class Participant(ParticipantMixin, rest.Resource):
     """
     Describes a participant. It does not have it's own endpoint, so it can
     only be used in other resources as a field or in collections.
@@ -207,8 +220,36 @@ class Participant(rest.Resource):
 
     email_subscription = rest.BoolField()
 
-    def get_social_status_display(self):
-        if self.social_status == 'S':
-            return 'Student'
 
-        return 'Geen student'
+class CompactParticipant(ParticipantMixin):
+    """
+    A compact, read-only version of Participant, using __slots__ instead of
+    a full resource. Used in compact mode, see api.fields.
+    """
+    __slots__ = (
+        'id',
+        'name',
+        'email',
+        'phonenumber',
+        'language',
+        'multilingual',
+        'birth_date',
+        'handedness',
+        'sex',
+        'social_status',
+        'email_subscription',
+    )
+
+    def __init__(self, data: dict):
+        self.id = data.get('id')
+        self.name = data.get('name')
+        self.email = data.get('email')
+        self.phonenumber = data.get('phonenumber')
+        self.language = data.get('language')
+        self.multilingual = data.get('multilingual')
+        birth_date = data.get('birth_date')
+        self.birth_date = parse_date(birth_date) if birth_date else None
+        self.handedness = data.get('handedness')
+        self.sex = data.get('sex')
+        self.social_status = data.get('social_status')
+        self.email_subscription = data.get('email_subscription')
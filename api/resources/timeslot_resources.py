@@ -1,11 +1,19 @@
-from typing import List
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, List
 
+from api.cache import InvalidatesExperimentMixin
+from api.fields import LazyCollectionField, compact_collection
 from api.resources.generic_resources import SuccessResponse
-from api.resources.participant_resources import Participant
+from api.resources.participant_resources import CompactParticipant, \
+    Participant
 from cdh.core.utils import enumerate_to
 
 from cdh.rest import client as rest
-from babel.dates import format_datetime
+from babel import Locale
+from babel.dates import parse_pattern
+from django.utils.dateparse import parse_datetime
 from django.utils.translation import get_language
 
 
@@ -32,6 +40,24 @@ class LeaderTimeSlotAppointment(TimeSlotAppointment):
     participant = rest.ResourceField(Participant)
 
 
+class CompactLeaderTimeSlotAppointment:
+    """
+    A compact, read-only version of LeaderTimeSlotAppointment, using
+    __slots__ instead of a full resource. Used in compact mode, see
+    api.fields.
+    """
+    __slots__ = ('id', 'creation_date', 'participant')
+
+    def __init__(self, data: dict):
+        self.id = data.get('id')
+        creation_date = data.get('creation_date')
+        self.creation_date = parse_datetime(creation_date) \
+            if creation_date else None
+        participant = data.get('participant')
+        self.participant = CompactParticipant(participant) \
+            if participant else None
+
+
 class TimeSlotAppointments(rest.ResourceCollection):
     class Meta:
         resource = TimeSlotAppointment
@@ -42,61 +68,210 @@ class LeaderTimeSlotAppointments(rest.ResourceCollection):
         resource = LeaderTimeSlotAppointment
 
 
-class InlineTimeSlot(rest.Resource):
+_LABEL_PATTERN = parse_pattern('EEEE, dd-MM-YYYY, HH:mm {}')
 
-    id = rest.IntegerField()
 
-    datetime = rest.DateTimeField()
+@lru_cache(maxsize=None)
+def _get_locale(language: str) -> Locale:
+    return Locale.parse(language, sep='-')
 
-    max_places = rest.IntegerField()
 
-    free_places = rest.IntegerField()
+@lru_cache(maxsize=4096)
+def timeslot_label(timeslot_id, dt: datetime, free_places: int,
+                   language: str) -> str:
+    """Returns the label of a timeslot, as shown on the register form.
+    Labels are cached, as the same timeslots are shown to every visitor;
+    the id is part of the key so two timeslots never share an entry."""
+    places_str = "uur"
+    if free_places > 1:
+        places_str = "uur ({} plekken resterend)".format(free_places)
+
+    # Same as babel's format_datetime, without parsing the pattern and
+    # locale every time
+    return _LABEL_PATTERN.apply(
+        dt,
+        _get_locale(language)
+    ).format(
+        places_str
+    ).capitalize()
+
+
+class Occupancy:
+    """The places of a timeslot and who's in them, computed once from its
+    appointments. See InlineTimeSlotMixin.
+
+    free_places only needs the number of appointments, so the (lazy)
+    appointments are only built once the places are used.
+    """
+    __slots__ = ('appointments', 'n_appointments', 'max_places',
+                 'free_places', '_places', '_taken')
+
+    def __init__(self, appointments, max_places: int):
+        self.appointments = appointments
+        self.n_appointments = len(appointments) if appointments is not None \
+            else None
+        self.max_places = max_places
+        self.free_places = 0 if appointments is None else \
+            max_places - self.n_appointments
+        self._places = None
+        self._taken = None
+
+    @property
+    def places(self) -> list:
+        if self._places is None:
+            self._places = [{
+                'n':           n,
+                'appointment': appointment
+            } for n, appointment in enumerate_to(self.appointments or [],
+                                                 self.max_places, 1)]
+
+        return self._places
+
+    @property
+    def taken(self) -> List[tuple]:
+        if self._taken is None:
+            self._taken = [
+                (place['n'], place['appointment']) for place in self.places
+                if place['appointment']
+            ]
+
+        return self._taken
+
+    def is_valid_for(self, appointments, max_places: int) -> bool:
+        """Returns whether this is (still) the occupancy of the given
+        appointments; a new appointments collection, or a change in its
+        length or the number of places, invalidates it"""
+        if appointments is not self.appointments or \
+                max_places != self.max_places:
+            return False
+
+        if appointments is None:
+            return True
+
+        return len(appointments) == self.n_appointments
+
 
-    appointments = rest.CollectionField(TimeSlotAppointments)
+class InlineTimeSlotMixin:
+    """Methods shared by InlineTimeSlot and CompactLeaderInlineTimeSlot.
+
+    The places are computed once into an Occupancy, which is reused for as
+    long as the appointments don't change. Classes using this mixin with
+    __slots__ should have an '_occupancy' slot.
+    """
+    __slots__ = ()
+
+    @property
+    def occupancy(self) -> Occupancy:
+        occupancy = getattr(self, '_occupancy', None)
+        appointments = self.appointments
+        max_places = self.max_places
+
+        if occupancy is None or not occupancy.is_valid_for(appointments,
+                                                           max_places):
+            occupancy = Occupancy(appointments, max_places)
+            # Bypasses the resource's field handling
+            object.__setattr__(self, '_occupancy', occupancy)
+
+        return occupancy
 
     @property
     def places(self) -> list:
         """Returns a list of places with a corresponding participant (if any)"""
-        appointments = self.appointments or []
-        return [{
-            'n':           n,
-            'appointment': appointment
-        } for n, appointment in enumerate_to(appointments,
-                                             self.max_places, 1)]
+        return self.occupancy.places
 
     @property
     def takes_places_tuple(self) -> List[tuple]:
-        return [(x['n'], x['appointment']) for x in self.places if
-                x['appointment']]
+        return self.occupancy.taken
 
     def has_free_places(self) -> bool:
         return self.free_places != 0
 
     @property
     def free_places(self) -> int:
-        if self.appointments is None:
-            return 0
-
-        return self.max_places - len(self.appointments)
+        return self.occupancy.free_places
 
     def __str__(self):
-        places_str = "uur"
-        if self.free_places > 1:
-            places_str = "uur ({} plekken resterend)".format(self.free_places)
+        return timeslot_label(self.id, self.datetime, self.free_places,
+                              get_language())
+
+
+class TimeSlotAvailability:
+    """
+    An index of the timeslots of an experiment, for finding the timeslots
+    that can still be booked. The timeslots are sorted by datetime, so the
+    ones after a given moment are found by bisection. Whether any of those
+    has free places is looked up in a precomputed table.
+
+    Build it once per fetched experiment, see Experiment.availability.
+    """
+    __slots__ = ('timeslots', 'datetimes', '_next_free')
+
+    def __init__(self, timeslots: Iterable):
+        self.timeslots = sorted(timeslots, key=lambda x: x.datetime)
+        self.datetimes = [timeslot.datetime for timeslot in self.timeslots]
+
+        # _next_free[i] is the index of the first timeslot from i onwards
+        # with free places, or len(timeslots) if there is none
+        n = len(self.timeslots)
+        self._next_free = [n] * (n + 1)
+        for i in range(n - 1, -1, -1):
+            self._next_free[i] = i if self.timeslots[i].free_places > 0 \
+                else self._next_free[i + 1]
 
-        # Behold! The function chain FROM HELL! (Sorry)
-        return format_datetime(
-            self.datetime,
-            'EEEE, dd-MM-YYYY, HH:mm {}',
-            locale=get_language()
-        ).format(
-            places_str
-        ).capitalize()
+    def __len__(self):
+        return len(self.timeslots)
+
+    def has_bookable(self, after: datetime) -> bool:
+        """Returns whether a timeslot after the given datetime has free
+        places"""
+        start = bisect_right(self.datetimes, after)
+        return self._next_free[start] < len(self.timeslots)
+
+    def bookable(self, after: datetime) -> list:
+        """Returns the timeslots after the given datetime with free places,
+        sorted by datetime"""
+        start = self._next_free[bisect_right(self.datetimes, after)]
+        return [
+            timeslot for timeslot in self.timeslots[start:]
+            if timeslot.free_places > 0
+        ]
+
+
+class InlineTimeSlot(InlineTimeSlotMixin, rest.Resource):
+
+    id = rest.IntegerField()
+
+    datetime = rest.DateTimeField()
+
+    max_places = rest.IntegerField()
+
+    # free_places is computed from the appointments, see InlineTimeSlotMixin
+
+    # Lazy, so free_places can be computed without building the appointments
+    appointments = LazyCollectionField(TimeSlotAppointments)
 
 
 class LeaderInlineTimeSlot(InlineTimeSlot):
 
-    appointments = rest.CollectionField(LeaderTimeSlotAppointments)
+    appointments = LazyCollectionField(LeaderTimeSlotAppointments)
+
+
+class CompactLeaderInlineTimeSlot(InlineTimeSlotMixin):
+    """
+    A compact, read-only version of LeaderInlineTimeSlot, using __slots__
+    instead of a full resource. Used in compact mode, see api.fields.
+    """
+    __slots__ = ('id', 'datetime', 'max_places', 'appointments',
+                 '_occupancy')
+
+    def __init__(self, data: dict):
+        self.id = data.get('id')
+        self.datetime = parse_datetime(data['datetime'])
+        self.max_places = data.get('max_places')
+        appointments = data.get('appointments')
+        self.appointments = compact_collection(
+            CompactLeaderTimeSlotAppointment
+        )(appointments) if appointments is not None else None
 
 
 class LeaderInlineTimeSlots(rest.ResourceCollection):
@@ -109,7 +284,7 @@ class InlineTimeSlots(rest.ResourceCollection):
         resource = InlineTimeSlot
 
 
-class TimeSlot(rest.Resource):
+class TimeSlot(InvalidatesExperimentMixin, rest.Resource):
     class Meta:
         path = 'api/experiment/{experiment}/add_time_slot/'
         path_variables = ['experiment']
@@ -124,7 +299,36 @@ class TimeSlot(rest.Resource):
     max_places = rest.IntegerField()
 
 
-class DeleteTimeSlots(rest.Resource):
+class NewTimeSlot(rest.Resource):
+    """A timeslot to be created, as part of AddTimeSlots"""
+    datetime = rest.DateTimeField()
+
+    max_places = rest.IntegerField()
+
+
+class NewTimeSlots(rest.ResourceCollection):
+    class Meta:
+        resource = NewTimeSlot
+
+
+class AddTimeSlots(InvalidatesExperimentMixin, rest.Resource):
+    """
+    Creates multiple timeslots in one request. Used for recurring timeslots,
+    see leader.utils.add_timeslots.
+    """
+    class Meta:
+        path = 'api/experiment/{experiment}/add_time_slots/'
+        path_variables = ['experiment']
+        supported_operations = [rest.Operations.put]
+        default_return_resource = SuccessResponse
+        default_send_as_json = True
+
+    experiment = rest.IntegerField()
+
+    timeslots = rest.CollectionField(NewTimeSlots)
+
+
+class DeleteTimeSlots(InvalidatesExperimentMixin, rest.Resource):
     class Meta:
         path = 'api/experiment/{experiment}/delete_time_slots/'
         path_variables = ['experiment']
@@ -137,7 +341,7 @@ class DeleteTimeSlots(rest.Resource):
     to_delete = rest.CollectionField(rest.StringCollection)
 
 
-class DeleteAppointment(rest.Resource):
+class DeleteAppointment(InvalidatesExperimentMixin, rest.Resource):
     class Meta:
         path = 'api/experiment/{experiment}/delete_appointment/'
         path_variables = ['experiment']
@@ -0,0 +1,266 @@
+"""
+Incremental decoding of large backend responses.
+
+Normally, a response is read and decoded as a whole before the first
+resource is built. For big leader experiments, this means the whole
+document (and every resource in it) is in memory at once. The functions in
+this module instead read the response in chunks, and yield the items of
+selected top-level arrays one at a time, as soon as they have been received.
+"""
+import codecs
+import json
+from collections import deque
+from typing import Iterable, Iterator, Tuple
+
+from api import http
+from api.resources.experiment_resources import LeaderExperiment
+from api.resources.timeslot_resources import CompactLeaderInlineTimeSlot, \
+    CompactLeaderTimeSlotAppointment
+
+# Event types yielded by iter_object
+MEMBER = 'member'
+ITEM = 'item'
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _Reader:
+    """A text buffer over an iterable of byte chunks"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def read_more(self) -> bool:
+        """Reads the next chunk into the buffer, dropping everything before
+        the current position. Returns False if there's nothing left."""
+        if self.eof:
+            return False
+
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self.buffer += text
+                return True
+
+        self.buffer += self._decoder.decode(b'', final=True)
+        self.eof = True
+        return False
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character, without consuming it"""
+        while True:
+            while self.pos < len(self.buffer) and \
+                    self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+
+            if not self.read_more():
+                raise ValueError('Unexpected end of JSON document')
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError("Expected '{}' at position {}".format(
+                char,
+                self.pos
+            ))
+        self.pos += 1
+
+    def value(self, decoder=json.JSONDecoder()):
+        """Decodes the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.read_more():
+                    raise
+                continue
+
+            # A number at the end of the buffer might not be complete yet
+            if end == len(self.buffer) and self.read_more():
+                continue
+
+            self.pos = end
+            return value
+
+
+def iter_object(chunks: Iterable[bytes], stream_keys: Iterable[str]) -> \
+        Iterator[Tuple[str, str, object]]:
+    """Incrementally decodes a JSON object.
+
+    Yields (MEMBER, key, value) for every top-level member, except for the
+    arrays named in stream_keys. For those, (ITEM, key, item) is yielded for
+    every item in the array instead.
+    """
+    stream_keys = set(stream_keys)
+    reader = _Reader(chunks)
+
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        key = reader.value()
+        reader.expect(':')
+
+        if key in stream_keys and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    yield ITEM, key, reader.value()
+                    if reader.peek() == ']':
+                        reader.pos += 1
+                        break
+                    reader.expect(',')
+        else:
+            yield MEMBER, key, reader.value()
+
+        if reader.peek() == '}':
+            return
+        reader.expect(',')
+
+
+class StreamedLeaderExperiment:
+    """A leader experiment that is read from the backend while it's used.
+
+    Top-level fields are available as attributes (in their JSON form); they
+    are read as needed. Only fields the backend sends before the timeslots
+    and appointments can be used without reading (and buffering) those, so
+    check with has_leading_fields() first. The timeslots and appointments
+    themselves can be iterated over once, as compact objects (see
+    api.fields).
+
+    Use stream_leader_experiment() to create one.
+    """
+    STREAMED_KEYS = ('timeslots', 'appointments')
+
+    def __init__(self, events: Iterator[Tuple[str, str, object]],
+                 response=None):
+        self._events = events
+        self._response = response
+        self._pending = deque()
+        self.fields = {}
+
+    def read_fields(self) -> 'StreamedLeaderExperiment':
+        """Reads all top-level fields up to the first streamed item"""
+        if self._pending:
+            return self
+
+        for event in self._events:
+            kind, key, value = event
+            if kind == ITEM:
+                self._pending.append(event)
+                break
+
+            self.fields[key] = value
+
+        return self
+
+    def has_leading_fields(self, *names: str) -> bool:
+        """Returns whether the given fields are sent before the streamed
+        arrays, so they can be used without buffering those"""
+        self.read_fields()
+        return all(name in self.fields for name in names)
+
+    def close(self) -> None:
+        """Closes the response, without reading the rest of it"""
+        if self._response is not None:
+            self._response.close()
+
+    def _read_field(self, name: str) -> None:
+        """Reads until the given field is found. Streamed items read along
+        the way are kept, so they can still be iterated over."""
+        for event in self._events:
+            kind, key, value = event
+            if kind == ITEM:
+                self._pending.append(event)
+                continue
+
+            self.fields[key] = value
+            if key == name:
+                return
+
+    def __getattr__(self, item):
+        fields = self.__dict__.get('fields')
+        if fields is None or item.startswith('_'):
+            raise AttributeError(item)
+
+        if item not in fields:
+            self.read_fields()
+        if item not in fields:
+            # Fields after the streamed arrays are only found by buffering
+            # those arrays
+            self._read_field(item)
+
+        try:
+            return fields[item]
+        except KeyError:
+            raise AttributeError(item)
+
+    def _iter_events(self):
+        while self._pending:
+            yield self._pending.popleft()
+
+        yield from self._events
+
+    def iter_items(self, stream_key: str, compact_class):
+        """Yields compact_class instances for the items in the given array,
+        while keeping any other fields that are read along the way.
+
+        Items of other arrays are skipped, as the response can only be read
+        once. The response is closed when the iteration ends, including when
+        it's stopped early (e.g. by an aborted download).
+        """
+        try:
+            for kind, key, value in self._iter_events():
+                if kind == MEMBER:
+                    self.fields[key] = value
+                elif key == stream_key:
+                    yield compact_class(value)
+        finally:
+            self.close()
+
+    def iter_timeslots(self) -> Iterator[CompactLeaderInlineTimeSlot]:
+        return self.iter_items('timeslots', CompactLeaderInlineTimeSlot)
+
+    def iter_appointments(self) -> \
+            Iterator[CompactLeaderTimeSlotAppointment]:
+        return self.iter_items('appointments',
+                               CompactLeaderTimeSlotAppointment)
+
+
+def stream_leader_experiment(chunk_size: int = 16 * 1024, **kwargs) -> \
+        StreamedLeaderExperiment:
+    """Requests a leader experiment, returning a StreamedLeaderExperiment that
+    reads the response as it's used. kwargs are passed to the client, as
+    with LeaderExperiment.client.get().
+
+    The request itself is made through the regular cdh.rest client, so any
+    errors are raised as usual.
+    """
+    try:
+        with http.streaming():
+            LeaderExperiment.client.get(**kwargs)
+    except http.StreamingResponse as e:
+        response = e.response
+    else:
+        raise RuntimeError('The response to a streamed request was not '
+                           'streamed')
+
+    events = iter_object(
+        response.iter_content(chunk_size),
+        StreamedLeaderExperiment.STREAMED_KEYS
+    )
+
+    return StreamedLeaderExperiment(events, response)
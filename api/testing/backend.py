@@ -0,0 +1,408 @@
+"""
+An in-process stub of the PPN backend API.
+
+StubBackend answers every path declared in api.resources with synthetic data
+(see api.testing.data). It's mounted on the pooled API session (see
+api.http) with use_stub_backend(), so the views can be used without a
+running backend:
+
+    backend = StubBackend(n_experiments=5, n_timeslots=200, latency=0.02)
+    with use_stub_backend(backend):
+        client.get('/participant/register/1/')
+
+It can also be served over HTTP with serve() (see the serve_stub_backend
+command), for load tests against a running frontend.
+
+Writes (registrations, new timeslots, etc.) are answered with success, but
+are not stored; every GET returns the same data.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Callable, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from api import http
+from api.testing.data import make_api_user, make_experiment, make_leader
+
+LEADER_EMAIL = 'leader1@example.org'
+
+_SUCCESS = {'success': True}
+
+
+class StubBackend:
+    """Synthetic backend data, and the handlers that serve it.
+
+    Experiments 1 to n_experiments all have timeslots starting tomorrow, so
+    they're open for registration. All of them are led by the leader that
+    logs in with LEADER_EMAIL; any other email logs in as a participant.
+    Every response is delayed by `latency` seconds.
+    """
+
+    def __init__(self, n_experiments: int = 10, n_timeslots: int = 50,
+                 max_places: int = 2, occupancy: float = 0.5,
+                 latency: float = 0.0):
+        self.n_experiments = n_experiments
+        self.n_timeslots = n_timeslots
+        self.max_places = max_places
+        self.occupancy = occupancy
+        self.latency = latency
+
+        self.start = datetime.now(tz=timezone.utc).replace(
+            minute=0, second=0, microsecond=0
+        ) + timedelta(days=1)
+
+        self._lock = threading.Lock()
+        self._encoded = {}
+        self.calls = 0
+
+        self.routes: List[Tuple[Tuple[str, ...], re.Pattern, Callable]] = [
+            (('GET',), r'experiments/', self.open_experiments),
+            (('GET',), r'experiments/(?P<pk>\d+)/', self.experiment),
+            (('GET',), r'leader_experiments/', self.leader_experiments),
+            (('GET',), r'leader_experiments/(?P<pk>\d+)/',
+             self.leader_experiment),
+            (('GET', 'POST'), r'experiment/(?P<pk>\d+)/switch_open/',
+             self.switch_open),
+            (('PUT',), r'experiment/(?P<pk>\d+)/remind_participants/',
+             self.success),
+            (('PUT',), r'experiment/(?P<pk>\d+)/register/', self.register),
+            (('PUT',), r'experiment/(?P<pk>\d+)/add_time_slot/',
+             self.success),
+            (('PUT',), r'experiment/(?P<pk>\d+)/add_time_slots/',
+             self.success),
+            (('PUT',), r'experiment/(?P<pk>\d+)/delete_time_slots/',
+             self.success),
+            (('PUT',), r'experiment/(?P<pk>\d+)/delete_appointment/',
+             self.success),
+            (('GET',), r'admin/', self.admin),
+            (('GET', 'PUT'), r'leader/', self.leader),
+            (('PUT',), r'leader/add_comment/', self.success),
+            (('GET', 'POST'), r'auth/', self.auth),
+            (('GET',), r'participant/appointments/', self.appointments),
+            (('GET', 'DELETE'), r'participant/appointments/(?P<pk>\d+)/',
+             self.not_found),
+            (('GET',), r'participant/get_required_fields/(?P<pk>\d+)/',
+             self.required_fields),
+            (('PUT',), r'participant/create_account/', self.create_account),
+            (('PUT',), r'participant/subscribe_mailinglist/', self.success),
+            (('PUT',), r'participant/validate_mailinglist_token/',
+             self.validate_mailinglist_token),
+            (('PUT',), r'participant/unsubscribe_from_mailinglist/',
+             self.success),
+            (('PUT',), r'participant/send_cancel_token/', self.success),
+            (('PUT',), r'account/change_password/', self.success),
+            (('PUT',), r'account/forgot_password/', self.forgot_password),
+            (('PUT',), r'account/validate_token/', self.success),
+            (('PUT',), r'account/reset_password/', self.success),
+        ]
+        self.routes = [
+            (methods, re.compile(r'^api/' + pattern + r'?$'), handler)
+            for methods, pattern, handler in self.routes
+        ]
+
+    #
+    # Data
+    #
+
+    def _make_experiment(self, pk: int, leader: bool) -> dict:
+        return make_experiment(
+            pk=pk,
+            n_timeslots=self.n_timeslots,
+            max_places=self.max_places,
+            occupancy=self.occupancy,
+            leader=leader,
+            start=self.start,
+        )
+
+    def _exists(self, pk) -> bool:
+        return 1 <= int(pk) <= self.n_experiments
+
+    #
+    # Handlers; they return a status and the data to send as JSON. Data that
+    # is the same for every request is returned as a callable, so it's only
+    # built and encoded once.
+    #
+
+    def open_experiments(self, request, params):
+        fields = params.get('fields')
+
+        def build():
+            experiments = [
+                self._make_experiment(pk, False)
+                for pk in range(1, self.n_experiments + 1)
+            ]
+            if fields:
+                fields_list = fields.split(',')
+                experiments = [
+                    {key: experiment[key] for key in fields_list}
+                    for experiment in experiments
+                ]
+
+            return experiments
+
+        return 200, build
+
+    def experiment(self, request, params, pk):
+        if not self._exists(pk):
+            return self.not_found(request, params)
+
+        return 200, lambda: self._make_experiment(int(pk), False)
+
+    def leader_experiments(self, request, params):
+        return 200, lambda: [
+            self._make_experiment(pk, True)
+            for pk in range(1, self.n_experiments + 1)
+        ]
+
+    def leader_experiment(self, request, params, pk):
+        if not self._exists(pk):
+            return self.not_found(request, params)
+
+        start = params.get('timeslots_from')
+        end = params.get('timeslots_until')
+
+        def build():
+            experiment = self._make_experiment(int(pk), True)
+            if start or end:
+                experiment['timeslots'] = [
+                    timeslot for timeslot in experiment['timeslots']
+                    if _in_window(timeslot['datetime'], start, end)
+                ]
+
+            return experiment
+
+        return 200, build
+
+    def switch_open(self, request, params, pk):
+        return 200, {'success': True, 'open': True}
+
+    def register(self, request, params, pk):
+        return 200, {'success': True, 'recoverable': True, 'messages': []}
+
+    def admin(self, request, params):
+        return 200, {
+            'first_name': 'Beheerder',
+            'last_name':  'PPN',
+            'email':      'admin@example.org',
+        }
+
+    def leader(self, request, params):
+        return 200, lambda: make_leader(1)
+
+    def auth(self, request, params):
+        data = dict(params)
+        data.update(_parse_body(request))
+        username = data.get('username')
+
+        if username == LEADER_EMAIL:
+            user = make_api_user(1)
+            group = {'pk': 1, 'name': settings.GROUPS_LEADER}
+        else:
+            pk = int(hashlib.md5(str(username).encode()).hexdigest()[:6], 16)
+            user = make_api_user(1000 + pk)
+            group = {'pk': 2, 'name': settings.GROUPS_PARTICIPANT}
+
+        user['groups'] = [group]
+        return 200, user
+
+    def appointments(self, request, params):
+        return 200, []
+
+    def required_fields(self, request, params, pk):
+        return 200, {'fields': ['phone', 'birth_date']}
+
+    def create_account(self, request, params):
+        return 200, {'success': True, 'message': 'OK'}
+
+    def validate_mailinglist_token(self, request, params):
+        return 200, {'success': True, 'email': 'participant@example.org'}
+
+    def forgot_password(self, request, params):
+        return 200, {'success': True, 'ldap_blocked': False}
+
+    def success(self, request, params, **kwargs):
+        return 200, _SUCCESS
+
+    def not_found(self, request, params, **kwargs):
+        return 404, {'detail': 'Not found.'}
+
+    #
+    # Dispatching
+    #
+
+    def handle(self, request: requests.PreparedRequest) -> \
+            Tuple[int, bytes, dict]:
+        """Returns the status, body and headers of the response to a
+        request"""
+        with self._lock:
+            self.calls += 1
+
+        url = urlsplit(request.url)
+        api_host_path = urlsplit(settings.API_HOST).path
+        path = url.path[len(api_host_path):] \
+            if url.path.startswith(api_host_path) else url.path
+        path = path.lstrip('/')
+        params = {
+            key: values[-1] for key, values in parse_qs(url.query).items()
+        }
+
+        for methods, regex, handler in self.routes:
+            match = regex.match(path)
+            if match and request.method in methods:
+                status, data = handler(request, params, **match.groupdict())
+                break
+        else:
+            status, data = 404, {'detail': 'Not found.'}
+
+        if callable(data):
+            body = self._encode_once(request.url, data)
+        else:
+            body = json.dumps(data).encode()
+
+        headers = {'Content-Type': 'application/json'}
+
+        if request.method == 'GET' and status == 200:
+            etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+            headers['ETag'] = etag
+
+            if request.headers.get('If-None-Match') == etag:
+                return 304, b'', headers
+
+        return status, body, headers
+
+    def _encode_once(self, key: str, build: Callable) -> bytes:
+        body = self._encoded.get(key)
+        if body is None:
+            body = json.dumps(build()).encode()
+            self._encoded[key] = body
+
+        return body
+
+
+def _in_window(value: str, start: str, end: str) -> bool:
+    value = datetime.fromisoformat(value)
+    return (not start or value >= datetime.fromisoformat(start)) and \
+        (not end or value < datetime.fromisoformat(end))
+
+
+def _parse_body(request: requests.PreparedRequest) -> dict:
+    body = request.body
+    if not body:
+        return {}
+
+    if isinstance(body, bytes):
+        body = body.decode()
+
+    try:
+        data = json.loads(body)
+        return data if isinstance(data, dict) else {}
+    except ValueError:
+        return {
+            key: values[-1] for key, values in parse_qs(body).items()
+        }
+
+
+class StubBackendAdapter(BaseAdapter):
+    """A requests transport adapter that answers requests from a
+    StubBackend, instead of sending them over the network"""
+
+    def __init__(self, backend: StubBackend):
+        super().__init__()
+        self.backend = backend
+
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        if self.backend.latency:
+            time.sleep(self.backend.latency)
+
+        status, body, headers = self.backend.handle(request)
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = HTTPStatus(status).phrase
+        response.headers = CaseInsensitiveDict(headers)
+        response.headers['Content-Length'] = str(len(body))
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.raw = BytesIO(body)
+
+        if not stream:
+            response._content = body
+
+        return response
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def use_stub_backend(backend: StubBackend):
+    """Answers all calls to API_HOST made through the pooled session with
+    the given StubBackend in this block"""
+    session = http.get_session()
+    prefix = settings.API_HOST
+    session.mount(prefix, StubBackendAdapter(backend))
+    try:
+        yield backend
+    finally:
+        session.adapters.pop(prefix, None)
+
+
+class _StubBackendHandler(BaseHTTPRequestHandler):
+    backend: StubBackend = None
+    protocol_version = 'HTTP/1.1'
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else None
+        url = 'http://{}{}'.format(self.headers.get('Host', 'localhost'),
+                                   self.path)
+
+        request = requests.Request(
+            self.command,
+            url,
+            headers=dict(self.headers.items()),
+            data=body,
+        ).prepare()
+
+        if self.backend.latency:
+            time.sleep(self.backend.latency)
+
+        status, body, headers = self.backend.handle(request)
+
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(backend: StubBackend, host: str = '127.0.0.1',
+          port: int = 8001) -> ThreadingHTTPServer:
+    """Returns an HTTP server for the given StubBackend; call
+    serve_forever() on it to start serving"""
+    handler = type('StubBackendHandler', (_StubBackendHandler,), {
+        'backend': backend,
+    })
+
+    return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,163 @@
+"""
+Synthetic backend data, in the JSON format the backend API uses.
+
+Used by the benchmarks to build resources of a configurable size without
+needing a running backend.
+"""
+from datetime import datetime, timedelta, timezone
+
+
+def _isoformat(dt: datetime) -> str:
+    return dt.isoformat()
+
+
+def make_api_user(pk: int) -> dict:
+    return {
+        'id':                    pk,
+        'token':                 'token-{}'.format(pk),
+        'is_active':             True,
+        'is_admin':              False,
+        'is_ldap_account':       False,
+        'needs_password_change': False,
+        'groups':                [],
+    }
+
+
+def make_leader(pk: int) -> dict:
+    return {
+        'id':          pk,
+        'name':        'Leader {}'.format(pk),
+        'phonenumber': '030-253{:04d}'.format(pk),
+        'email':       'leader{}@example.org'.format(pk),
+        'api_user':    make_api_user(pk),
+    }
+
+
+def make_participant(pk: int) -> dict:
+    return {
+        'id':                 pk,
+        'name':               'Participant {}'.format(pk),
+        'email':              'participant{}@example.org'.format(pk),
+        'phonenumber':        '06-{:08d}'.format(pk),
+        'language':           'nl',
+        'multilingual':       pk % 4 == 0,
+        'birth_date':         '1990-01-{:02d}'.format(pk % 28 + 1),
+        'handedness':         'R' if pk % 10 else 'L',
+        'sex':                'F' if pk % 2 else 'M',
+        'social_status':      'S' if pk % 3 else 'O',
+        'email_subscription': True,
+    }
+
+
+def make_appointment(pk: int, created: datetime, leader: bool) -> dict:
+    appointment = {
+        'id':            pk,
+        'creation_date': _isoformat(created),
+    }
+
+    if leader:
+        appointment['participant'] = make_participant(pk)
+
+    return appointment
+
+
+def make_timeslots(n_timeslots: int, max_places: int = 2,
+                   occupancy: float = 0.5, start: datetime = None,
+                   leader: bool = False) -> list:
+    """Returns n_timeslots timeslots, 30 minutes apart, starting at start
+    (defaults to a week ago). Roughly `occupancy` of all places is taken.
+    """
+    if start is None:
+        start = datetime.now(tz=timezone.utc).replace(
+            minute=0, second=0, microsecond=0
+        ) - timedelta(days=7)
+
+    timeslots = []
+    appointment_pk = 1
+    for n in range(n_timeslots):
+        slot_datetime = start + timedelta(minutes=30 * n)
+        taken = min(int(max_places * occupancy), max_places)
+
+        appointments = []
+        for _ in range(taken):
+            appointments.append(make_appointment(
+                appointment_pk,
+                slot_datetime - timedelta(days=1),
+                leader
+            ))
+            appointment_pk += 1
+
+        timeslots.append({
+            'id':           n + 1,
+            'datetime':     _isoformat(slot_datetime),
+            'max_places':   max_places,
+            'free_places':  max_places - taken,
+            'appointments': appointments,
+        })
+
+    return timeslots
+
+
+def make_experiment(pk: int = 1, n_timeslots: int = 50, max_places: int = 2,
+                    occupancy: float = 0.5, leader: bool = False,
+                    start: datetime = None) -> dict:
+    """Returns an experiment with n_timeslots timeslots. If leader is True,
+    the format of the leader_experiments endpoint is used (which includes
+    participant info). See make_timeslots for start.
+    """
+    timeslots = make_timeslots(n_timeslots, max_places, occupancy, start,
+                               leader=leader)
+
+    experiment = {
+        'id':                      pk,
+        'name':                    'Experiment {}'.format(pk),
+        'duration':                '30 minuten',
+        'compensation':            '10 euro',
+        'task_description':        'Je luistert naar zinnen.',
+        'additional_instructions': '',
+        'open':                    True,
+        'public':                  True,
+        'participants_visible':    True,
+        'location':                {
+            'id':        1,
+            'name':      'Trans 10',
+            'route_url': None,
+        },
+        'leader':                  make_leader(1),
+        'additional_leaders':      [make_leader(2), make_leader(3)],
+        'excluded_experiments':    [],
+        'defaultcriteria':         {
+            'id':            pk,
+            'language':      'nl',
+            'multilingual':  'I',
+            'sex':           'I',
+            'handedness':    'I',
+            'dyslexia':      'I',
+            'social_status': 'I',
+            'min_age':       18,
+            'max_age':       -1,
+        },
+        'specific_criteria':       [{
+            'id':             1,
+            'criterion':      {
+                'id':           1,
+                'name_form':    'glasses',
+                'name_natural': 'Draag je een bril?',
+                'values':       'Ja,Nee',
+            },
+            'correct_value':  'Nee',
+            'message_failed': 'Helaas!',
+        }],
+        'use_timeslots':           True,
+        'timeslots':               timeslots,
+        'default_max_places':      max_places,
+    }
+
+    if leader:
+        experiment['appointments'] = [
+            appointment
+            for timeslot in timeslots
+            for appointment in timeslot['appointments']
+        ]
+
+    return experiment
@@ -0,0 +1,38 @@
+"""
+Valid form data for the views, built from the same forms the views use.
+"""
+from typing import Union
+
+# Values for the fields that don't have choices
+SAMPLE_VALUES = {
+    'name':       'Proefpersoon',
+    'phone':      '0612345678',
+    'birth_date': '2000-01-01',
+    'language':   'nl',
+    'sex':        'F',
+}
+
+
+def register_form_data(experiment, email: str,
+                       allowed_fields: Union[str, list] = '__all__') -> dict:
+    """Returns POST data for the register views of the given experiment
+    resource. Every field with choices gets its first choice, so the first
+    available timeslot is picked."""
+    # Local imports, as participant imports the api app
+    from participant.forms import BaseRegisterForm
+    from participant.utils import get_register_form
+
+    form = get_register_form(BaseRegisterForm(), experiment, allowed_fields)
+
+    data = {}
+    for name, field in form.fields.items():
+        if name == 'email':
+            data[name] = email
+        elif name in SAMPLE_VALUES:
+            data[name] = SAMPLE_VALUES[name]
+        else:
+            choices = list(getattr(field.widget, 'choices', []))
+            if choices:
+                data[name] = str(choices[0][0])
+
+    return data
@@ -1,3 +1,632 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import ResolverMatch, path, resolve
+from urllib3 import HTTPResponse
+from urllib3.exceptions import MaxRetryError
+
+from api import async_client, cache, http, prefetch, streaming, tracing
+from api.fields import LazyValue
+from api.middleware import BackendCallsMiddleware, ThreadLocalUserMiddleware
+from api.resources.timeslot_resources import CompactLeaderInlineTimeSlot, \
+    TimeSlotAvailability, timeslot_label
+from api.testing.backend import StubBackend, serve, use_stub_backend
+from cdh.core.middleware import get_current_user
+
+
+def _user_view(request):
+    """Returns whether the thread locals are set up for the request"""
+    return HttpResponse(str(get_current_user() is request.user))
+
+
+async def _async_user_view(request):
+    return HttpResponse()
+
+
+urlpatterns = [
+    path('sync/', _user_view),
+    path('async/', _async_user_view),
+]
+
+
+class TTLCacheTests(SimpleTestCase):
+
+    def test_get_set(self):
+        ttl_cache = cache.TTLCache()
+        ttl_cache.set('key', 'value', 10)
+
+        self.assertEqual(ttl_cache.get('key'), 'value')
+        self.assertIsNone(ttl_cache.get('other'))
+
+    def test_expiry(self):
+        ttl_cache = cache.TTLCache()
+
+        with mock.patch('api.cache.time.monotonic', return_value=100):
+            ttl_cache.set('key', 'value', 10)
+
+        with mock.patch('api.cache.time.monotonic', return_value=111):
+            self.assertIsNone(ttl_cache.get('key'))
+
+        self.assertEqual(len(ttl_cache), 0)
+
+    def test_expired_entries_are_removed_on_write(self):
+        ttl_cache = cache.TTLCache()
+
+        with mock.patch('api.cache.time.monotonic', return_value=100):
+            ttl_cache.set('old', 'value', 10)
+            ttl_cache.set('new', 'value', 100)
+
+        with mock.patch('api.cache.time.monotonic', return_value=111):
+            ttl_cache.set('other', 'value', 10)
+
+        self.assertEqual(len(ttl_cache), 2)
+
+    def test_least_recently_used_are_evicted(self):
+        ttl_cache = cache.TTLCache(max_size=2)
+        ttl_cache.set('a', 1, 10)
+        ttl_cache.set('b', 2, 10)
+        ttl_cache.get('a')
+        ttl_cache.set('c', 3, 10)
+
+        self.assertEqual(len(ttl_cache), 2)
+        self.assertEqual(ttl_cache.get('a'), 1)
+        self.assertIsNone(ttl_cache.get('b'))
+        self.assertEqual(ttl_cache.get('c'), 3)
+
+
+class FakeExperiment:
+    client = mock.Mock()
+
+
+class ResourceCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.resource_cache.clear()
+        cache.get_shared_cache().clear()
+        FakeExperiment.client.reset_mock()
+        cache.cacheable(cache.EXPERIMENT)(FakeExperiment)
+
+    def tearDown(self):
+        cache._cacheable_resources.pop(FakeExperiment, None)
+        cache.resource_cache.clear()
+        cache.get_shared_cache().clear()
+
+    def test_get_resource_is_cached(self):
+        cache.get_resource(FakeExperiment, pk=1)
+        cache.get_resource(FakeExperiment, pk=1)
+
+        FakeExperiment.client.get.assert_called_once_with(pk=1)
+
+    @override_settings(API_CACHE_TTL=0)
+    def test_get_resource_disabled(self):
+        cache.get_resource(FakeExperiment, pk=1)
+        cache.get_resource(FakeExperiment, pk=1)
+
+        self.assertEqual(FakeExperiment.client.get.call_count, 2)
+
+    def test_invalidate_experiment(self):
+        cache.get_resource(FakeExperiment, pk=1)
+        cache.get_resource(FakeExperiment, pk=2)
+
+        cache.invalidate_experiment(1)
+
+        cache.get_resource(FakeExperiment, pk=1)
+        cache.get_resource(FakeExperiment, pk=2)
+
+        self.assertEqual(FakeExperiment.client.get.call_count, 3)
+
+    def test_invalidation_by_other_worker(self):
+        cache.get_resource(FakeExperiment, pk=1)
+        cache.get_resource(FakeExperiment, pk=2)
+
+        # Another worker only changes the generations in the shared cache
+        with mock.patch.object(cache.resource_cache, 'delete_matching'):
+            cache.invalidate_experiment(1)
+
+        cache.get_resource(FakeExperiment, pk=1)
+        cache.get_resource(FakeExperiment, pk=2)
+
+        self.assertEqual(FakeExperiment.client.get.call_count, 3)
+
+        with mock.patch.object(cache.resource_cache, 'delete_matching'):
+            cache.invalidate_experiment(None)
+
+        cache.get_resource(FakeExperiment, pk=2)
+
+        self.assertEqual(FakeExperiment.client.get.call_count, 4)
+
+
+class StaleWhileRevalidateTests(SimpleTestCase):
+
+    def test_serves_stale_value_when_refresh_fails(self):
+        fetch = mock.Mock(return_value='first')
+        swr = cache.StaleWhileRevalidate(fetch, 'UNUSED_SETTING', 10)
+
+        self.assertEqual(swr.get(), 'first')
+
+        fetch.side_effect = ConnectionError
+        swr._fetched_at -= 20
+
+        with mock.patch('api.prefetch.get_executor') as get_executor:
+            get_executor.return_value.submit.side_effect = lambda f: f()
+            self.assertEqual(swr.get(), 'first')
+
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(swr.get(), 'first')
+        self.assertEqual(fetch.call_count, 2)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_concurrent_calls_are_coalesced(self):
+        single_flight = cache.SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            started.set()
+            release.wait(5)
+            return 'experiment'
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            leader = executor.submit(single_flight.do, 'key', fetch)
+            started.wait(5)
+            waiters = [
+                executor.submit(single_flight.do, 'key', fetch)
+                for _ in range(2)
+            ]
+            while single_flight.coalesced < 2:
+                time.sleep(0.001)
+            release.set()
+
+            results = [f.result() for f in [leader] + waiters]
+
+        self.assertEqual(results, ['experiment'] * 3)
+        self.assertEqual(single_flight.as_dict(), {
+            'calls':     1,
+            'coalesced': 2,
+        })
+
+
+class FakeLeaderExperiment:
+    client = mock.Mock()
+
+
+class RevalidatedResourceTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.validated_cache.clear()
+        cache.revalidation_stats.reset()
+        FakeLeaderExperiment.client.reset_mock()
+        cache.revalidated('leader_experiment')(FakeLeaderExperiment)
+
+    def tearDown(self):
+        cache._revalidated_resources.pop(FakeLeaderExperiment, None)
+        cache.validated_cache.clear()
+
+    def _respond(self, obj, validators, size):
+        def get(**kwargs):
+            request = http._conditional_request.get()
+            request.response_validators = validators
+            request.response_size = size
+            return obj
+
+        return get
+
+    def test_not_modified_reuses_resource(self):
+        FakeLeaderExperiment.client.get.side_effect = self._respond(
+            'experiment', {'ETag': '"abc"'}, 1000
+        )
+        cache.get_resource(FakeLeaderExperiment, pk=1)
+
+        FakeLeaderExperiment.client.get.side_effect = http.NotModified
+        obj = cache.get_resource(FakeLeaderExperiment, pk=1)
+
+        self.assertEqual(obj, 'experiment')
+        self.assertEqual(cache.revalidation_stats.as_dict(), {
+            'requests':     2,
+            'not_modified': 1,
+            'bytes_saved':  1000,
+        })
+
+    def test_validators_are_sent(self):
+        FakeLeaderExperiment.client.get.side_effect = self._respond(
+            'experiment', {'ETag': '"abc"'}, 1000
+        )
+        cache.get_resource(FakeLeaderExperiment, pk=1)
+
+        sent_headers = []
+
+        def get(**kwargs):
+            sent_headers.append(http._conditional_request.get().headers)
+            raise http.NotModified
+
+        FakeLeaderExperiment.client.get.side_effect = get
+        cache.get_resource(FakeLeaderExperiment, pk=1)
+
+        self.assertEqual(sent_headers, [{'If-None-Match': '"abc"'}])
+
+
+class PrefetchTests(SimpleTestCase):
+
+    @mock.patch('api.prefetch.close_old_connections')
+    def test_connections_are_closed(self, close_old_connections):
+        future = prefetch.submit(None, lambda: 'value')
+
+        self.assertEqual(future.result(), 'value')
+        self.assertEqual(close_old_connections.call_count, 2)
+
+
+class LazyValueTests(SimpleTestCase):
+
+    def test_builds_on_first_use(self):
+        build = mock.Mock(side_effect=lambda raw: [x * 2 for x in raw])
+        value = LazyValue([1, 2, 3], build)
+
+        self.assertEqual(len(value), 3)
+        self.assertTrue(value)
+        build.assert_not_called()
+
+        self.assertEqual(list(value), [2, 4, 6])
+        self.assertEqual(value[0], 2)
+        build.assert_called_once_with([1, 2, 3])
+
+    def test_concurrent_use_builds_once(self):
+        def build(raw):
+            time.sleep(0.01)
+            return [x * 2 for x in raw]
+
+        build = mock.Mock(side_effect=build)
+        value = LazyValue([1, 2, 3], build)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: list(value), range(8)))
+
+        build.assert_called_once_with([1, 2, 3])
+        self.assertEqual(results, [[2, 4, 6]] * 8)
+
+
+class TimeSlotAvailabilityTests(SimpleTestCase):
+
+    def test_bookable(self):
+        class TimeSlot:
+            def __init__(self, hour, free_places):
+                self.datetime = datetime(2030, 1, 1, hour)
+                self.free_places = free_places
+
+        slots = [TimeSlot(hour, free) for hour, free in
+                 [(12, 0), (9, 1), (10, 0), (11, 2)]]
+        availability = TimeSlotAvailability(slots)
+
+        self.assertEqual(
+            [slot.datetime.hour for slot in
+             availability.bookable(datetime(2030, 1, 1, 9))],
+            [11]
+        )
+        self.assertTrue(availability.has_bookable(datetime(2030, 1, 1, 8)))
+        self.assertTrue(availability.has_bookable(datetime(2030, 1, 1, 10)))
+        self.assertFalse(availability.has_bookable(datetime(2030, 1, 1, 11)))
+        self.assertEqual(availability.bookable(datetime(2030, 1, 2)), [])
+
+
+class OccupancyTests(SimpleTestCase):
+
+    def test_occupancy(self):
+        timeslot = CompactLeaderInlineTimeSlot({
+            'id':           1,
+            'datetime':     '2030-01-01T09:00:00+00:00',
+            'max_places':   3,
+            'appointments': [{'id': 1}, {'id': 2}],
+        })
+
+        occupancy = timeslot.occupancy
+        self.assertEqual(timeslot.free_places, 1)
+        self.assertEqual([n for n, _ in timeslot.takes_places_tuple], [1, 2])
+        self.assertEqual([place['n'] for place in timeslot.places], [1, 2, 3])
+        self.assertIs(timeslot.occupancy, occupancy)
+
+        # Changing the appointments invalidates it
+        timeslot.appointments = timeslot.appointments[:1]
+        self.assertEqual(timeslot.free_places, 2)
+        self.assertIsNot(timeslot.occupancy, occupancy)
+
+
+class TimeSlotLabelTests(SimpleTestCase):
+
+    def test_label(self):
+        dt = datetime(2030, 1, 1, 9, 30)
+        self.assertEqual(timeslot_label(1, dt, 1, 'nl'),
+                         'Dinsdag, 01-01-2030, 09:30 uur')
+        self.assertEqual(timeslot_label(1, dt, 2, 'en'),
+                         'Tuesday, 01-01-2030, 09:30 uur (2 plekken '
+                         'resterend)')
+
+
+class StreamingTests(SimpleTestCase):
+
+    def test_iter_object_in_small_chunks(self):
+        document = '{"id": 12, "name": "caf\u00e9", "timeslots": [{"id": 1}, ' \
+                   '{"id": 2}], "participants_visible": true}'.encode()
+        chunks = [document[i:i + 3] for i in range(0, len(document), 3)]
+
+        events = list(streaming.iter_object(chunks, ['timeslots']))
+
+        self.assertEqual(events, [
+            (streaming.MEMBER, 'id', 12),
+            (streaming.MEMBER, 'name', 'caf\u00e9'),
+            (streaming.ITEM, 'timeslots', {'id': 1}),
+            (streaming.ITEM, 'timeslots', {'id': 2}),
+            (streaming.MEMBER, 'participants_visible', True),
+        ])
+
+    def _experiment(self, document):
+        document = document.encode()
+        chunks = [document[i:i + 8] for i in range(0, len(document), 8)]
+        return streaming.StreamedLeaderExperiment(
+            streaming.iter_object(
+                chunks,
+                streaming.StreamedLeaderExperiment.STREAMED_KEYS
+            )
+        )
+
+    def test_leading_fields(self):
+        experiment = self._experiment(
+            '{"participants_visible": true, "timeslots": [{"id": 1}]}'
+        )
+
+        self.assertTrue(experiment.has_leading_fields('participants_visible'))
+        self.assertTrue(experiment.participants_visible)
+        self.assertEqual(list(experiment.iter_items('timeslots', dict)),
+                         [{'id': 1}])
+
+    def test_trailing_fields_are_not_buffered(self):
+        timeslots = ', '.join('{{"id": {}}}'.format(i) for i in range(100))
+        experiment = self._experiment(
+            '{"id": 1, "timeslots": [' + timeslots + '], '
+            '"participants_visible": true}'
+        )
+
+        self.assertFalse(
+            experiment.has_leading_fields('participants_visible')
+        )
+
+        pending = []
+        for _ in experiment.iter_items('timeslots', dict):
+            pending.append(len(experiment._pending))
+
+        self.assertEqual(len(pending), 100)
+        self.assertLessEqual(max(pending), 1)
+        self.assertTrue(experiment.participants_visible)
+
+
+class HttpSessionTests(SimpleTestCase):
+
+    @override_settings(API_CONNECT_TIMEOUT=1, API_READ_TIMEOUT=5)
+    def test_timeouts(self):
+        session = http.create_session()
+
+        with mock.patch('requests.Session.request') as request:
+            session.request('GET', settings.API_HOST)
+            session.request('GET', settings.API_HOST, timeout=60)
+
+        self.assertEqual(request.call_args_list[0][1]['timeout'], (1, 5))
+        self.assertEqual(request.call_args_list[1][1]['timeout'], 60)
+
+    def test_retry_policy(self):
+        retry = http.create_session().get_adapter(settings.API_HOST) \
+            .max_retries
+
+        self.assertEqual(retry.read, 0)
+        self.assertFalse(retry.is_retry('PUT', 503))
+        self.assertTrue(retry.is_retry('GET', 503))
+
+        response = HTTPResponse(status=503)
+        retry.increment('GET', '/api/experiments/1/', response=response)
+
+        # Downloads are logged by the backend, so they aren't retried
+        with self.assertRaises(MaxRetryError):
+            retry.increment('GET', '/api/leader_experiments/1/?download=True',
+                            response=response)
+
+    def test_connections_are_reused(self):
+        server = serve(StubBackend(n_experiments=1, n_timeslots=1), port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{}/api/experiments/1/'.format(
+            server.server_address[1]
+        )
+
+        http.stats.reset()
+        session = http.create_session()
+        try:
+            for _ in range(3):
+                self.assertEqual(session.get(url).status_code, 200)
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(http.stats.as_dict(), {
+            'requests':           3,
+            'connections_opened': 1,
+            'connections_reused': 2,
+        })
+
+
+class CallLogTests(SimpleTestCase):
+
+    def test_calls_are_recorded(self):
+        with tracing.record_calls() as call_log:
+            with tracing.Timer('get', 'http://backend.test/api/admin/') as t:
+                t.status = 200
+                t.size = 120
+
+        self.assertEqual(len(call_log), 1)
+        self.assertEqual(call_log.calls[0].method, 'GET')
+        self.assertEqual(call_log.calls[0].bytes, 120)
+        self.assertIn('api-1;desc="GET', call_log.server_timing())
+
+    def test_nothing_is_recorded_outside_a_request(self):
+        with tracing.Timer('get', 'http://backend.test/api/admin/'):
+            pass
+
+        self.assertIsNone(tracing.get_call_log())
+
+
+class BackendCallsMiddlewareTests(SimpleTestCase):
+
+    def _request(self):
+        request = RequestFactory().get('/cancel/1/secret-token/')
+        request.resolver_match = ResolverMatch(
+            lambda request: None, (), {},
+            url_name='cancel',
+            namespaces=['participant'],
+            route='cancel/<int:pk>/<str:token>/',
+        )
+        return request
+
+    @staticmethod
+    def _view(request):
+        with tracing.Timer('get', 'http://backend.test/api/admin/') as t:
+            t.status = 200
+        return HttpResponse()
+
+    def _assert_logged(self, logs, response):
+        self.assertIn('Server-Timing', response)
+
+        data = json.loads(logs.records[0].getMessage())
+        self.assertEqual(data['route'], 'cancel/<int:pk>/<str:token>/')
+        self.assertEqual(data['view'], 'participant:cancel')
+        self.assertEqual(data['backend_calls'], 1)
+        self.assertNotIn('secret-token', logs.records[0].getMessage())
+
+    def test_sync(self):
+        middleware = BackendCallsMiddleware(self._view)
+
+        with self.assertLogs('api.calls') as logs:
+            response = middleware(self._request())
+
+        self._assert_logged(logs, response)
+
+    def test_async(self):
+        async def view(request):
+            return self._view(request)
+
+        middleware = BackendCallsMiddleware(view)
+
+        with self.assertLogs('api.calls') as logs:
+            response = async_to_sync(middleware)(self._request())
+
+        self._assert_logged(logs, response)
+
+
+class ThreadLocalUserMiddlewareTests(SimpleTestCase):
+
+    def _request(self, path):
+        request = RequestFactory().get(path)
+        request.user = AnonymousUser()
+        return request
+
+    @staticmethod
+    async def _get_response(request):
+        # Runs the view as Django does
+        view = resolve(request.path_info).func
+        if not iscoroutinefunction(view):
+            view = sync_to_async(view)
+
+        return await view(request)
+
+    def test_sync(self):
+        middleware = ThreadLocalUserMiddleware(_user_view)
+
+        self.assertFalse(iscoroutinefunction(middleware))
+        self.assertEqual(middleware(self._request('/sync/')).content,
+                         b'True')
+
+    @override_settings(ROOT_URLCONF='api.tests')
+    def test_async_with_sync_view(self):
+        middleware = ThreadLocalUserMiddleware(self._get_response)
+        response = async_to_sync(middleware)(self._request('/sync/'))
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertEqual(response.content, b'True')
+
+    @override_settings(ROOT_URLCONF='api.tests')
+    def test_async_view_is_not_run_in_a_thread(self):
+        middleware = ThreadLocalUserMiddleware(self._get_response)
+        middleware.middleware = mock.Mock()
+
+        response = async_to_sync(middleware)(self._request('/async/'))
+
+        self.assertEqual(response.status_code, 200)
+        middleware.middleware.assert_not_called()
+
+
+class AsyncClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+        self.request.user = AnonymousUser()
+
+    def test_run(self):
+        def func(value):
+            return value, threading.current_thread().name, \
+                get_current_user() is self.request.user
+
+        value, thread, user_set = async_to_sync(async_client.run)(
+            self.request, func, 'value'
+        )
+
+        self.assertEqual(value, 'value')
+        self.assertTrue(thread.startswith('api-async'))
+        self.assertTrue(user_set)
+
+    def test_render(self):
+        rendered = []
+        response = HttpResponse()
+        response.render = lambda: rendered.append(
+            get_current_user() is self.request.user
+        )
+
+        self.assertIs(
+            async_to_sync(async_client.render)(self.request, response),
+            response
+        )
+        # Rendered once, with the thread locals set up
+        self.assertEqual(rendered, [True])
+
+    def test_resource_client(self):
+        resource = mock.Mock()
+        resource.client.get.return_value = ['appointment']
+        client = async_client.AsyncResourceClient(resource, self.request)
+
+        self.assertEqual(async_to_sync(client.get)(pk=1), ['appointment'])
+        resource.client.get.assert_called_once_with(pk=1)
+
+        obj = mock.Mock()
+        async_to_sync(client.put)(obj, user_token='token')
+        obj.put.assert_called_once_with(user_token='token')
+
+
+class StubBackendTests(SimpleTestCase):
+
+    def test_serves_experiments(self):
+        backend = StubBackend(n_experiments=2, n_timeslots=3)
+
+        with use_stub_backend(backend):
+            session = http.get_session()
+            found = session.get(settings.API_HOST + 'api/experiments/2/')
+            missing = session.get(settings.API_HOST + 'api/experiments/3/')
+
+        self.assertEqual(found.json()['id'], 2)
+        self.assertEqual(len(found.json()['timeslots']), 3)
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(backend.calls, 2)
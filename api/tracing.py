@@ -0,0 +1,196 @@
+"""
+Records the backend calls made while handling a request.
+
+api.middleware.BackendCallsMiddleware starts a CallLog for every request;
+the pooled session (see api.http) adds every call made through it. Calls
+made by prefetch threads end up in the same log, as those run in a copy of
+the request's context.
+"""
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+
+class BackendCall:
+    __slots__ = ('method', 'path', 'resource', 'status', 'bytes', 'duration')
+
+    def __init__(self, method: str, path: str, resource: str,
+                 status: Optional[int], size: int, duration: float):
+        self.method = method
+        self.path = path
+        self.resource = resource
+        self.status = status
+        self.bytes = size
+        self.duration = duration
+
+    def as_dict(self) -> dict:
+        return {
+            'method':      self.method,
+            'path':        self.path,
+            'resource':    self.resource,
+            'status':      self.status,
+            'bytes':       self.bytes,
+            'duration_ms': round(self.duration * 1000, 1),
+        }
+
+
+class CallLog:
+    """The backend calls made during one request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: List[BackendCall] = []
+        # Fetches that waited on an identical call, see api.cache.SingleFlight
+        self.coalesced = 0
+
+    def add(self, method: str, url: str, status: Optional[int], size: int,
+            duration: float) -> None:
+        path = urlsplit(url).path
+        call = BackendCall(method.upper(), path, resolve_resource(path),
+                           status, size, duration)
+
+        with self._lock:
+            self.calls.append(call)
+
+    def add_coalesced(self) -> None:
+        with self._lock:
+            self.coalesced += 1
+
+    def __len__(self):
+        return len(self.calls)
+
+    @property
+    def total_duration(self) -> float:
+        return sum(call.duration for call in self.calls)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(call.bytes for call in self.calls)
+
+    def server_timing(self) -> str:
+        """Formats the calls as a Server-Timing header value.
+
+        Only the resource names are included, as the paths contain ids.
+        """
+        metrics = ['api;desc="{} calls";dur={:.1f}'.format(
+            len(self.calls),
+            self.total_duration * 1000
+        )]
+
+        for n, call in enumerate(self.calls, 1):
+            metrics.append('api-{};desc="{} {} {}";dur={:.1f}'.format(
+                n,
+                call.method,
+                call.resource,
+                call.status or '-',
+                call.duration * 1000,
+            ))
+
+        return ', '.join(metrics)
+
+    def as_dict(self) -> dict:
+        return {
+            'backend_calls':       len(self.calls),
+            'backend_duration_ms': round(self.total_duration * 1000, 1),
+            'backend_bytes':       self.total_bytes,
+            'coalesced':           self.coalesced,
+            'calls':               [call.as_dict() for call in self.calls],
+        }
+
+
+_call_log = contextvars.ContextVar('api_call_log', default=None)
+
+
+def get_call_log() -> Optional[CallLog]:
+    return _call_log.get()
+
+
+@contextmanager
+def record_calls():
+    """Records all backend calls made in this block in the yielded
+    CallLog"""
+    call_log = CallLog()
+    token = _call_log.set(call_log)
+    try:
+        yield call_log
+    finally:
+        _call_log.reset(token)
+
+
+class Timer:
+    """Times a backend call and adds it to the current CallLog (if any).
+
+    The status and size should be set before the block exits; if an
+    exception is raised before that, the call is recorded without a status.
+    """
+
+    def __init__(self, method: str, url: str):
+        self.method = method
+        self.url = url
+        self.status = None
+        self.size = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        call_log = get_call_log()
+        if call_log is not None:
+            call_log.add(self.method, self.url, self.status, self.size,
+                         time.perf_counter() - self.start)
+
+
+_resource_patterns = None
+
+
+def _get_resource_patterns() -> list:
+    """Returns a list of (regex, name) tuples, one for each resource with a
+    path, built from the resources in api.resources"""
+    global _resource_patterns
+
+    if _resource_patterns is None:
+        from cdh.rest import client as rest
+        import api.resources  # noqa, makes sure all resources are defined
+
+        patterns = []
+        seen = set()
+        todo = list(rest.Resource.__subclasses__())
+        while todo:
+            resource = todo.pop()
+            todo.extend(resource.__subclasses__())
+            if resource in seen:
+                continue
+            seen.add(resource)
+
+            meta = getattr(resource, '_meta', None) or \
+                getattr(resource, 'Meta', None)
+            path = getattr(meta, 'path', None)
+            if not isinstance(path, str):
+                continue
+
+            regex = re.sub(r'\\{\w+\\}', '[^/]+', re.escape(path.strip('/')))
+            patterns.append((
+                re.compile(r'(?:^|/)' + regex + '/?$'),
+                resource.__name__
+            ))
+
+        # Most specific paths first
+        patterns.sort(key=lambda pattern: -len(pattern[0].pattern))
+        _resource_patterns = patterns
+
+    return _resource_patterns
+
+
+def resolve_resource(path: str) -> str:
+    """Returns the name of the resource for a backend path. Resources
+    sharing a path are not distinguished; the first match is returned."""
+    for regex, name in _get_resource_patterns():
+        if regex.search(path.strip('/')):
+            return name
+
+    return re.sub(r'/\d+(?=/|$)', '/{pk}', path)
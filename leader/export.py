@@ -0,0 +1,134 @@
+"""
+Bulk export of the participants of multiple experiments, as a ZIP archive
+with one CSV per experiment (see BulkDownloadParticipantsView).
+
+The experiments are fetched concurrently on a pool of their own, with at
+most LEADER_EXPORT_WORKERS fetches running at once for all exports. That
+way, exports don't hold up the prefetches of page views (see api.prefetch).
+Every experiment is written to the archive as soon as its fetch completes,
+and the archive is streamed to the client as it's written. So only the
+experiments being fetched and a small write buffer are held in memory.
+"""
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Callable, Iterable, Iterator, Tuple
+
+from django.conf import settings
+from django.utils.text import get_valid_filename
+
+from api import prefetch
+from api.resources.experiment_resources import LeaderExperiment
+from leader.utils import iter_participants_csv
+
+# The pool experiments are fetched on, shared by all exports
+pool = prefetch.RequestPool('leader-export', 'LEADER_EXPORT_WORKERS', 4)
+
+# The max number of experiments in one export
+MAX_EXPERIMENTS = 50
+
+
+class _ZipBuffer:
+    """A write-only file that keeps what's written to it until it's taken.
+
+    It doesn't support tell() or seek(), so zipfile writes the archive as a
+    stream (with the sizes after the data)."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(files: Iterable[Tuple[str, Iterable[str]]]) -> Iterator[bytes]:
+    """Returns the chunks of a ZIP archive with the given (name, lines)
+    files, generating them as the lines are read"""
+    buffer = _ZipBuffer()
+
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, lines in files:
+            with archive.open(name, 'w') as file:
+                for line in lines:
+                    file.write(line.encode('utf-8'))
+
+                    data = buffer.take()
+                    if data:
+                        yield data
+
+            # The rest of the compressed data, and the file's sizes
+            yield buffer.take()
+
+    # The central directory
+    yield buffer.take()
+
+
+def iter_completed(request, func: Callable, args: Iterable,
+                   workers: int) -> Iterator[Tuple[object, object, Exception]]:
+    """Runs func(arg) for all args on the export pool, with at most `workers`
+    of them submitted at once. Yields an (arg, result, exception) tuple for
+    every call, in the order they complete."""
+    args = iter(args)
+    running = {}
+
+    def submit_next() -> None:
+        for arg in args:
+            running[pool.submit(request, func, arg)] = arg
+            return
+
+    for _ in range(workers):
+        submit_next()
+
+    while running:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            arg = running.pop(future)
+            submit_next()
+
+            exception = future.exception()
+            yield arg, None if exception else future.result(), exception
+
+
+def _fetch_experiment(pk):
+    # download=True makes sure the API logs this as a download event
+    return LeaderExperiment.client.get(pk=pk, download=True)
+
+
+def iter_experiment_csvs(request, pks: Iterable[int], texts: dict) -> \
+        Iterator[Tuple[str, Iterable[str]]]:
+    """Yields a (file name, lines) CSV for each of the given experiments, as
+    they are fetched. Experiments that couldn't be fetched (including those
+    the backend doesn't allow the leader to see) are listed in an errors.txt
+    file at the end.
+
+    texts are the translated texts of the CSVs, see
+    leader.utils.get_participants_csv_texts.
+    """
+    workers = getattr(settings, 'LEADER_EXPORT_WORKERS', 4)
+    failed = []
+
+    for pk, experiment, exception in iter_completed(request,
+                                                     _fetch_experiment, pks,
+                                                     workers):
+        if exception:
+            failed.append(pk)
+            continue
+
+        name = get_valid_filename(
+            '{}-{}.csv'.format(experiment.id, experiment.name)
+        )
+        yield name, iter_participants_csv(experiment, experiment.timeslots,
+                                          texts)
+
+    if failed:
+        yield 'errors.txt', [
+            'Could not export experiment {}\n'.format(pk) for pk in failed
+        ]
@@ -1,7 +1,17 @@
+from datetime import datetime, time, timedelta
+from typing import List, Optional, Tuple
+
 from django import forms
+from django.forms.utils import from_current_timezone
+from django.utils.dates import WEEKDAYS
+from django.utils.timezone import localtime
+from django.utils.translation import gettext_lazy as _
 
 from cdh.core.forms import TemplatedForm
 
+# The max number of timeslots that can be created at once
+MAX_RECURRING_SLOTS = 500
+
 
 class ChangeProfileForm(TemplatedForm):
     name = forms.Field()
@@ -23,14 +33,62 @@ class ChangeProfileForm(TemplatedForm):
 
 
 class TimeSlotForm(TemplatedForm):
-    datetime = forms.DateTimeField()
+    """Adds a single timeslot, or (if recurring is checked) a timeslot every
+    `interval` minutes between start_time and end_time, on the given weekdays
+    between start_date and end_date."""
+    datetime = forms.DateTimeField(
+        required=False,
+    )
 
     max_places = forms.IntegerField()
 
+    recurring = forms.BooleanField(
+        label=_('timeslots:form:recurring'),
+        required=False,
+    )
+
+    start_date = forms.DateField(
+        label=_('timeslots:form:start_date'),
+        required=False,
+    )
+
+    end_date = forms.DateField(
+        label=_('timeslots:form:end_date'),
+        required=False,
+    )
+
+    weekdays = forms.TypedMultipleChoiceField(
+        label=_('timeslots:form:weekdays'),
+        choices=sorted(WEEKDAYS.items()),
+        coerce=int,
+        widget=forms.CheckboxSelectMultiple,
+        required=False,
+    )
+
+    start_time = forms.TimeField(
+        label=_('timeslots:form:start_time'),
+        required=False,
+    )
+
+    end_time = forms.TimeField(
+        label=_('timeslots:form:end_time'),
+        required=False,
+    )
+
+    interval = forms.IntegerField(
+        label=_('timeslots:form:interval'),
+        min_value=5,
+        initial=30,
+        required=False,
+    )
+
     experiment = forms.Field(
         widget=forms.HiddenInput
     )
 
+    _recurring_fields = ['start_date', 'end_date', 'weekdays', 'start_time',
+                         'end_time', 'interval']
+
     def __init__(self, *args, **kwargs):
         super(TimeSlotForm, self).__init__(*args, **kwargs)
 
@@ -41,6 +99,146 @@ class TimeSlotForm(TemplatedForm):
             }
         )
 
+    def clean(self):
+        cleaned_data = super(TimeSlotForm, self).clean()
+
+        if not cleaned_data.get('recurring'):
+            if not cleaned_data.get('datetime') and \
+                    'datetime' not in self.errors:
+                self.add_error('datetime', forms.Field.default_error_messages[
+                    'required'
+                ])
+            return cleaned_data
+
+        for field in self._recurring_fields:
+            if cleaned_data.get(field) in (None, [], '') and \
+                    field not in self.errors:
+                self.add_error(
+                    field,
+                    forms.Field.default_error_messages['required']
+                )
+
+        if self.errors:
+            return cleaned_data
+
+        if cleaned_data['end_date'] < cleaned_data['start_date']:
+            self.add_error('end_date', _('timeslots:form:error:end_date'))
+        if cleaned_data['end_time'] <= cleaned_data['start_time']:
+            self.add_error('end_time', _('timeslots:form:error:end_time'))
+
+        if self.errors:
+            return cleaned_data
+
+        n_slots = len(self.get_datetimes())
+        if n_slots == 0:
+            raise forms.ValidationError(_('timeslots:form:error:no_slots'))
+        if n_slots > MAX_RECURRING_SLOTS:
+            raise forms.ValidationError(
+                _('timeslots:form:error:too_many_slots'),
+                params={'n': n_slots, 'max': MAX_RECURRING_SLOTS},
+            )
+
+        return cleaned_data
+
+    def get_datetimes(self) -> List[datetime]:
+        """Returns the (aware) datetimes of all timeslots to create, in
+        order"""
+        data = self.cleaned_data
+
+        if not data.get('recurring'):
+            return [data['datetime']]
+
+        interval = timedelta(minutes=data['interval'])
+        weekdays = set(data['weekdays'])
+        datetimes = []
+
+        day = data['start_date']
+        while day <= data['end_date']:
+            if day.weekday() in weekdays:
+                current = datetime.combine(day, data['start_time'])
+                end = datetime.combine(day, data['end_time'])
+                while current < end:
+                    datetimes.append(from_current_timezone(current))
+                    current += interval
+
+                    # Stop early, clean() will refuse this anyway
+                    if len(datetimes) > MAX_RECURRING_SLOTS:
+                        return datetimes
+            day += timedelta(days=1)
+
+        return datetimes
+
+
+class TimeSlotWindowForm(TemplatedForm):
+    """Selects which timeslots are shown on the timeslots page"""
+    UPCOMING = 'upcoming'
+    PAST_WEEK = 'past_week'
+    CUSTOM = 'custom'
+    ALL = 'all'
+
+    show_valid_fields = False
+
+    window = forms.ChoiceField(
+        label=_('timeslots:window'),
+        choices=(
+            (UPCOMING, _('timeslots:window:upcoming')),
+            (PAST_WEEK, _('timeslots:window:past_week')),
+            (CUSTOM, _('timeslots:window:custom')),
+            (ALL, _('timeslots:window:all')),
+        ),
+        initial=UPCOMING,
+        required=False,
+    )
+
+    from_date = forms.DateField(
+        label=_('timeslots:window:from_date'),
+        required=False,
+    )
+
+    until_date = forms.DateField(
+        label=_('timeslots:window:until_date'),
+        required=False,
+    )
+
+    def get_window(self, now: datetime) -> Tuple[Optional[datetime],
+                                                 Optional[datetime]]:
+        """Returns the (aware) start and end of the selected window, either
+        of which can be None. Defaults to the upcoming timeslots if the form
+        is invalid.
+
+        Windows start and end at midnight. They end up in the cache key of
+        the experiment (see TimeSlotHomeView), so they should stay the same
+        for the rest of the day.
+        """
+        data = self.cleaned_data if self.is_valid() else {}
+        window = data.get('window') or self.UPCOMING
+        today = from_current_timezone(
+            datetime.combine(localtime(now).date(), time.min)
+        )
+
+        if window == self.ALL:
+            return None, None
+
+        if window == self.PAST_WEEK:
+            # The 7 days before today; today itself is part of upcoming
+            return today - timedelta(days=7), today
+
+        if window == self.CUSTOM:
+            start = data.get('from_date')
+            end = data.get('until_date')
+            return (
+                from_current_timezone(
+                    datetime.combine(start, time.min)
+                ) if start else None,
+                # The end date is inclusive
+                from_current_timezone(
+                    datetime.combine(end + timedelta(days=1), time.min)
+                ) if end else None,
+            )
+
+        # Upcoming; timeslots from earlier today are included
+        return today, None
+
 
 class AddCommentForm(TemplatedForm):
     show_valid_fields = False
@@ -0,0 +1,344 @@
+"""
+Server-side processing for the participants table (see
+ExperimentParticipantsDataView).
+
+Instead of rendering every appointment into the page, the table asks for
+one page at a time. ParticipantsTable builds the rows of an experiment once:
+the displayed text of every cell (lowercased, for searching) and a sort key
+per column. The row order for a sort is computed once as well, so a request
+only has to filter the (already sorted) rows and render the requested page.
+
+Tables are cached per experiment and user. The page itself builds the
+table (or checks the cached one is still up to date), as it fetches the
+experiment anyway: as LeaderExperiment is revalidated (see api.cache), an
+unchanged experiment is the same object, and its table is reused. The page
+passes the version of that table to DataTables, so its first draw can use
+it without fetching the experiment again. Only if that version isn't cached
+(e.g. as the draw is served by another process) does the first draw fetch
+the experiment itself. DataTables numbers its draws from 1 on every page
+load; later draws (paging, sorting and searching) use the cached table
+without fetching the experiment, just like a table rendered into the page
+would.
+"""
+import uuid
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from django.template.defaultfilters import date as date_filter, yesno
+from django.urls import reverse
+from django.utils.html import format_html
+from django.utils.timezone import is_aware, localtime
+from django.utils.translation import get_language, gettext as _
+
+from api import cache
+
+# The tables of recently requested experiments, with the experiment they're
+# built from
+table_cache = cache.TTLCache(max_size=32)
+
+
+class Column:
+    """A column of the participants table.
+
+    `value` returns the displayed text of a cell from a (timeslot, n,
+    appointment) row, `sort_key` the value to sort on (defaults to the
+    lowercased text). `render` returns the HTML of a cell; it defaults to
+    the (escaped) text. If `private` is set, the cell is hidden unless the
+    experiment's participants are visible.
+    """
+
+    def __init__(self, name: str, value: Callable = None,
+                 sort_key: Callable = None, render: Callable = None,
+                 private: bool = False, searchable: bool = True):
+        self.name = name
+        self.value = value
+        self.sort_key = sort_key
+        self.render = render
+        self.private = private
+        self.searchable = searchable and value is not None
+
+    @property
+    def orderable(self) -> bool:
+        return self.value is not None
+
+
+def _localtime(dt):
+    return localtime(dt) if is_aware(dt) else dt
+
+
+def _participant(row):
+    return row[2].participant
+
+
+def _no_value(value) -> str:
+    return '' if value is None else str(value)
+
+
+TIMESLOT_COLUMNS = [
+    Column(
+        'datetime',
+        value=lambda row: date_filter(_localtime(row[0].datetime),
+                                      'Y-m-d H:i'),
+        sort_key=lambda row: row[0].datetime,
+    ),
+    Column(
+        'day',
+        value=lambda row: date_filter(_localtime(row[0].datetime), 'l'),
+    ),
+    Column(
+        'place',
+        value=lambda row: str(row[1]),
+        sort_key=lambda row: row[1],
+    ),
+]
+
+COLUMNS = [
+    Column(
+        'name',
+        value=lambda row: _no_value(_participant(row).name),
+        private=True,
+    ),
+    Column(
+        'reminder',
+        render=lambda table, row: format_html(
+            '<input type="checkbox" name="reminder[]" value="{}">',
+            row[2].id,
+        ),
+    ),
+    Column(
+        'actions',
+        render=lambda table, row: table.render_actions(row),
+    ),
+    Column(
+        'email',
+        value=lambda row: _no_value(_participant(row).email),
+        render=lambda table, row: format_html(
+            '<a href="mailto:{0}">{0}</a>', _participant(row).email
+        ),
+        private=True,
+    ),
+    Column(
+        'phone',
+        value=lambda row: _no_value(_participant(row).phonenumber),
+        private=True,
+    ),
+    Column(
+        'birth_date',
+        value=lambda row: date_filter(_participant(row).birth_date, 'Y-m-d'),
+    ),
+    Column(
+        'language',
+        value=lambda row: _no_value(_participant(row).language),
+    ),
+    Column(
+        'multilingual',
+        value=lambda row: yesno(_participant(row).multilingual,
+                                _('many,one')),
+    ),
+    Column(
+        'handedness',
+        value=lambda row: _no_value(_participant(row).handedness),
+    ),
+    Column(
+        'sex',
+        value=lambda row: _no_value(_participant(row).sex),
+    ),
+    Column(
+        'social_status',
+        value=lambda row: _no_value(
+            _participant(row).get_social_status_display()
+        ),
+    ),
+    Column(
+        'email_subscription',
+        value=lambda row: yesno(_participant(row).email_subscription,
+                                _('yes,no')),
+    ),
+]
+
+
+class ParticipantsTable:
+    """The rows of the participants table of an experiment, indexed for
+    sorting and searching. `rows` are the (timeslot, n, appointment) tuples,
+    as built by ExperimentParticipantsView._get_appointments."""
+
+    def __init__(self, experiment, rows: Sequence[tuple]):
+        self.experiment = experiment
+        # Identifies this table across requests, see the module docstring
+        self.version = uuid.uuid4().hex
+        self.rows = list(rows)
+        self.columns = TIMESLOT_COLUMNS + COLUMNS \
+            if experiment.use_timeslots else list(COLUMNS)
+        self.participants_visible = experiment.participants_visible
+        self.hidden_text = _('globals:hidden')
+
+        # The displayed text of every cell, per row
+        self.texts: List[Tuple[str, ...]] = [
+            tuple(self._text(column, row) for column in self.columns)
+            for row in self.rows
+        ]
+        # The lowercased text of all searchable cells, per row
+        searchable = [
+            i for i, column in enumerate(self.columns) if column.searchable
+        ]
+        self.search_texts = [
+            '\n'.join(texts[i] for i in searchable).lower()
+            for texts in self.texts
+        ]
+        self._orders: Dict[tuple, List[int]] = {}
+
+    def _text(self, column: Column, row) -> str:
+        if column.value is None:
+            return ''
+
+        if column.private and not self.participants_visible:
+            return self.hidden_text
+
+        return column.value(row)
+
+    def _sort_key(self, column_index: int) -> Callable[[int], object]:
+        column = self.columns[column_index]
+
+        # Hidden cells all show the same text, so they shouldn't be sorted on
+        # what they hide
+        if column.sort_key and not (column.private and
+                                    not self.participants_visible):
+            keys = [column.sort_key(row) for row in self.rows]
+        else:
+            keys = [texts[column_index].lower() for texts in self.texts]
+
+        # None can't be compared, so those come first
+        return lambda i: (keys[i] is not None, keys[i])
+
+    def get_order(self, order: Sequence[Tuple[int, bool]]) -> List[int]:
+        """Returns the row indices, sorted on the given (column index,
+        descending) pairs. Cached per order."""
+        order = tuple(
+            (column, descending) for column, descending in order
+            if 0 <= column < len(self.columns) and
+            self.columns[column].orderable
+        )
+
+        indices = self._orders.get(order)
+        if indices is None:
+            indices = list(range(len(self.rows)))
+            # Python's sort is stable, so sorting on the last column first
+            # results in a sort on all columns
+            for column, descending in reversed(order):
+                indices.sort(key=self._sort_key(column), reverse=descending)
+            self._orders[order] = indices
+
+        return indices
+
+    def query(self, start: int = 0, length: int = -1,
+              order: Sequence[Tuple[int, bool]] = (),
+              search: str = '',
+              column_searches: Optional[Dict[int, str]] = None) -> \
+            Tuple[int, List[int]]:
+        """Returns the number of rows matching the searches, and the indices
+        of the rows on the requested page. Searching is case-insensitive,
+        on the displayed text."""
+        indices = self.get_order(order)
+
+        search = search.strip().lower()
+        column_searches = {
+            column: value.strip().lower()
+            for column, value in (column_searches or {}).items()
+            if value.strip() and 0 <= column < len(self.columns) and
+            self.columns[column].searchable
+        }
+
+        if search or column_searches:
+            indices = [
+                i for i in indices
+                if search in self.search_texts[i] and all(
+                    value in self.texts[i][column].lower()
+                    for column, value in column_searches.items()
+                )
+            ]
+
+        end = None if length < 0 else start + length
+        return len(indices), indices[start:end]
+
+    def render_row(self, index: int) -> List[str]:
+        """Returns the HTML of the cells of a row"""
+        row = self.rows[index]
+        cells = []
+        for column, text in zip(self.columns, self.texts[index]):
+            hidden = column.private and not self.participants_visible
+            if column.render and not hidden:
+                cells.append(column.render(self, row))
+            else:
+                cells.append(format_html('{}', text))
+
+        return cells
+
+    def render_actions(self, row) -> str:
+        appointment = row[2]
+        return format_html(
+            '<a href="{}?next={}" class="icon-remove-participant" '
+            'title="{}"></a> '
+            '<a href="{}" class="icon-comment"></a>',
+            reverse('leader:delete_appointment',
+                    args=[self.experiment.id, appointment.id]),
+            reverse('leader:participants', args=[self.experiment.id]),
+            _('timeslots:remove_participant:title'),
+            reverse('leader:add_comment',
+                    args=[self.experiment.id, appointment.participant.id]),
+        )
+
+
+def get_cached_table(key: tuple) -> Optional[ParticipantsTable]:
+    """Returns the cached table for the given key, if there is one"""
+    return table_cache.get(key + (get_language(),))
+
+
+def get_table(experiment, key: tuple,
+              get_rows: Callable[[], Sequence[tuple]]) -> ParticipantsTable:
+    """Returns the table of the given experiment, reusing the cached one if
+    it was built from the same experiment object. get_rows is only called if
+    the table needs to be built."""
+    cached = get_cached_table(key)
+    if cached is not None and cached.experiment is experiment:
+        return cached
+
+    table = ParticipantsTable(experiment, get_rows())
+    table_cache.set(key + (get_language(),), table, cache.get_validated_ttl())
+
+    return table
+
+
+def parse_int(value, default: int) -> int:
+    """Returns value as an int, or default if it isn't one"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_params(params) -> dict:
+    """Returns the kwargs for ParticipantsTable.query from the parameters
+    DataTables sends for server-side processing"""
+    order = []
+    i = 0
+    while 'order[{}][column]'.format(i) in params:
+        order.append((
+            parse_int(params.get('order[{}][column]'.format(i)), -1),
+            params.get('order[{}][dir]'.format(i)) == 'desc',
+        ))
+        i += 1
+
+    column_searches = {}
+    i = 0
+    while 'columns[{}][data]'.format(i) in params:
+        value = params.get('columns[{}][search][value]'.format(i))
+        if value:
+            column_searches[i] = value
+        i += 1
+
+    return {
+        'start':           max(parse_int(params.get('start'), 0), 0),
+        'length':          parse_int(params.get('length'), -1),
+        'order':           order,
+        'search':          params.get('search[value]', ''),
+        'column_searches': column_searches,
+    }
@@ -1,14 +1,20 @@
 $(function () {
     let asInitVals = [];
-    let oTable = $('.dt_custom').DataTable({
+    let table = $('.dt_custom');
+    let oTable = table.DataTable({
         order: [[0, 'asc'], [2, 'asc']],
         lengthMenu: [
             [10, 20, 50, -1],
             ["10", "20", "50", "\u221e"]
         ],
         responsive: true,
-        pageLength: -1,
+        pageLength: 50,
         paginationType: "full_numbers",
+        // Only the current page is loaded, see ExperimentParticipantsDataView
+        serverSide: true,
+        processing: true,
+        searchDelay: 300,
+        ajax: table.data('source'),
     });
 
 
@@ -41,7 +47,45 @@ $(function () {
         }
     });
 
-    $('.icon-remove-participant').click(function () {
+    // Only the rows of the current page exist, so the selected reminders
+    // are kept here while the leader pages, sorts and searches
+    let selectedReminders = new Set();
+
+    table.on('change', 'input[name="reminder[]"]', function () {
+        if (this.checked) {
+            selectedReminders.add(this.value);
+        } else {
+            selectedReminders.delete(this.value);
+        }
+    });
+
+    oTable.on('draw', function () {
+        table.find('input[name="reminder[]"]').each(function () {
+            this.checked = selectedReminders.has(this.value);
+        });
+    });
+
+    table.closest('form').submit(function () {
+        let form = $(this);
+        let shown = new Set(
+            table.find('input[name="reminder[]"]').map(function () {
+                return this.value;
+            }).get()
+        );
+
+        form.find('input.selected-reminder').remove();
+        selectedReminders.forEach(function (id) {
+            // Checked boxes on the current page are sent as they are
+            if (!shown.has(id)) {
+                $('<input type="hidden" name="reminder[]" class="selected-reminder">')
+                    .val(id)
+                    .appendTo(form);
+            }
+        });
+    });
+
+    // The rows are replaced on every draw, so the handler is delegated
+    table.on('click', '.icon-remove-participant', function () {
         return confirm(gettext('timeslot:warning:confirm_remove_participant'));
     });
 
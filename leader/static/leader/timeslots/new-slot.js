@@ -1,6 +1,7 @@
 /**
  * This file does the following:
  * - creates a datetimepicker for the timeslot creation
+ * - Shows either the datetime field, or the recurrence fields
  * - Validates the new timeslot data before submitting the form
  */
 $(function () {
@@ -15,9 +16,29 @@ $(function () {
         forceParse: false, // We validate manually, as to provide better feedback to the user
     });
 
+    // Show the recurrence fields only when creating recurring timeslots
+    const recurring = $('#id_recurring');
+    const recurringFields = ['start_date', 'end_date', 'weekdays', 'start_time', 'end_time', 'interval'];
+
+    function toggleRecurring() {
+        let checked = recurring.is(':checked');
+
+        $('#id_datetime').closest('.form-group, .mb-3').toggle(!checked);
+        recurringFields.forEach(function (field) {
+            $('#id_' + field).closest('.form-group, .mb-3').toggle(checked);
+        });
+    }
+
+    recurring.change(toggleRecurring);
+    toggleRecurring();
+
     // Run validation when the submit button is clicked
     // When it returns false, the form is not submitted.
     $("#save-new-slot").click(function () {
+        // Recurring timeslots are validated by the server
+        if (recurring.is(':checked'))
+            return true;
+
         let datetime = $('#id_datetime');
 
         try {
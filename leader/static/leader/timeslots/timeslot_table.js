@@ -6,6 +6,7 @@
  *   In addition, it enables other checkboxes as needed
  * - It makes sure all checkboxes are properly sent and reset on submit
  * - Gives the remove and remove silently buttons for participants their functionality
+ * - Only shows the date fields of the period selection for a custom period
  *
  * A few notes:
  * A timeslot can have multiple places (for running participants simultaneously).
@@ -137,4 +138,18 @@ $(function () {
         return confirm(gettext('timeslot:warning:confirm_remove_participant'));
     });
 
-});
\ No newline at end of file
+});
+
+$(function () {
+    // Only show the from/until fields when a custom period is selected
+    const window_select = $('#id_window');
+
+    function toggle_custom_window() {
+        let custom = window_select.val() === 'custom';
+
+        $('#id_from_date, #id_until_date').closest('.form-group, .mb-3').toggle(custom);
+    }
+
+    window_select.change(toggle_custom_window);
+    toggle_custom_window();
+});
@@ -1,3 +1,439 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import zipfile
+from datetime import datetime, time, timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import include, path
+
+from api import streaming
+from api.fields import LazyValue, compact_collection, filter_collection
+from api.resources.timeslot_resources import CompactLeaderInlineTimeSlot
+from leader.forms import MAX_RECURRING_SLOTS, TimeSlotForm, \
+    TimeSlotWindowForm
+from leader import export, participants_table, utils
+from leader.participants_table import ParticipantsTable, parse_int, \
+    parse_params
+from leader.utils import iter_participants_csv
+from leader.views import BulkDownloadParticipantsView, \
+    ExperimentParticipantsDataView
+
+urlpatterns = [
+    path('leader/', include('leader.urls')),
+]
+
+
+class TimeSlotFormTests(TestCase):
+
+    def _form(self, **data):
+        defaults = {
+            'max_places': 2,
+            'experiment': 1,
+            'recurring':  'on',
+            'start_date': '2030-01-07',  # A monday
+            'end_date':   '2030-01-13',
+            'weekdays':   ['0', '2'],
+            'start_time': '09:00',
+            'end_time':   '10:00',
+            'interval':   '30',
+        }
+        defaults.update(data)
+        return TimeSlotForm(defaults)
+
+    @override_settings(USE_TZ=True)
+    def test_recurring_datetimes(self):
+        form = self._form()
+        self.assertTrue(form.is_valid(), form.errors)
+
+        datetimes = form.get_datetimes()
+        self.assertEqual(
+            [(dt.day, dt.time()) for dt in datetimes],
+            [(7, time(9)), (7, time(9, 30)), (9, time(9)), (9, time(9, 30))]
+        )
+        self.assertTrue(all(dt.tzinfo for dt in datetimes))
+
+    def test_recurring_validation(self):
+        self.assertFalse(self._form(end_time='09:00').is_valid())
+        self.assertFalse(self._form(weekdays=['5'],
+                                    end_date='2030-01-11').is_valid())
+        self.assertFalse(self._form(weekdays=[]).is_valid())
+
+        form = self._form(end_date='2031-01-01', end_time='18:00',
+                          interval='5', weekdays=[str(i) for i in range(7)])
+        self.assertFalse(form.is_valid())
+        self.assertGreater(len(form.get_datetimes()), MAX_RECURRING_SLOTS)
+
+    def test_single(self):
+        self.assertFalse(self._form(recurring='').is_valid())
+        form = self._form(recurring='', datetime='2030-01-07 09:00')
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(len(form.get_datetimes()), 1)
+
+
+@override_settings(USE_TZ=True, TIME_ZONE='UTC')
+class TimeSlotWindowTests(TestCase):
+    now = datetime(2030, 1, 9, 12, tzinfo=timezone.utc)
+
+    def test_windows(self):
+        self.assertEqual(
+            TimeSlotWindowForm().get_window(self.now),
+            (datetime(2030, 1, 9, tzinfo=timezone.utc), None)
+        )
+        self.assertEqual(
+            TimeSlotWindowForm({'window': 'all'}).get_window(self.now),
+            (None, None)
+        )
+        self.assertEqual(
+            TimeSlotWindowForm({'window': 'past_week'}).get_window(self.now),
+            (datetime(2030, 1, 2, tzinfo=timezone.utc),
+             datetime(2030, 1, 9, tzinfo=timezone.utc))
+        )
+        self.assertEqual(
+            TimeSlotWindowForm({
+                'window':     'custom',
+                'from_date':  '2030-01-01',
+                'until_date': '2030-01-01',
+            }).get_window(self.now),
+            (datetime(2030, 1, 1, tzinfo=timezone.utc),
+             datetime(2030, 1, 2, tzinfo=timezone.utc))
+        )
+
+    def test_filter_collection(self):
+        built = []
+
+        def build(raw):
+            built.extend(raw)
+            return raw
+
+        value = LazyValue([1, 2, 3, 4], build)
+        filtered = filter_collection(value, None, lambda item: item % 2)
+        self.assertEqual(list(filtered), [1, 3])
+        self.assertEqual(built, [1, 3])
+
+        # Built values are filtered with the other predicate
+        self.assertEqual(
+            filter_collection(filtered, lambda item: item > 1, None),
+            [3]
+        )
+
+
+class ParticipantsTableTests(TestCase):
+
+    def _table(self, participants_visible=True):
+        participants = [
+            SimpleNamespace(id=i, name=name, email=name.lower() + '@uu.nl',
+                            phonenumber=None, language='nl',
+                            multilingual=False, birth_date=None,
+                            handedness=None, sex=None, social_status='S',
+                            email_subscription=True,
+                            get_social_status_display=lambda: 'Student')
+            for i, name in enumerate(['Bea', 'anna', 'Cor'])
+        ]
+        rows = [
+            (None, None, SimpleNamespace(id=i, participant=participant))
+            for i, participant in enumerate(participants)
+        ]
+        experiment = SimpleNamespace(
+            id=1,
+            use_timeslots=False,
+            participants_visible=participants_visible,
+        )
+        return ParticipantsTable(experiment, rows)
+
+    def test_query(self):
+        table = self._table()
+
+        # Sorted on the name, case-insensitive
+        self.assertEqual(table.query(order=[(0, False)]), (3, [1, 0, 2]))
+        self.assertEqual(table.query(order=[(0, True)], start=1, length=1),
+                         (3, [0]))
+        self.assertEqual(table.query(search='ANNA'), (1, [1]))
+        self.assertEqual(table.query(column_searches={3: 'cor@'}), (1, [2]))
+
+    def test_hidden_participants(self):
+        table = self._table(participants_visible=False)
+
+        # Hidden values can't be found
+        self.assertEqual(table.query(search='anna')[0], 0)
+        self.assertEqual(
+            parse_params({
+                'start':                     '10',
+                'length':                    '50',
+                'order[0][column]':          '0',
+                'order[0][dir]':             'desc',
+                'columns[0][data]':          '0',
+                'columns[0][search][value]': 'x',
+                'search[value]':             'y',
+            }),
+            {
+                'start':           10,
+                'length':          50,
+                'order':           [(0, True)],
+                'search':          'y',
+                'column_searches': {0: 'x'},
+            }
+        )
+
+    def test_cached_table(self):
+        participants_table.table_cache.clear()
+        experiment = self._table().experiment
+
+        def get_rows():
+            return self._table().rows
+
+        table = participants_table.get_table(experiment, (1, 2), get_rows)
+
+        self.assertIs(participants_table.get_cached_table((1, 2)), table)
+        self.assertIsNone(participants_table.get_cached_table((1, 3)))
+        self.assertIs(
+            participants_table.get_table(experiment, (1, 2), get_rows),
+            table
+        )
+        # A new experiment object means the experiment changed
+        self.assertIsNot(
+            participants_table.get_table(SimpleNamespace(**vars(experiment)),
+                                         (1, 2), get_rows),
+            table
+        )
+
+    def _draw(self, draw, version):
+        request = RequestFactory().get('/', {'draw': draw, 'table': version})
+        request.user = SimpleNamespace(pk=2)
+        view = ExperimentParticipantsDataView()
+        view.setup(request, experiment=1)
+
+        experiment = SimpleNamespace(use_timeslots=False,
+                                     participants_visible=True,
+                                     appointments=[])
+        with mock.patch.object(ExperimentParticipantsDataView,
+                               '_get_experiment',
+                               return_value=experiment) as get_experiment:
+            response = view.get(request)
+
+        self.assertEqual(json.loads(response.content)['draw'], draw)
+        return get_experiment.call_count
+
+    def test_first_draw_uses_the_table_of_the_page(self):
+        participants_table.table_cache.clear()
+        table = participants_table.get_table(self._table().experiment,
+                                             (1, 2), lambda: [])
+
+        self.assertEqual(self._draw(1, table.version), 0)
+        self.assertEqual(self._draw(2, 'other'), 0)
+        # Not the table the page was rendered with
+        self.assertEqual(self._draw(1, 'other'), 1)
+
+    def test_parse_int(self):
+        self.assertEqual(parse_int('3', 0), 3)
+        self.assertEqual(parse_int('x', 0), 0)
+        self.assertEqual(parse_int(None, -1), -1)
+
+
+class ParticipantsCsvTests(TestCase):
+
+    def _document(self):
+        participant = {
+            'id':            1,
+            'name':          'Anna',
+            'email':         'anna@uu.nl',
+            'language':      'nl',
+            'multilingual':  False,
+            'birth_date':    '2000-01-31',
+            'handedness':    'R',
+            'sex':           'F',
+            'social_status': 'S',
+        }
+        timeslots = [
+            {
+                'id':           i,
+                'datetime':     '2030-01-0{}T09:00:00+01:00'.format(i),
+                'max_places':   2,
+                'appointments': [{'id': i, 'participant': participant}],
+            }
+            for i in range(1, 4)
+        ]
+        return {
+            'id':                   1,
+            'name':                 'Experiment',
+            'participants_visible': True,
+            'timeslots':            timeslots,
+            'appointments':         [],
+        }
+
+    def _streamed(self, document, response=None):
+        data = json.dumps(document).encode()
+        chunks = [data[i:i + 16] for i in range(0, len(data), 16)]
+        return streaming.StreamedLeaderExperiment(
+            streaming.iter_object(
+                chunks,
+                streaming.StreamedLeaderExperiment.STREAMED_KEYS
+            ),
+            response
+        )
+
+    def test_streamed_csv_matches_loaded_csv(self):
+        document = self._document()
+
+        # As built by LeaderExperiment.client.get() in compact mode
+        loaded = SimpleNamespace(
+            participants_visible=document['participants_visible']
+        )
+        timeslots = compact_collection(CompactLeaderInlineTimeSlot)(
+            document['timeslots']
+        )
+        expected = list(iter_participants_csv(loaded, timeslots))
+
+        experiment = self._streamed(document)
+        self.assertTrue(experiment.has_leading_fields('participants_visible'))
+        lines = list(iter_participants_csv(experiment,
+                                           experiment.iter_timeslots()))
+
+        # The header, and one row per appointment
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines, expected)
+
+    def test_aborted_download_closes_response(self):
+        response = mock.Mock()
+        experiment = self._streamed(self._document(), response)
+        experiment.read_fields()
+
+        lines = iter_participants_csv(experiment, experiment.iter_timeslots())
+        next(lines)
+        next(lines)
+        response.close.assert_not_called()
+
+        # As done by Django when the client disconnects
+        lines.close()
+        response.close.assert_called_once_with()
+
+
+class AddTimeSlotsTests(TestCase):
+
+    datetimes = [datetime(2030, 1, 7, hour, tzinfo=timezone.utc)
+                 for hour in (9, 10, 11)]
+
+    @mock.patch('leader.utils.cache.invalidate_experiment')
+    @mock.patch('leader.utils.add_timeslot')
+    def test_one_by_one(self, add_timeslot, invalidate_experiment):
+        def add(data, invalidate=True):
+            if data['datetime'].hour == 11:
+                raise Exception('Backend error')
+            return data['datetime'].hour == 9
+
+        add_timeslot.side_effect = add
+
+        with self.assertLogs('leader.utils'):
+            created = utils.add_timeslots(None, 1, self.datetimes, 2)
+
+        self.assertEqual(created, 1)
+        self.assertEqual(add_timeslot.call_count, 3)
+        # Only invalidated once, after all were added
+        for call in add_timeslot.call_args_list:
+            self.assertFalse(call[1]['invalidate'])
+        invalidate_experiment.assert_called_once_with(1)
+
+    @override_settings(API_BULK_TIMESLOTS=True)
+    @mock.patch('leader.utils.AddTimeSlots')
+    def test_bulk(self, add_timeslots):
+        add_timeslots.return_value.put.return_value = SimpleNamespace(
+            success=True
+        )
+
+        self.assertEqual(utils.add_timeslots(None, 1, self.datetimes, 2), 3)
+
+        add_timeslots.return_value.put.return_value.success = False
+        self.assertEqual(utils.add_timeslots(None, 1, self.datetimes, 2), 0)
+
+
+class ExportTests(TestCase):
+
+    def test_stream_zip(self):
+        files = [
+            ('a.csv', ['a,b\r\n', '1,2\r\n']),
+            ('empty.csv', []),
+            ('b.txt', ['x' * 100000]),
+        ]
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(
+            export.stream_zip(files)
+        )))
+
+        self.assertEqual(archive.namelist(), ['a.csv', 'empty.csv', 'b.txt'])
+        self.assertEqual(archive.read('a.csv'), b'a,b\r\n1,2\r\n')
+        self.assertEqual(archive.read('empty.csv'), b'')
+        self.assertEqual(archive.read('b.txt'), b'x' * 100000)
+
+    def test_iter_completed(self):
+        running = []
+        max_running = []
+        lock = threading.Lock()
+
+        def func(arg):
+            with lock:
+                running.append(arg)
+                max_running.append(len(running))
+            # Gives the other calls a chance to start
+            threading.Event().wait(0.01)
+            with lock:
+                running.remove(arg)
+
+            if arg == 3:
+                raise ValueError(arg)
+            return arg * 10
+
+        results = list(export.iter_completed(None, func, range(6), 2))
+
+        self.assertEqual(
+            sorted((arg, result) for arg, result, _ in results),
+            [(0, 0), (1, 10), (2, 20), (3, None), (4, 40), (5, 50)]
+        )
+        exceptions = [e for arg, _, e in results if e is not None]
+        self.assertEqual(len(exceptions), 1)
+        self.assertIsInstance(exceptions[0], ValueError)
+        self.assertLessEqual(max(max_running), 2)
+
+
+@override_settings(ROOT_URLCONF='leader.tests')
+class BulkDownloadParticipantsViewTests(TestCase):
+
+    def _get(self, *pks):
+        request = RequestFactory().get('/', {'experiment': pks})
+        view = BulkDownloadParticipantsView()
+        view.setup(request)
+
+        return view.get(request)
+
+    @mock.patch('leader.export._fetch_experiment')
+    def test_download(self, fetch_experiment):
+        def fetch(pk):
+            if pk == 2:
+                # Not one of the leader's experiments
+                raise Exception('403')
+            return SimpleNamespace(id=pk, name='Experiment',
+                                   participants_visible=True, timeslots=[])
+
+        fetch_experiment.side_effect = fetch
+
+        response = self._get(1, 2, 1)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(
+            response.streaming_content
+        )))
+
+        self.assertEqual(archive.namelist(), ['1-Experiment.csv',
+                                              'errors.txt'])
+        self.assertEqual(archive.read('errors.txt'),
+                         b'Could not export experiment 2\n')
+        # Each selected experiment is fetched once
+        self.assertEqual(fetch_experiment.call_count, 2)
+
+    @mock.patch('leader.views.messages')
+    @mock.patch('leader.export._fetch_experiment')
+    def test_too_many_experiments(self, fetch_experiment, messages):
+        response = self._get(*range(export.MAX_EXPERIMENTS + 1))
+
+        self.assertEqual(response.url, '/leader/')
+        messages.error.assert_called_once()
+        fetch_experiment.assert_not_called()
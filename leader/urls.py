@@ -1,7 +1,9 @@
 from django.urls import path
 
-from .views import AddCommentView, DeleteAppointmentView, \
-    DownloadParticipantsCsvView, ExperimentParticipantsView, ExperimentsView, \
+from .views import AddCommentView, BulkDownloadParticipantsView, \
+    DeleteAppointmentView, \
+    DownloadParticipantsCsvView, ExperimentParticipantsDataView, \
+    ExperimentParticipantsView, ExperimentsView, \
     ProfileView, RemindParticipantsView, SwitchExperimentOpenView, \
     TimeSlotBulkDeleteView, \
     TimeSlotDeleteView, TimeSlotHomeView
@@ -10,6 +12,8 @@ app_name = 'leader'
 
 urlpatterns = [
     path('', ExperimentsView.as_view(), name='experiments'),
+    path('download/', BulkDownloadParticipantsView.as_view(),
+         name='bulk_download'),
     path('experiment/<int:experiment>/switch_open',
          SwitchExperimentOpenView.as_view(), name='experiment_switch_open'),
 
@@ -21,6 +25,10 @@ urlpatterns = [
          ExperimentParticipantsView.as_view(), name='participants',
          ),
 
+    path('experiment/<int:experiment>/participants/data/',
+         ExperimentParticipantsDataView.as_view(), name='participants_data',
+         ),
+
     path('experiment/<int:experiment>/participants/send_reminders/',
          RemindParticipantsView.as_view(), name='send_reminders',
          ),
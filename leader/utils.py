@@ -1,11 +1,25 @@
+import csv
+import logging
 from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
 
+from django.conf import settings
+from django.utils.translation import gettext as _
 from pytz import timezone
 
+from api import cache, prefetch
 from api.resources import TimeSlot
-from api.resources.timeslot_resources import DeleteTimeSlots, DeleteAppointment
+from api.resources.timeslot_resources import AddTimeSlots, DeleteTimeSlots, \
+    DeleteAppointment, NewTimeSlots
 from cdh.rest.client import StringCollection
 
+logger = logging.getLogger(__name__)
+
+# The pool timeslots are added on if they can't be added in bulk, shared by
+# all users
+timeslot_pool = prefetch.RequestPool('leader-timeslots',
+                                     'LEADER_TIMESLOT_WORKERS', 4)
+
 _TIMESLOT_KEY_PREFIX = len("timeslot_")
 _TIMESLOT_KEY_POSTFIX = len("[]")
 
@@ -25,7 +39,7 @@ def now() -> datetime:
                                 tzinfo=None)
 
 
-def add_timeslot(data: dict) -> bool:
+def add_timeslot(data: dict, invalidate: bool = True) -> bool:
     """Does a put request with a newly created TimeSlot resources. Returns the
     API's indication if it worked.
     """
@@ -34,11 +48,58 @@ def add_timeslot(data: dict) -> bool:
     time_slot.datetime = data.get('datetime')
     time_slot.max_places = data.get('max_places')
 
-    response = time_slot.put()
+    response = time_slot.put(invalidate=invalidate)
 
     return response.success
 
 
+def add_timeslots(request, experiment_pk, datetimes: List[datetime],
+                  max_places: int) -> int:
+    """Creates a timeslot for every given datetime. Returns the number of
+    timeslots the API created.
+
+    If API_BULK_TIMESLOTS is enabled (for backends that support bulk
+    creation), they're created in a single request. Otherwise, they're added
+    one by one, with at most LEADER_TIMESLOT_WORKERS requests at once (for
+    all users together). The experiment is invalidated once afterwards.
+    """
+    if not getattr(settings, 'API_BULK_TIMESLOTS', False):
+        futures = [
+            timeslot_pool.submit(request, add_timeslot, {
+                'experiment': experiment_pk,
+                'datetime':   dt,
+                'max_places': max_places,
+            }, invalidate=False)
+            for dt in datetimes
+        ]
+
+        try:
+            created = 0
+            for future in futures:
+                try:
+                    created += future.result()
+                except Exception:
+                    logger.exception('Could not add a timeslot to '
+                                     'experiment %s', experiment_pk)
+            return created
+        finally:
+            cache.invalidate_experiment(experiment_pk)
+
+    order = AddTimeSlots()
+    order.experiment = experiment_pk
+    order.timeslots = NewTimeSlots([
+        {
+            'datetime':   dt.isoformat(),
+            'max_places': max_places,
+        }
+        for dt in datetimes
+    ])
+
+    response = order.put()
+
+    return len(datetimes) if response.success else 0
+
+
 def delete_timeslot(experiment_pk, timeslot_pk) -> bool:
     to_delete = [
         "{}_1".format(timeslot_pk)
@@ -82,3 +143,89 @@ def unsubscribe_participant(experiment_pk, appointment_pk):
     response = delete_order.put()
 
     return response.success
+
+
+class _Echo:
+    """A file-like object that returns what's written to it, so csv.writer
+    can be used to generate lines one by one"""
+
+    def write(self, value):
+        return value
+
+
+def get_participants_csv_texts() -> dict:
+    """Returns the translated texts of the participants CSV, see
+    iter_participants_csv"""
+    return {
+        'header': [
+            _('participants:datetime'),
+            _('timeslots:day'),
+            _('participants:place'),
+            _('participants:name'),
+            _('participants:email'),
+            _('participants:phone_number'),
+            _('participants:birth_date'),
+            _('participants:language'),
+            _('participants:multilingual'),
+            _('participants:handedness'),
+            _('participants:sex'),
+            _('participants:social_status'),
+        ],
+        'hidden': _('globals:hidden'),
+    }
+
+
+def iter_participants_csv(experiment, timeslots: Iterable,
+                          texts: Optional[dict] = None) -> Iterator[str]:
+    """Returns an iterator over the lines of the participants CSV of an
+    experiment, with the rows of the given timeslots.
+
+    The lines are usually generated after the view has returned, so the
+    texts (see get_participants_csv_texts) have to be translated while
+    handling the request; if they're not given, they're translated right
+    away. participants_visible is read right away as well.
+    """
+    if texts is None:
+        texts = get_participants_csv_texts()
+    header = texts['header']
+    hidden = texts['hidden']
+    participants_visible = experiment.participants_visible
+    writer = csv.writer(_Echo())
+
+    def generate():
+        try:
+            yield writer.writerow(header)
+
+            for timeslot in timeslots:
+                for n, appointment in timeslot.takes_places_tuple:
+                    participant_name = hidden
+                    participant_email = hidden
+                    participant_language = hidden
+
+                    if participants_visible:
+                        participant_name = appointment.participant.name
+                        participant_email = appointment.participant.email
+                        participant_language = appointment.participant.language
+
+                    yield writer.writerow([
+                        timeslot.datetime.strftime('%Y-%m-%d %H:%M'),
+                        timeslot.datetime.strftime('%l'),
+                        n,
+                        participant_name,
+                        participant_email,
+                        participant_language,
+                        appointment.participant.birth_date.isoformat(),
+                        appointment.participant.language,
+                        appointment.participant.multilingual,
+                        appointment.participant.handedness,
+                        appointment.participant.sex,
+                        appointment.participant.get_social_status_display(),
+                    ])
+        finally:
+            # A streamed experiment's response has to be closed, also if the
+            # download is aborted before all rows are written
+            close = getattr(timeslots, 'close', None)
+            if close is not None:
+                close()
+
+    return generate()
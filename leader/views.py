@@ -1,28 +1,34 @@
-import csv
-
 from braces import views as braces
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
 from django.core.exceptions import PermissionDenied, SuspiciousOperation, \
     ObjectDoesNotExist
-from django.http import HttpResponse
+from django.http import HttpResponseRedirect, JsonResponse, \
+    StreamingHttpResponse
 from django.urls import reverse_lazy as reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from django.views import generic
 
+from api import cache, streaming
+from api.fields import filter_collection
 from api.resources import Leader, LeaderExperiments, \
-    SwitchExperimentOpen
+    SwitchExperimentOpen, timeslot_window
 from api.resources.comment_resources import Comment
 from api.resources.experiment_resources import LeaderExperiment, \
     ReminderParticipants
 from cdh.rest.exceptions import ApiError
-from leader.forms import AddCommentForm, ChangeProfileForm, TimeSlotForm
+from leader import export, participants_table
+from leader.forms import AddCommentForm, ChangeProfileForm, TimeSlotForm, \
+    TimeSlotWindowForm
 from leader.models import LeaderPhoto
-from leader.utils import add_timeslot, delete_timeslot, delete_timeslots, now, \
-    unsubscribe_participant
-from main.mixins import ExperimentObjectMixin
+from leader.utils import add_timeslot, add_timeslots, delete_timeslot, \
+    delete_timeslots, get_participants_csv_texts, iter_participants_csv, \
+    now, unsubscribe_participant
+from main.mixins import ExperimentObjectMixin, PrefetchMixin
 from cdh.core.views import RedirectActionView
 from cdh.core.views.mixins import RedirectSuccessMessageMixin
 from cdh.rest.client import StringCollection
@@ -56,10 +62,20 @@ class ExperimentParticipantsView(braces.LoginRequiredMixin,
             **kwargs)
 
         context['experiment'] = self.experiment
-        context['appointments'] = self._get_appointments()
+        # Built here, as the experiment was fetched for the page anyway; the
+        # first draw of the table uses it, see leader.participants_table
+        context['table_version'] = participants_table.get_table(
+            self.experiment,
+            self.get_table_key(),
+            self._get_appointments
+        ).version
 
         return context
 
+    def get_table_key(self) -> tuple:
+        return (self.kwargs.get(self.experiment_kwargs_name),
+                self.request.user.pk)
+
     def _get_appointments(self):
         output = []
         if self.experiment.use_timeslots:
@@ -81,69 +97,134 @@ class ExperimentParticipantsView(braces.LoginRequiredMixin,
         return output
 
 
+class ExperimentParticipantsDataView(ExperimentParticipantsView):
+    """Returns a page of the participants table as JSON, for DataTables'
+    server-side processing. See leader.participants_table"""
+
+    # The experiment is only fetched if the table needs it, see get()
+    prefetch_methods = []
+
+    def get(self, request, *args, **kwargs):
+        draw = participants_table.parse_int(request.GET.get('draw'), 0)
+        key = self.get_table_key()
+
+        # The first draw after a page load can only use the table the page
+        # was rendered with; otherwise it checks if the experiment changed,
+        # see leader.participants_table
+        table = participants_table.get_cached_table(key)
+        if table is None or (draw <= 1 and
+                             table.version != request.GET.get('table')):
+            table = participants_table.get_table(self.experiment, key,
+                                                 self._get_appointments)
+
+        query = participants_table.parse_params(request.GET)
+        n_filtered, indices = table.query(**query)
+
+        return JsonResponse({
+            'draw':            draw,
+            'recordsTotal':    len(table.rows),
+            'recordsFiltered': n_filtered,
+            'data':            [table.render_row(i) for i in indices],
+        })
+
+
 class DownloadParticipantsCsvView(braces.LoginRequiredMixin,
                                   braces.GroupRequiredMixin,
                                   generic.View):
     group_required = [settings.GROUPS_LEADER]
-    experiment_resource = LeaderExperiment
+
+    # The fields needed before the rows are written
+    leading_fields = ('name', 'participants_visible')
 
     def get(self, request, **kwargs):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = \
-            'attachment; filename="{}.csv"'.format(self.experiment.name)
-
-        writer = csv.writer(response)
-        writer.writerow([
-            _('participants:datetime'),
-            _('timeslots:day'),
-            _('participants:place'),
-            _('participants:name'),
-            _('participants:email'),
-            _('participants:phone_number'),
-            _('participants:birth_date'),
-            _('participants:language'),
-            _('participants:multilingual'),
-            _('participants:handedness'),
-            _('participants:sex'),
-            _('participants:social_status'),
-        ])
+        experiment, timeslots = self._get_experiment()
 
-        for timeslot in self.experiment.timeslots:
-            for n, appointment in timeslot.takes_places_tuple:
-                participant_name = _('globals:hidden')
-                participant_email = _('globals:hidden')
-                participant_language = _('globals:hidden')
-
-                if self.experiment.participants_visible:
-                    participant_name = appointment.participant.name
-                    participant_email = appointment.participant.email
-                    participant_language = appointment.participant.language
-
-                writer.writerow([
-                    timeslot.datetime.strftime('%Y-%m-%d %H:%M'),
-                    timeslot.datetime.strftime('%l'),
-                    n,
-                    participant_name,
-                    participant_email,
-                    participant_language,
-                    appointment.participant.birth_date.isoformat(),
-                    appointment.participant.language,
-                    appointment.participant.multilingual,
-                    appointment.participant.handedness,
-                    appointment.participant.sex,
-                    appointment.participant.get_social_status_display(),
-                ])
+        response = StreamingHttpResponse(
+            iter_participants_csv(experiment, timeslots),
+            content_type='text/csv',
+        )
+        response['Content-Disposition'] = \
+            'attachment; filename="{}.csv"'.format(experiment.name)
 
         return response
 
-    @cached_property
-    def experiment(self):
+    def _get_experiment(self):
+        """Returns the experiment and an iterable over its timeslots.
+
+        The experiment is streamed, so the rows are written as they're read
+        from the backend: the first bytes are sent right away, and the full
+        CSV is never held in memory. That only works if the backend sends
+        the fields the CSV needs before the timeslots; otherwise the
+        experiment is loaded as a whole, as streaming it would mean
+        buffering all timeslots anyway.
+        """
+        pk = self.kwargs.get('experiment')
         try:
-            pk = self.kwargs.get('experiment')
             # download=True makes sure the API logs this as a download event
-            return self.experiment_resource.client.get(pk=pk, download=True)
+            experiment = streaming.stream_leader_experiment(pk=pk,
+                                                            download=True)
+            try:
+                streamable = experiment.has_leading_fields(
+                    *self.leading_fields
+                )
+            except Exception:
+                experiment.close()
+                raise
+
+            if streamable:
+                # The CSV closes the response once it's written (or aborted)
+                return experiment, experiment.iter_timeslots()
+
+            experiment.close()
+            # The download was logged by the streamed request already
+            experiment = LeaderExperiment.client.get(pk=pk)
+            return experiment, experiment.timeslots
         except Exception as e:
-            raise ObjectDoesNotExist
+            raise ObjectDoesNotExist from e
+
+
+class BulkDownloadParticipantsView(braces.LoginRequiredMixin,
+                                   braces.GroupRequiredMixin,
+                                   generic.View):
+    """Downloads the participants of the selected experiments, as a ZIP with
+    one CSV per experiment. See leader.export"""
+    group_required = [settings.GROUPS_LEADER]
+
+    def get(self, request, **kwargs):
+        try:
+            pks = [int(pk) for pk in request.GET.getlist('experiment')]
+        except ValueError:
+            raise SuspiciousOperation
+
+        if not pks:
+            messages.error(request, _('experiments:message:none_selected'))
+            return HttpResponseRedirect(reverse('leader:experiments'))
+
+        # Each experiment is only exported once. Leaders can only export
+        # their own experiments; the backend refuses the others, which are
+        # then listed in the export's errors.txt
+        pks = list(dict.fromkeys(pks))
+        if len(pks) > export.MAX_EXPERIMENTS:
+            messages.error(
+                request,
+                _('experiments:message:too_many_selected') % {
+                    'max': export.MAX_EXPERIMENTS,
+                }
+            )
+            return HttpResponseRedirect(reverse('leader:experiments'))
+
+        # Translated now, as the CSVs are written after this view returns
+        texts = get_participants_csv_texts()
+        response = StreamingHttpResponse(
+            export.stream_zip(
+                export.iter_experiment_csvs(request, pks, texts)
+            ),
+            content_type='application/zip',
+        )
+        response['Content-Disposition'] = \
+            'attachment; filename="participants.zip"'
+
+        return response
 
 
 class SwitchExperimentOpenView(braces.RecentLoginRequiredMixin,
@@ -170,6 +251,8 @@ class SwitchExperimentOpenView(braces.RecentLoginRequiredMixin,
             else:
                 self.success_message = _('experiment:message:fail')
 
+            cache.invalidate_experiment(experiment)
+
         except ApiError as e:
             if e.status_code == 403:
                 raise PermissionDenied
@@ -204,19 +287,71 @@ class TimeSlotHomeView(braces.LoginRequiredMixin,
         """Only save the form, but stop there."""
         data = form.cleaned_data
 
-        success = add_timeslot(data)
+        if data['recurring']:
+            datetimes = form.get_datetimes()
+            created = add_timeslots(
+                self.request,
+                data['experiment'],
+                datetimes,
+                data['max_places'],
+            )
+            success = created == len(datetimes)
+        else:
+            created = None
+            success = add_timeslot(data)
 
-        if not success:
+        if success:
+            messages.success(self.request, _('timeslots:message:added'))
+        elif created:
+            # Some were added; tell the user which part, so they don't add
+            # those again
+            messages.error(
+                self.request,
+                _('timeslots:message:partially_added') % {
+                    'n':     created,
+                    'total': len(datetimes),
+                }
+            )
+        else:
             messages.error(self.request, "There has been a problem when "
                                          "adding new slot(s). Please try again "
                                          "later.")
-        else:
-            messages.success(self.request, _('timeslots:message:added'))
 
         # Invalidate the self.experiment cache, causing a new fetch from the
         # backend. Otherwise the new slot won't appear until a refresh
         del self.experiment
 
+    def get_experiment_kwargs(self) -> dict:
+        kwargs = super(TimeSlotHomeView, self).get_experiment_kwargs()
+        kwargs.update(timeslot_window(*self.window))
+
+        return kwargs
+
+    @cached_property
+    def window_form(self):
+        return TimeSlotWindowForm(self.request.GET or None)
+
+    @cached_property
+    def window(self):
+        return self.window_form.get_window(timezone.now())
+
+    def get_timeslots(self):
+        """Returns the timeslots in the selected window. The backend should
+        have left out the others already, but not every backend supports
+        that."""
+        start, end = self.window
+        if start is None and end is None:
+            return self.experiment.timeslots
+
+        def in_window(dt):
+            return (start is None or dt >= start) and (end is None or dt < end)
+
+        return filter_collection(
+            self.experiment.timeslots,
+            lambda timeslot: in_window(timeslot.datetime),
+            lambda raw: in_window(parse_datetime(raw['datetime'])),
+        )
+
     def get_initial(self):
         initial = super(TimeSlotHomeView, self).get_initial()
 
@@ -231,7 +366,7 @@ class TimeSlotHomeView(braces.LoginRequiredMixin,
         otherwise we default to now().
         """
         if self.request.POST:
-            return self.request.POST['datetime']
+            return self.request.POST.get('datetime')
 
         return str(now())[:-3]  # Remove the seconds
 
@@ -248,6 +383,8 @@ class TimeSlotHomeView(braces.LoginRequiredMixin,
         context = super(TimeSlotHomeView, self).get_context_data(**kwargs)
 
         context['experiment'] = self.experiment
+        context['timeslots'] = self.get_timeslots()
+        context['window_form'] = self.window_form
 
         return context
 
@@ -353,6 +490,7 @@ class AddCommentView(braces.RecentLoginRequiredMixin,
 class ProfileView(braces.RecentLoginRequiredMixin,
                   braces.GroupRequiredMixin,
                   SuccessMessageMixin,
+                  PrefetchMixin,
                   generic.FormView):
     template_name = 'leader/profile.html'
     form_class = ChangeProfileForm
@@ -360,9 +498,17 @@ class ProfileView(braces.RecentLoginRequiredMixin,
     success_message = _('profile:message:updated')
     group_required = [settings.GROUPS_LEADER]
 
+    def get_prefetches(self) -> dict:
+        prefetches = super(ProfileView, self).get_prefetches()
+
+        if self.request.user.is_authenticated:
+            prefetches['leader'] = Leader.client.get
+
+        return prefetches
+
     @cached_property
     def leader(self):
-        return Leader.client.get()
+        return self.get_prefetched('leader', Leader.client.get)
 
     def get_initial(self):
         photo, created = LeaderPhoto.objects.get_or_create(
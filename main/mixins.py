@@ -1,7 +1,10 @@
+import asyncio
+
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils.functional import cached_property
 from django.utils.translation import activate as activate_language
 
+from api import async_client, cache, prefetch
 from api.resources import Experiment
 
 
@@ -19,14 +22,16 @@ class OverrideLanguageMixin:
 
     language_override = None
 
-    def dispatch(self, request, *args, **kwargs):
+    def setup(self, request, *args, **kwargs):
+        # This is done in setup instead of dispatch, so that anything fetched
+        # while dispatching (see PrefetchMixin) is fetched in the right
+        # language
         override = self.get_language_override(request)
         if override:
 
             activate_language(self.language_override)
 
-        return super(OverrideLanguageMixin, self).dispatch(request, *args,
-                                                           **kwargs)
+        super(OverrideLanguageMixin, self).setup(request, *args, **kwargs)
 
     def get_language_override(self, request):
         return self.language_override
@@ -41,7 +46,76 @@ class OverrideLanguageMixin:
         return context
 
 
-class ExperimentObjectMixin:
+class PrefetchMixin:
+    """This mixin allows a view to declare the backend resources it needs up
+    front, so they can be fetched concurrently instead of one after another.
+
+    Override get_prefetches to return a dict of name -> callable. For the
+    methods in prefetch_methods, all callables are submitted to the prefetch
+    pool when the request is dispatched (if there are at least two of them). As that happens in this mixin's
+    dispatch, the access checks of the mixins before it (like
+    LoginRequiredMixin) have passed by then. Views can also call
+    start_prefetches themselves, once they know the results are needed.
+
+    Results can be retrieved with get_prefetched(name). Exceptions raised by
+    a callable are re-raised there.
+
+    A prefetched result can only be retrieved once, so it is best stored in
+    a cached_property. Deleting that property will then cause a fresh fetch.
+    """
+
+    # Other methods (like the POST of an action) usually don't need
+    # everything a page displays
+    prefetch_methods = ['get', 'head']
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() in self.prefetch_methods:
+            self.start_prefetches()
+
+        return super(PrefetchMixin, self).dispatch(request, *args, **kwargs)
+
+    def start_prefetches(self) -> None:
+        """Submits the prefetches to the pool, unless that was done
+        already. A single prefetch isn't submitted, as there's nothing to
+        fetch alongside it; get_prefetched will use its fallback."""
+        if hasattr(self, '_prefetched'):
+            return
+
+        prefetches = self.get_prefetches()
+        if len(prefetches) < 2:
+            self._prefetched = {}
+            return
+
+        self._prefetched = prefetch.prefetch(self.request, prefetches)
+
+    def get_prefetches(self) -> dict:
+        return {}
+
+    def get_prefetched(self, name, fallback=None):
+        """Returns the result of the named prefetch. If it was not
+        prefetched, the result of fallback() is returned instead."""
+        future = getattr(self, '_prefetched', {}).pop(name, None)
+
+        if future is None:
+            return fallback() if fallback else None
+
+        return future.result()
+
+    async def aget_prefetched(self, name, fallback=None):
+        """Async version of get_prefetched; the fallback is run on the async
+        client's pool (see api.async_client)"""
+        future = getattr(self, '_prefetched', {}).pop(name, None)
+
+        if future is None:
+            if fallback is None:
+                return None
+
+            return await async_client.run(self.request, fallback)
+
+        return await asyncio.wrap_future(future)
+
+
+class ExperimentObjectMixin(PrefetchMixin):
     """
     This mixin adds a new property to a view, which contains an experiment
     object.
@@ -53,16 +127,43 @@ class ExperimentObjectMixin:
     One can set the kwargs variable name with the 'experiment_kwargs_name'
     class variable, which defaults to 'experiment'. (Not pk, as in those
     cases the default views provides the self.object variable).
+
+    Experiments are retrieved through the api.cache module, so cacheable
+    resources (like the public Experiment) will be served from the cache if
+    possible.
+
+    The experiment is prefetched (see PrefetchMixin), so views can add other
+    resources to get_prefetches to fetch them alongside the experiment.
+
+    Extra kwargs for the client call (like query parameters) can be returned
+    by get_experiment_kwargs.
     """
     experiment_kwargs_name = 'experiment'
 
     experiment_resource = Experiment
 
+    def get_prefetches(self) -> dict:
+        prefetches = super(ExperimentObjectMixin, self).get_prefetches()
+        # Unless a view already needed it before dispatching
+        if 'experiment' not in self.__dict__:
+            prefetches['experiment'] = self._get_experiment
+
+        return prefetches
+
     @cached_property
     def experiment(self):
+        return self.get_prefetched('experiment', self._get_experiment)
+
+    def get_experiment_kwargs(self) -> dict:
+        return {}
+
+    def _get_experiment(self):
         try:
             pk = self.kwargs.get(self.experiment_kwargs_name)
-            return self.experiment_resource.client.get(pk=pk)
+            return cache.get_resource(
+                self.experiment_resource,
+                pk=pk,
+                **self.get_experiment_kwargs()
+            )
         except Exception as e:
-            print(e)
-            raise ObjectDoesNotExist
+            raise ObjectDoesNotExist from e
@@ -0,0 +1,116 @@
+"""
+Pre-serialized snapshots of responses that are the same for every visitor.
+
+A ResponseSnapshot keeps the body of a response, compressed with
+gzip (and brotli, if it's installed) up front, and an ETag. It answers a
+request with the best encoding the client accepts, or with a 304 if the
+client already has it. Serving a snapshot is just a memory lookup: no
+rendering, serialization or compression.
+
+See HomeApiView for how snapshots are kept up to date.
+"""
+import gzip
+import hashlib
+import threading
+from typing import Any, Hashable, Optional
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ResponseSnapshot:
+    """The body of a response, in all supported encodings. `source` is the
+    data the body was built from; it can be used to check whether the
+    snapshot is still up to date."""
+
+    def __init__(self, content: bytes, content_type: str,
+                 source: Any = None):
+        digest = hashlib.sha1(content).hexdigest()
+
+        self.source = source
+        self.content_type = content_type
+
+        # Every encoding has its own ETag, as their bodies differ
+        self.variants = {
+            None:   (content, '"{}"'.format(digest)),
+            'gzip': (gzip.compress(content, mtime=0),
+                     '"{}-gzip"'.format(digest)),
+        }
+        if brotli:
+            self.variants['br'] = (brotli.compress(content),
+                                   '"{}-br"'.format(digest))
+
+        self.etags = {etag for _, etag in self.variants.values()}
+
+    def _get_encoding(self, request) -> Optional[str]:
+        accepted = {
+            encoding.split(';')[0].strip().lower()
+            for encoding in request.META.get('HTTP_ACCEPT_ENCODING',
+                                             '').split(',')
+        }
+
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.variants:
+                return encoding
+
+        return None
+
+    def respond(self, request) -> HttpResponse:
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            tags = {
+                tag[2:] if tag.startswith('W/') else tag
+                for tag in parse_etags(if_none_match)
+            }
+            if '*' in tags or tags & self.etags:
+                # The client has one of our variants, which are all the same
+                # content. Send the ETag of the one it asks for.
+                response = HttpResponseNotModified()
+                response['ETag'] = \
+                    self.variants[self._get_encoding(request)][1]
+                patch_vary_headers(response, ['Accept-Encoding'])
+                return response
+
+        encoding = self._get_encoding(request)
+        content, etag = self.variants[encoding]
+
+        response = HttpResponse(content, content_type=self.content_type)
+        response['ETag'] = etag
+        # Clients may store it, but should check if it's still up to date
+        response['Cache-Control'] = 'no-cache'
+        if encoding:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ['Accept-Encoding'])
+
+        return response
+
+
+class SnapshotStore:
+    """A thread-safe store for snapshots, holding at most max_size of them.
+    When it's full, it's cleared, so unusual requests can't make it grow
+    without bounds."""
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[ResponseSnapshot]:
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key: Hashable, snapshot: ResponseSnapshot) -> None:
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.max_size:
+                self._data.clear()
+            self._data[key] = snapshot
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
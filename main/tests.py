@@ -1,3 +1,141 @@
-from django.test import TestCase
+import gzip
+import json
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from braces import views as braces
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.views import generic
+
+from main.mixins import PrefetchMixin
+from main.snapshots import ResponseSnapshot
+from main.views import HomeApiView
+
+
+class ResponseSnapshotTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.snapshot = ResponseSnapshot(b'{"items": []}',
+                                         'application/json')
+
+    def test_encodings(self):
+        response = self.snapshot.respond(
+            self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), b'{"items": []}')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        response = self.snapshot.respond(self.factory.get('/'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, b'{"items": []}')
+
+    def test_not_modified(self):
+        etag = self.snapshot.respond(self.factory.get('/'))['ETag']
+
+        response = self.snapshot.respond(
+            self.factory.get('/', HTTP_IF_NONE_MATCH=etag)
+        )
+        self.assertEqual(response.status_code, 304)
+
+        response = self.snapshot.respond(
+            self.factory.get('/', HTTP_IF_NONE_MATCH='"other"')
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class HomeApiViewTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        HomeApiView.snapshots.clear()
+
+        experiment = mock.Mock()
+        experiment.to_api.return_value = {'id': 1, 'name': 'Experiment'}
+        self.experiments = [experiment]
+
+    def tearDown(self):
+        HomeApiView.snapshots.clear()
+
+    def _get(self, **headers):
+        with mock.patch('main.views.cache.get_resource',
+                        return_value=self.experiments):
+            return HomeApiView.as_view()(self.factory.get('/', **headers))
+
+    def test_snapshot(self):
+        # Even if the first client asks for HTML, the snapshot is JSON
+        response = self._get(HTTP_ACCEPT='text/html')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content)['items'],
+                         [{'id': 1, 'name': 'Experiment', 'pk': 1}])
+
+        # Unchanged experiments are served from the snapshot
+        self.experiments[0].to_api.reset_mock()
+        not_modified = self._get(HTTP_IF_NONE_MATCH=response['ETag'])
+
+        self.assertEqual(not_modified.status_code, 304)
+        self.experiments[0].to_api.assert_not_called()
+
+    @override_settings(HOME_API_SNAPSHOT=False)
+    def test_without_snapshot(self):
+        response = self._get()
+        response.render()
+
+        self.assertEqual(json.loads(response.content)['items'][0]['pk'], 1)
+
+
+class PrefetchView(braces.LoginRequiredMixin, PrefetchMixin, generic.View):
+    raise_exception = True
+
+    prefetches = ('leader', 'admin')
+
+    def get_prefetches(self) -> dict:
+        return {name: lambda name=name: name for name in self.prefetches}
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(self.get_prefetched('leader', lambda: 'fallback'))
+
+    def post(self, request, *args, **kwargs):
+        return HttpResponse()
+
+
+class PrefetchMixinTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _request(self, method, authenticated):
+        request = getattr(self.factory, method)('/')
+        request.user = SimpleNamespace(is_authenticated=True) \
+            if authenticated else AnonymousUser()
+        return request
+
+    @mock.patch('main.mixins.prefetch.prefetch', return_value={})
+    def test_only_prefetched_after_access_checks(self, prefetch):
+        with self.assertRaises(PermissionDenied):
+            PrefetchView.as_view()(self._request('get', False))
+        prefetch.assert_not_called()
+
+        PrefetchView.as_view()(self._request('post', True))
+        prefetch.assert_not_called()
+
+        PrefetchView.as_view()(self._request('get', True))
+        prefetch.assert_called_once()
+
+    def test_prefetched_result(self):
+        response = PrefetchView.as_view()(self._request('get', True))
+        self.assertEqual(response.content, b'leader')
+
+    @mock.patch('main.mixins.prefetch.prefetch', return_value={})
+    def test_single_prefetch_is_not_submitted(self, prefetch):
+        view = PrefetchView.as_view(prefetches=('leader',))
+        response = view(self._request('get', True))
+
+        prefetch.assert_not_called()
+        self.assertEqual(response.content, b'fallback')
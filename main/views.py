@@ -5,12 +5,18 @@ from django.contrib.messages.views import SuccessMessageMixin
 from django.http import HttpResponseRedirect
 from django.shortcuts import render
 from django.urls import reverse_lazy as reverse
+from django.utils.functional import cached_property
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.utils.translation import gettext_lazy as _
 from django.views import generic
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 
-from api.resources import Admin, OpenExperiments, ValidateToken
+from api import cache
+from api.resources import Admin, ExperimentSummary, OpenExperimentSummaries, \
+    ValidateToken, sparse_fieldset
 from main.mixins import OverrideLanguageMixin
+from main.snapshots import ResponseSnapshot, SnapshotStore
 from cdh.vue.rest import FancyListApiView
 from .forms import ChangePasswordForm, CustomAuthenticationFrom, EnterTokenForm, \
     ForgotPasswordForm, \
@@ -29,7 +35,7 @@ class HomeView(OverrideLanguageMixin, generic.TemplateView):
     def get_context_data(self, **kwargs):
         context = super(HomeView, self).get_context_data(**kwargs)
 
-        admin = Admin.client.get()
+        admin = Admin.get_cached()
 
         context['admin'] = admin
         context['admin_email'] = settings.EMAIL_FROM
@@ -45,7 +51,7 @@ class PrivacyView(OverrideLanguageMixin, generic.TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        admin = Admin.client.get()
+        admin = Admin.get_cached()
 
         context['admin'] = admin
         context['admin_email'] = settings.EMAIL_FROM
@@ -60,19 +66,55 @@ class HomeApiView(OverrideLanguageMixin, FancyListApiView):
     default_items_per_page = 9999999
     show_controls = False
 
+    # The rendered responses, per query string. See get()
+    snapshots = SnapshotStore()
+
+    def get(self, request, *args, **kwargs):
+        """The response is the same for every visitor, so (if
+        HOME_API_SNAPSHOT is enabled) it's rendered once and served from a
+        snapshot after that. The snapshot is rendered again when the
+        experiments change; as they're cached (see api.cache), that's at
+        most once every API_CACHE_TTL seconds.
+        """
+        if not getattr(settings, 'HOME_API_SNAPSHOT', True):
+            return super(HomeApiView, self).get(request, *args, **kwargs)
+
+        key = request.GET.urlencode()
+        snapshot = self.snapshots.get(key)
+
+        if snapshot is None or snapshot.source is not self.experiments:
+            response = super(HomeApiView, self).get(request, *args, **kwargs)
+            if response.status_code != 200 or \
+                    not isinstance(response, Response):
+                return response
+
+            # DRF only renders the response after the handler, in the format
+            # the client accepts. The snapshot is served to every client, so
+            # it's always rendered as JSON.
+            snapshot = ResponseSnapshot(
+                JSONRenderer().render(response.data),
+                'application/json',
+                source=self.experiments,
+            )
+            self.snapshots.set(key, snapshot)
+
+        return snapshot.respond(request)
+
+    @cached_property
+    def experiments(self):
+        # We only request (and deserialize) the fields the Vue app needs
+        return cache.get_resource(
+            OpenExperimentSummaries,
+            **sparse_fieldset(ExperimentSummary.sparse_fields)
+        )
+
     def get_items(self):
         out = []
-        experiments = OpenExperiments.client.get()
 
-        for experiment in experiments:
+        for experiment in self.experiments:
             exp_data = experiment.to_api()
             # the Vue app expects the id in a PK field
             exp_data['pk'] = exp_data['id']
-            del exp_data['leader']
-            del exp_data['additional_leaders']
-            del exp_data['excluded_experiments']
-            del exp_data['defaultcriteria']
-            del exp_data['specific_criteria']
 
             out.append(exp_data)
 
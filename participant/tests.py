@@ -1,3 +1,98 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import include, path
+
+from participant.views.async_views import AsyncCancelLandingView, \
+    AsyncRegisterView
+from participant.views.experiment_views import RegisterView
+
+urlpatterns = [
+    path('', include('participant.urls')),
+]
+
+
+def _experiment(**kwargs):
+    defaults = {
+        'open':          True,
+        'use_timeslots': False,
+        'is_leader':     lambda user: False,
+    }
+    defaults.update(kwargs)
+    return SimpleNamespace(**defaults)
+
+
+def _participant():
+    return SimpleNamespace(is_authenticated=True, is_participant=True)
+
+
+@override_settings(ROOT_URLCONF='participant.tests')
+class RegisterViewTests(SimpleTestCase):
+    """Both variants of the register view should redirect the same way"""
+    view_classes = (RegisterView, AsyncRegisterView)
+
+    def _dispatch(self, view_class, user, **experiment):
+        request = RequestFactory().get('/register/1/')
+        request.user = user
+
+        view = view_class()
+        view.setup(request, experiment=1)
+
+        if view_class.view_is_async:
+            async def get(*args, **kwargs):
+                return HttpResponse('form')
+        else:
+            def get(*args, **kwargs):
+                return HttpResponse('form')
+
+        with mock.patch.object(view_class, '_get_experiment', **experiment), \
+                mock.patch.object(view_class, 'get', get):
+            dispatch = view.dispatch
+            if view_class.view_is_async:
+                dispatch = async_to_sync(dispatch)
+
+            return dispatch(request, experiment=1)
+
+    def test_missing_experiment(self):
+        for view_class in self.view_classes:
+            response = self._dispatch(view_class, AnonymousUser(),
+                                      side_effect=ObjectDoesNotExist)
+            self.assertEqual(response.url, '/closed/', view_class)
+
+    def test_closed_experiment(self):
+        for view_class in self.view_classes:
+            response = self._dispatch(view_class, AnonymousUser(),
+                                      return_value=_experiment(open=False))
+            self.assertEqual(response.url, '/closed/', view_class)
+
+    def test_participant_is_redirected(self):
+        for view_class in self.view_classes:
+            response = self._dispatch(view_class, _participant(),
+                                      return_value=_experiment())
+            self.assertEqual(response.url, '/secure/register/1/',
+                             view_class)
+
+    def test_form_is_shown(self):
+        for view_class in self.view_classes:
+            response = self._dispatch(view_class, AnonymousUser(),
+                                      return_value=_experiment())
+            self.assertEqual(response.content, b'form', view_class)
+
+
+@override_settings(ROOT_URLCONF='participant.tests')
+class AsyncCancelLandingViewTests(SimpleTestCase):
+
+    def test_participant_is_redirected(self):
+        request = RequestFactory().get('/cancel/')
+        request.user = _participant()
+
+        view = AsyncCancelLandingView()
+        view.setup(request)
+        response = async_to_sync(view.get)(request)
+
+        self.assertEqual(response.url, '/appointments/')
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import include, path
 
 from participant.views import AccountCreatedView, AuthenticatedRegisterView, \
@@ -5,6 +6,14 @@ from participant.views import AccountCreatedView, AuthenticatedRegisterView, \
     MyAppointmentsView, RegisterSuccessView, RegisterView, SubscribedView, \
     UnsubscribeFromMailinglistView, SignUpView
 
+if getattr(settings, 'PARTICIPANT_ASYNC_VIEWS', False):
+    # Same URLs and templates, see participant.views.async_views
+    from participant.views.async_views import \
+        AsyncCancelLandingView as CancelLandingView, \
+        AsyncMyAppointmentsView as MyAppointmentsView, \
+        AsyncRegisterView as RegisterView, \
+        AsyncSignUpView as SignUpView
+
 app_name = 'participant'
 
 urlpatterns = [
@@ -22,14 +22,14 @@ def experiment_is_open(experiment: Experiment) -> bool:
         return False
 
     if experiment.use_timeslots:
-        # If we find an eligble timeslot, we know it should be open
-        for timeslot in experiment.timeslots:
-            if timeslot.datetime > _2_hours_ago(timeslot.datetime) and \
-                    timeslot.free_places > 0:
-                return True
-        # If we looped through all timeslots without finding one that can be
-        # chosen, we assume it's closed
-        return False
+        # It's open if any timeslot that can still be chosen has free places
+        availability = experiment.availability
+        if not availability:
+            return False
+
+        return availability.has_bookable(
+            _2_hours_ago(availability.datetimes[0])
+        )
     else:  # If we don't use timeslots we take the open attribute as fact
         return True
 
@@ -105,12 +105,13 @@ def _get_register_form(form: BaseRegisterForm, experiment: Experiment):
         form.fields[exp_crit.criterion.name_form] = field
 
     if experiment.use_timeslots:
-        timeslots = sorted(experiment.timeslots, key=lambda x: x.datetime)
+        availability = experiment.availability
+        timeslots = availability.bookable(
+            _2_hours_ago(availability.datetimes[0])
+        ) if availability else []
 
         timeslot_options = ((timeslot.id, str(timeslot)) for timeslot in
-                            timeslots if
-                            timeslot.datetime > _2_hours_ago(timeslot.datetime)
-                            and timeslot.free_places > 0)
+                            timeslots)
 
         form.fields['timeslot'] = forms.IntegerField(
             label='',
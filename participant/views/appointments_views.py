@@ -6,6 +6,7 @@ from django.utils.translation import gettext_lazy as _
 from django.views import generic
 
 from cdh.rest.exceptions import ApiError
+from api import cache
 from api.resources import Appointments
 from api.resources.participant_resources import SendCancelToken, Appointment
 from main.mixins import OverrideLanguageMixin
@@ -85,6 +86,9 @@ class CancelAppointmentView(OverrideLanguageMixin, generic.RedirectView):
             kwargs['user_token'] = self.kwargs.get('token')
 
         Appointment.client.delete(**kwargs)
+        # A place was freed. We don't know which experiment it was for, so
+        # discard all cached experiments
+        cache.invalidate_experiment(None)
 
         messages.success(
             request,
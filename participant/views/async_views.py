@@ -0,0 +1,180 @@
+"""
+Async variants of the participant facing views, for when the site is served
+through ASGI (see ppn_frontend/asgi.py). They're used instead of the regular
+views if PARTICIPANT_ASYNC_VIEWS is enabled, using the same URLs and
+templates.
+
+Backend calls are awaited through api.async_client, and anything that
+touches the database (like the user's groups) is run through sync_to_async.
+Building and handling forms (which calls the backend from within the form
+and the register utils) is run on the async client's pool as a whole, with
+the thread locals of cdh.core.middleware set up. Templates are rendered
+through sync_to_async afterwards, see api.async_client.render().
+"""
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponseRedirect
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+
+from api import async_client
+from api.resources import Appointments
+from api.resources.participant_resources import SendCancelToken
+from cdh.rest.exceptions import ApiError
+from .appointments_views import CancelLandingView, MyAppointmentsView
+from .experiment_views import RegisterView
+from .signup_view import SignUpView
+
+
+@sync_to_async
+def _get_user_info(request):
+    """Returns whether the user is authenticated, and whether they are a
+    participant"""
+    user = request.user
+    return user.is_authenticated, user.is_authenticated and \
+        user.is_participant
+
+
+class AsyncFormViewMixin:
+    """Runs the (blocking) form handling of a FormView on the async client's
+    pool.
+
+    ProcessFormView also defines put(), which isn't async; it's left out of
+    the allowed methods, as none of these views use it.
+    """
+    http_method_names = ['get', 'head', 'post', 'options']
+
+    async def post(self, request, *args, **kwargs):
+        return await async_client.run_and_render(request, self._process_form)
+
+    def _process_form(self):
+        form = self.get_form()
+        if form.is_valid():
+            return self.form_valid(form)
+
+        return self.form_invalid(form)
+
+
+class AsyncRegisterView(AsyncFormViewMixin, RegisterView):
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Fetched here, so get_redirect doesn't wait on the backend in the
+        # thread it's run in
+        try:
+            self.experiment = await self.aget_prefetched(
+                'experiment',
+                self._get_experiment
+            )
+        except ObjectDoesNotExist:
+            return HttpResponseRedirect(
+                reverse('participant:closed_experiment')
+            )
+
+        # See RegisterView.dispatch
+        redirect = await sync_to_async(self.get_redirect)(request)
+        if redirect:
+            return redirect
+
+        if request.method.lower() not in self.http_method_names:
+            return await self.http_method_not_allowed(request, *args, **kwargs)
+
+        handler = getattr(self, request.method.lower(), self.get)
+        return await handler(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        return await async_client.run_and_render(
+            request,
+            super(AsyncRegisterView, self).get,
+            request,
+            *args,
+            **kwargs
+        )
+
+
+class AsyncMyAppointmentsView(MyAppointmentsView):
+
+    async def get(self, request, *args, **kwargs):
+        # See MyAppointmentsView.get
+        is_authenticated, is_participant = await _get_user_info(request)
+        if is_authenticated and not is_participant:
+            if 'token' not in self.kwargs:
+                return HttpResponseRedirect(reverse('main:login'))
+
+        if not is_authenticated and 'token' not in self.kwargs:
+            return HttpResponseRedirect(reverse('participant:cancel_landing'))
+
+        client_kwargs = {}
+        if 'token' in self.kwargs:
+            client_kwargs['user_token'] = self.kwargs.get('token')
+
+        self.appointments = None
+        try:
+            self.appointments = await async_client.AsyncResourceClient(
+                Appointments,
+                request
+            ).get(**client_kwargs)
+        except ApiError:
+            pass
+
+        return await async_client.run_and_render(
+            request,
+            self._render,
+            **kwargs
+        )
+
+    def _render(self, **kwargs):
+        return self.render_to_response(self.get_context_data(**kwargs))
+
+    def get_context_data(self, **kwargs):
+        # Skip MyAppointmentsView, as we already fetched the appointments
+        context = super(MyAppointmentsView, self).get_context_data(**kwargs)
+
+        if self.appointments is not None:
+            context['appointments'] = self.appointments
+            context['token'] = self.kwargs.get('token', None)
+
+        return context
+
+
+class AsyncCancelLandingView(CancelLandingView):
+
+    async def get(self, request, *args, **kwargs):
+        # Redirect to 'My appointments' if a participant is logged in.
+        _, is_participant = await _get_user_info(request)
+        if is_participant:
+            return HttpResponseRedirect(reverse('participant:appointments'))
+
+        return await async_client.run_and_render(
+            request,
+            self._render,
+            **kwargs
+        )
+
+    def _render(self, **kwargs):
+        return self.render_to_response(self.get_context_data(**kwargs))
+
+    async def post(self, request, *args, **kwargs):
+        if 'email' in request.POST:
+            req = SendCancelToken()
+            req.email = request.POST.get('email')
+            await async_client.AsyncResourceClient(
+                SendCancelToken,
+                request
+            ).put(req)
+
+            messages.success(request, _('cancel_landing:message:send_token'))
+
+        return await self.get(request, *args, **kwargs)
+
+
+class AsyncSignUpView(AsyncFormViewMixin, SignUpView):
+
+    async def get(self, request, *args, **kwargs):
+        return await async_client.run_and_render(
+            request,
+            super(AsyncSignUpView, self).get,
+            request,
+            *args,
+            **kwargs
+        )
@@ -66,7 +66,9 @@ class ExperimentRegisterMixin(ExperimentObjectMixin):
                 )
             )
 
-        return self.get(self.request, [], {})
+        # Render the (empty) form again, like get() does. get() itself isn't
+        # used, as it's async in the async variant of this view
+        return self.render_to_response(self.get_context_data())
 
     def get_form(self, form_class=None):
         base_form = super(ExperimentRegisterMixin, self).get_form(form_class)
@@ -85,6 +87,15 @@ class RegisterView(OverrideLanguageMixin,
     language_override = 'nl'
 
     def dispatch(self, request, *args, **kwargs):
+        redirect = self.get_redirect(request)
+        if redirect:
+            return redirect
+
+        return super(RegisterView, self).dispatch(request, *args, **kwargs)
+
+    def get_redirect(self, request):
+        """Returns where to redirect to instead of showing the form, if
+        anywhere. Also used by the async variant of this view."""
         try:
             # You might ask, why not just do the return in the body of this
             # if-statement. Well, that's because the very act of calling
@@ -107,7 +118,7 @@ class RegisterView(OverrideLanguageMixin,
                 reverse('participant:register_logged_in', args=args)
             )
 
-        return super(RegisterView, self).dispatch(request, *args, **kwargs)
+        return None
 
 
 class AuthenticatedRegisterView(braces.LoginRequiredMixin,
@@ -117,6 +128,22 @@ class AuthenticatedRegisterView(braces.LoginRequiredMixin,
     form_class = BaseRegisterForm
     language_override = 'nl'
 
+    def get_prefetches(self) -> dict:
+        prefetches = super(AuthenticatedRegisterView, self).get_prefetches()
+
+        # Only prefetch if we're not going to redirect the user anyway (see
+        # dispatch)
+        user = self.request.user
+        if not hasattr(user, 'is_participant') or not user.is_participant:
+            return prefetches
+
+        prefetches['required_fields'] = self._get_required_fields
+
+        if self.request.method == 'GET':
+            prefetches['appointments'] = Appointments.client.get
+
+        return prefetches
+
     def get_context_data(self, **kwargs):
         context = super(AuthenticatedRegisterView, self).get_context_data(
             **kwargs
@@ -126,7 +153,10 @@ class AuthenticatedRegisterView(braces.LoginRequiredMixin,
         if getattr(self, 'success') is not None:
             return context
 
-        appointments = Appointments.client.get()
+        appointments = self.get_prefetched(
+            'appointments',
+            Appointments.client.get
+        )
 
         # Check if this participant already has an appointment for this
         # experiment and add relevant context if so
@@ -156,6 +186,13 @@ class AuthenticatedRegisterView(braces.LoginRequiredMixin,
             ))
 
     def dispatch(self, request, *args, **kwargs):
+        # This runs before LoginRequiredMixin's check, so only start
+        # fetching the rest alongside the experiment for logged in users.
+        # get_prefetches leaves out the rest if we're going to redirect
+        # anyway.
+        if request.user.is_authenticated:
+            self.start_prefetches()
+
         try:
             # You might ask, why not just do the return in the body of this
             # if-statement. Well, that's because the very act of calling
@@ -185,8 +222,16 @@ class AuthenticatedRegisterView(braces.LoginRequiredMixin,
 
     @cached_property
     def _required_fields(self):
+        return self.get_prefetched(
+            'required_fields',
+            self._get_required_fields
+        )
+
+    def _get_required_fields(self):
+        # The experiment kwarg is the experiment's id, so we don't need to
+        # wait for the experiment itself
         fields = RequiredRegistrationFields.client.get(
-            experiment=self.experiment.id
+            experiment=self.kwargs.get(self.experiment_kwargs_name)
         ).fields
 
         return list(fields)
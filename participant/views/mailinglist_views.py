@@ -23,7 +23,7 @@ class UnsubscribeFromMailinglistView(OverrideLanguageMixin,
 
         context['token_valid'] = False
         context['email'] = None
-        context['admin'] = Admin.client.get()
+        context['admin'] = Admin.get_cached()
 
         try:
             validate = ValidateMailinglistToken()
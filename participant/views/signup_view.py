@@ -36,7 +36,8 @@ class SignUpView(OverrideLanguageMixin, generic.FormView):
         if ret:
             return ret
 
-        return self.get(self.request)
+        # Same as self.get(), which is async in the async variant of this view
+        return self.render_to_response(self.get_context_data())
 
     def _handle_account(self, data):
         user_model = get_user_model()
@@ -80,7 +81,7 @@ class SignUpView(OverrideLanguageMixin, generic.FormView):
             **kwargs
         )
 
-        context['admin'] = Admin.client.get()
+        context['admin'] = Admin.get_cached()
         context['admin_email'] = settings.EMAIL_FROM
 
         return context
@@ -0,0 +1,18 @@
+"""
+ASGI config for ppn_frontend project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Enable PARTICIPANT_ASYNC_VIEWS when serving the site through this, so the
+participant facing views don't tie up a thread while waiting on the backend.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ppn_frontend.settings')
+
+application = get_asgi_application()
@@ -78,6 +78,7 @@ LOGIN_URL = reverse_lazy('main:login')
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.BackendCallsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,7 +87,7 @@ MIDDLEWARE = [
     'axes.middleware.AxesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'cdh.core.middleware.ThreadLocalUserMiddleware',
+    'api.middleware.ThreadLocalUserMiddleware',
     'api.middleware.PasswordChangeMiddleware',
     'csp.middleware.CSPMiddleware',
 ]
@@ -111,6 +112,11 @@ LOGGING = {
             'handlers': ['console'],
             'level':    'INFO',  # DEBUG is possible, but is VERY verbose.
         },
+        # One line per request, listing the backend calls made
+        'api.calls': {
+            'handlers': ['console'],
+            'level':    'INFO',
+        },
     },
 }
 
@@ -159,6 +165,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'ppn_frontend.wsgi.application'
 
+# Use the async variants of the participant views. Only useful when served
+# through ASGI (ppn_frontend.asgi)
+PARTICIPANT_ASYNC_VIEWS = False
+
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
@@ -252,5 +262,52 @@ EMAIL_FROM = 'nope@example.org'
 
 # PPN API
 API_HOST = 'http://localhost:8000/'
+# Seconds public experiment data is cached by api.cache. 0 disables caching
+API_CACHE_TTL = 60
+# The Django cache api.cache uses to share invalidations between workers.
+# Use a shared backend (e.g. memcached) when running multiple workers; with
+# the default local memory cache, other workers can show a changed experiment
+# for up to API_CACHE_TTL seconds.
+API_CACHE_ALIAS = 'default'
+# Seconds after which the cached administrator is refreshed in the background
+API_ADMIN_CACHE_TTL = 3600
+# Seconds a revalidated (conditional GET) response is kept for re-use
+API_CONDITIONAL_CACHE_TTL = 3600
+# Max number of entries kept by these caches. The least recently used ones
+# are removed first
+API_CACHE_MAX_ENTRIES = 1024
+API_CONDITIONAL_CACHE_MAX_ENTRIES = 256
+# Build nested resources on first use, see api.fields
+API_LAZY_FIELDS = True
+# Use compact, read-only objects for the timeslots and appointments of
+# leader experiments, see api.fields
+API_COMPACT_RESOURCES = True
+# Connection pooling for backend calls, see api.http
+API_POOL_CONNECTIONS = 4
+API_POOL_MAXSIZE = 10
+API_CONNECT_TIMEOUT = 3.05
+API_READ_TIMEOUT = 30
+API_GET_RETRIES = 2
+# Max number of backend calls run concurrently by api.prefetch
+API_PREFETCH_WORKERS = 8
+# Max number of backend calls run concurrently for the async views, see
+# api.async_client. These threads only wait on the backend
+API_ASYNC_WORKERS = 32
+# Serve the home page's experiment list from a pre-rendered, compressed
+# snapshot, see main.views.HomeApiView
+HOME_API_SNAPSHOT = True
+# Max number of experiments fetched at once for bulk exports (for all of them
+# together), see leader.export
+LEADER_EXPORT_WORKERS = 4
+# Create recurring timeslots in one request, see leader.utils.add_timeslots.
+# Only enable this for backends that provide the add_time_slots endpoint;
+# otherwise they're added one by one
+API_BULK_TIMESLOTS = False
+# Max number of timeslots added at once when they're added one by one (for
+# all users together), see leader.utils.add_timeslots
+LEADER_TIMESLOT_WORKERS = 4
+# Add a Server-Timing header listing the backend calls made for a request,
+# see api.middleware.BackendCallsMiddleware
+API_SERVER_TIMING = True
 GROUPS_LEADER = 'leader'
 GROUPS_PARTICIPANT = 'participant'